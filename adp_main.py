@@ -0,0 +1,138 @@
+"""
+Main script for average draft position (ADP)
+
+Fetches the draft choices of every stored league not yet counted and adds each pick to running
+(league size, player, pick) counts in the database. Runs are incremental: a league is counted
+once, so re-running after new leagues are discovered only fetches the new drafts.
+"""
+import asyncio
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+from app import manage_database, metrics, response_cache
+from database.async_writer import AsyncBatchWriter
+from database.update_database import ManageDatabase
+from scrape_league.draft_session import DraftSession
+from scrape_league.response_cache import ResponseCache
+from scrape_league.scrape_draft_choices import DraftChoices
+from utils.columnar_output import write_output
+from utils.draft_position import DraftPositionHistogram
+from utils.fpl_constants import DRAFT_ROUNDS
+from utils.metrics import Metrics, reporting
+
+
+class DraftPositionAggregator:
+    def __init__(self, mange_database: ManageDatabase, league_table: str = 'league',
+                 table_name: str = 'adp', max_concurrency: int = 50,
+                 cache: Optional[ResponseCache] = None, parse_workers: int = 0,
+                 metrics: Optional[Metrics] = None) -> None:
+        """Init method
+
+        Args:
+            mange_database (ManageDatabase): Database holding the leagues and the counts
+            league_table (str, optional): League table to walk. Defaults to 'league'.
+            table_name (str, optional): Prefix of the ADP tables. Defaults to 'adp'.
+            max_concurrency (int, optional): Drafts fetched at once. Defaults to 50.
+            cache (ResponseCache, optional): Response cache for the choices requests, which
+                expire so a league yet to draft is fetched again. Defaults to None.
+            parse_workers (int, optional): Processes the choices responses are decoded on,
+                0 for the event loop. Defaults to 0.
+            metrics (Metrics, optional): Request and write metrics, reported periodically
+                while counting. Defaults to None.
+        """
+        self._manage_database = mange_database
+        self._league_table = league_table
+        self._table_name = table_name
+        self._metrics = metrics
+        self._get_session = partial(DraftSession, max_concurrency, cache=cache,
+                                    parse_workers=parse_workers, metrics=metrics)
+        self._leagues_added = 0
+        self._leagues_skipped = 0
+
+    def db_setup(self) -> None:
+        self._manage_database.create_draft_pick_tables(self._table_name)
+
+    async def update(self) -> None:
+        """Counts the drafts of every league in the league table not yet counted. A failed
+        request or a league that has not finished drafting is left for the next run.
+        """
+        pending = self._manage_database.iter_leagues_without_draft_picks(
+            self._league_table, self._table_name
+            )
+        async with reporting(self._metrics), self._get_session() as session, \
+                AsyncBatchWriter(self._write_batch, metrics=self._metrics,
+                                 name=self._table_name) as writer:
+            async for (league_id, league_size), picks in session.imap_unordered(
+                    lambda league: DraftChoices.get_draft_picks(league[0], session), pending):
+                if not picks or len(picks) < league_size * DRAFT_ROUNDS:
+                    self._leagues_skipped += 1
+                    continue
+                await writer.put((league_id, league_size, picks))
+                self._leagues_added += 1
+                if self._leagues_added % 1000 == 0:
+                    print(f'Counted {self._leagues_added} drafts')
+
+    def _write_batch(self, batch: List[Tuple[int, int, Dict[int, int]]]) -> None:
+        # Runs on the writer thread. Counts are summed per batch before the upsert, so each
+        # (league size, player, pick) cell is written at most once per batch.
+        def count_leagues(league_ids: List[int]) -> Iterable:
+            new_league_ids = set(league_ids)
+            histogram = DraftPositionHistogram()
+            for league_id, league_size, picks in batch:
+                if league_id in new_league_ids:
+                    histogram.add_league(league_size, picks)
+            return histogram.iter_counts()
+
+        added = self._manage_database.update_draft_picks(
+            self._table_name,
+            [(league_id, league_size) for league_id, league_size, _ in batch],
+            count_leagues
+            )
+        if added < len(batch):
+            print(f'Skipped {len(batch) - added} drafts already counted by another run')
+
+    def load_histogram(self) -> DraftPositionHistogram:
+        """Every draft counted so far, in this run or earlier ones"""
+        histogram = DraftPositionHistogram()
+        for league_size, n_leagues in self._manage_database.select_draft_pick_leagues(
+                self._table_name):
+            histogram.add_leagues(league_size, n_leagues)
+        for row in self._manage_database.iter_draft_pick_counts(self._table_name):
+            histogram.add_counts(*row)
+        return histogram
+
+    def get_adp_df(self) -> pd.DataFrame:
+        adp_df = self.load_histogram().get_adp_df()
+        if adp_df.empty:
+            return adp_df
+        player_ids = [int(player_id) for player_id in adp_df['id'].unique()]
+        player_df = pd.DataFrame(
+            self._manage_database.select_player_details('players', player_ids),
+            columns=['id', 'Name', 'Club']
+            )
+        return pd.merge(adp_df, player_df, on='id', how='left')
+
+    @property
+    def leagues_added(self) -> int:
+        return self._leagues_added
+
+    @property
+    def leagues_skipped(self) -> int:
+        return self._leagues_skipped
+
+
+def main() -> None:
+    aggregator = DraftPositionAggregator(manage_database, cache=response_cache, metrics=metrics)
+    aggregator.db_setup()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(aggregator.update())
+    print(f'{aggregator.leagues_added} drafts counted, {aggregator.leagues_skipped} skipped')
+
+    write_output(aggregator.get_adp_df(), 'adp', 'adp_by_league_size.csv', ('league_size',))
+    if metrics is not None:
+        print(f'Metrics written to {metrics.dump()}')
+
+if __name__ == "__main__":
+    main()
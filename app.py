@@ -1,3 +1,11 @@
 from database.update_database import ManageDatabase
+from scrape_league.response_cache import ResponseCache
+from scrape_league.response_memo import ResponseMemo
+from utils.metrics import Metrics
 
-manage_database = ManageDatabase('database/fpldraft')
+# None unless FPL_METRICS names a file to dump the run's metrics to
+metrics = Metrics.from_env()
+manage_database = ManageDatabase('database/fpldraft', metrics=metrics)
+response_cache = ResponseCache('database/http_cache')
+# Bodies fetched this run, so scrapers combined in one job never fetch a url twice
+response_memo = ResponseMemo(metrics=metrics)
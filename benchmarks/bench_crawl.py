@@ -0,0 +1,292 @@
+"""
+End-to-end crawl benchmarks against benchmarks.mock_api, a local stand-in for the draft API
+serving the benchmark fixtures with injected latency, 503s and 429s. Measures throughput and
+request latency of:
+
+    league_search     ScrapeLeagueID.league_search_async over consecutive league ids
+    ownership_crawl   LeagueStats.populate_player_ownership_dict
+    transfers_crawl   LeagueStats.populate_player_transfers_dict
+    league_table      ScrapeSingleLeague.get_league_results then get_league_table
+    db_write          ManageDatabase.update_id through an AsyncBatchWriter
+
+and flags every scenario whose throughput fell, or whose p95 latency rose, by more than the
+tolerance against the stored baseline. Baselines are only comparable on the same machine and
+with the same mock API settings.
+
+Run from the repository root:
+    python -m benchmarks.bench_crawl --save-baseline   measure and store the baseline
+    python -m benchmarks.bench_crawl                   measure and compare, exit 1 on regression
+"""
+import os
+
+MOCK_PORT = int(os.environ.get('FPL_MOCK_PORT', '8765'))
+# The scrapers read the API url when they are imported, so it must point at the mock first
+os.environ['FPL_DRAFT_API_URL'] = f'http://127.0.0.1:{MOCK_PORT}/api'
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager, redirect_stdout
+from typing import Awaitable, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from benchmarks.fixtures import FIXTURE_DIR, is_recorded, load_fixtures
+from benchmarks.mock_api import get_stats, league_exists, running_mock_api
+from calc_ownership_main import LeagueStats
+from database.async_writer import AsyncBatchWriter
+from database.update_database import ManageDatabase
+from scrape_league.draft_session import DraftSession
+from scrape_league.scrape_league_id import ScrapeLeagueID
+from scrape_league.scrape_league_players import ScrapeSingleLeague
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+
+@contextmanager
+def _timed_requests() -> Iterator[List[float]]:
+    """Collects the seconds taken by every DraftSession request, retries included"""
+    latencies: List[float] = []
+    fetch_bytes = DraftSession.fetch_bytes
+
+    async def timed_fetch_bytes(self, url, ttl=None):
+        start = time.perf_counter()
+        try:
+            return await fetch_bytes(self, url, ttl)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    DraftSession.fetch_bytes = timed_fetch_bytes
+    try:
+        yield latencies
+    finally:
+        DraftSession.fetch_bytes = fetch_bytes
+
+
+@contextmanager
+def _quiet() -> Iterator[None]:
+    # The crawls print a line per league; the cost stays in the measurement, the noise does not
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        yield
+
+
+def _result(items: int, seconds: float, latencies: List[float]) -> Dict:
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'items': items,
+        'seconds': round(seconds, 3),
+        'throughput': round(items / seconds, 1),
+        'p50_ms': round(float(np.percentile(latencies_ms, 50)), 1) if latencies else None,
+        'p95_ms': round(float(np.percentile(latencies_ms, 95)), 1) if latencies else None,
+        'requests': len(latencies),
+        }
+
+
+class CrawlBenchmarks:
+    def __init__(self, leagues: int, workdir: str, fixtures: Dict[str, List[Dict]],
+                 league_density: float, max_concurrency: int = 50) -> None:
+        """Init method
+
+        Args:
+            leagues (int): Leagues crawled by each scenario, scaled for the cheaper ones
+            workdir (str): Directory for the scenario databases
+            fixtures (Dict[str, List[Dict]]): Payloads the mock API serves
+            league_density (float): Share of league ids the mock API has in use
+            max_concurrency (int, optional): Requests in flight per crawl. Defaults to 50.
+        """
+        self._leagues = leagues
+        self._workdir = workdir
+        self._fixtures = fixtures
+        self._max_concurrency = max_concurrency
+        self._league_ids = self._existing_league_ids(leagues, league_density)
+        self._database = self._players_database()
+
+    @staticmethod
+    def _existing_league_ids(n: int, league_density: float) -> List[int]:
+        league_ids = []
+        league_id = 1
+        while len(league_ids) < n:
+            if league_exists(league_id, league_density):
+                league_ids.append(league_id)
+            league_id += 1
+        return league_ids
+
+    def _players_database(self) -> ManageDatabase:
+        """LeagueStats reads the players table, so it is filled from bootstrap-static"""
+        database = ManageDatabase(os.path.join(self._workdir, 'players'))
+        database.create_fpl_players_table('players')
+        database.update_fpl_players('players', [
+            (element['id'], element['web_name'], str(element['team']))
+            for element in self._fixtures['bootstrap-static'][0]['elements']
+            ])
+        return database
+
+    def _waiver_gameweek(self) -> int:
+        """The gameweek the fixture transactions have most of"""
+        events = Counter(event['event'] for payload in self._fixtures['transactions']
+                         for event in payload['transactions'])
+        return events.most_common(1)[0][0]
+
+    def scenarios(self) -> Dict[str, Callable[[], Awaitable[Dict]]]:
+        return {
+            'league_search': self.league_search,
+            'ownership_crawl': self.ownership_crawl,
+            'transfers_crawl': self.transfers_crawl,
+            'league_table': self.league_table,
+            'db_write': self.db_write,
+            }
+
+    async def league_search(self) -> Dict:
+        # Consecutive ids, so about 1 - league_density of the probes are 404s
+        league_ids = list(range(1, 2 * self._leagues + 1))
+        scrape_league_id = ScrapeLeagueID()
+        with _timed_requests() as latencies:
+            start = time.perf_counter()
+            async with DraftSession(self._max_concurrency) as session:
+                await scrape_league_id.league_search_async(league_ids, session)
+            seconds = time.perf_counter() - start
+        return _result(len(league_ids), seconds, latencies)
+
+    async def ownership_crawl(self) -> Dict:
+        league_stats = LeagueStats(self._league_ids, self._max_concurrency,
+                                   mange_database=self._database)
+        with _timed_requests() as latencies, _quiet():
+            start = time.perf_counter()
+            await league_stats.populate_player_ownership_dict()
+            seconds = time.perf_counter() - start
+        return _result(len(self._league_ids), seconds, latencies)
+
+    async def transfers_crawl(self) -> Dict:
+        league_stats = LeagueStats(self._league_ids, self._max_concurrency,
+                                   mange_database=self._database)
+        with _timed_requests() as latencies, _quiet():
+            start = time.perf_counter()
+            await league_stats.populate_player_transfers_dict(self._waiver_gameweek())
+            seconds = time.perf_counter() - start
+        return _result(len(self._league_ids), seconds, latencies)
+
+    async def league_table(self) -> Dict:
+        # Blocking requests, one league at a time, as xpts_table_main.py does
+        league_ids = self._league_ids[:max(1, self._leagues // 10)]
+        latencies = []
+        start = time.perf_counter()
+        with _quiet():
+            for league_id in league_ids:
+                request_start = time.perf_counter()
+                results = ScrapeSingleLeague.get_league_results(league_id)
+                latencies.append(time.perf_counter() - request_start)
+                if results is not None and results[0]:
+                    ScrapeSingleLeague.get_league_table(*results)
+        return _result(len(league_ids), time.perf_counter() - start, latencies)
+
+    async def db_write(self) -> Dict:
+        # Latency here is of each batch written by the writer thread
+        database = ManageDatabase(os.path.join(self._workdir, 'db_write'))
+        database.create_league_table('league')
+        flush_seconds = []
+
+        def write(batch: List) -> None:
+            flush_start = time.perf_counter()
+            database.update_id('league', batch)
+            flush_seconds.append(time.perf_counter() - flush_start)
+
+        rows = 200 * self._leagues
+        start = time.perf_counter()
+        async with AsyncBatchWriter(write) as writer:
+            for league_id in range(rows):
+                await writer.put((league_id, 10))
+        seconds = time.perf_counter() - start
+        database.close()
+        return _result(rows, seconds, flush_seconds)
+
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float) -> List[str]:
+    """Prints each scenario against its baseline and returns the names of those regressed"""
+    regressions = []
+    print(f"{'scenario':<17}{'items':>7}{'items/s':>10}{'p50 ms':>9}{'p95 ms':>9}"
+          f"{'requests':>10}{'base items/s':>14}{'change':>9}  status")
+    for name, result in results.items():
+        base = baseline.get(name)
+        status, change = 'new', ''
+        if base is not None:
+            change = f"{result['throughput'] / base['throughput'] - 1:+.0%}"
+            slower = result['throughput'] < base['throughput'] * (1 - tolerance)
+            laggier = (result['p95_ms'] is not None and base.get('p95_ms') is not None
+                       and result['p95_ms'] > base['p95_ms'] * (1 + tolerance))
+            status = 'REGRESSION' if slower or laggier else 'ok'
+            if status == 'REGRESSION':
+                regressions.append(name)
+        print(f"{name:<17}{result['items']:>7}{result['throughput']:>10.1f}"
+              f"{_format_ms(result['p50_ms']):>9}{_format_ms(result['p95_ms']):>9}"
+              f"{result['requests']:>10}"
+              f"{'' if base is None else format(base['throughput'], '.1f'):>14}{change:>9}"
+              f"  {status}")
+    return regressions
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return '' if value is None else f'{value:.1f}'
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Crawl benchmarks against a mock draft API')
+    parser.add_argument('--leagues', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.02)
+    parser.add_argument('--jitter', type=float, default=0.01)
+    parser.add_argument('--error-rate', type=float, default=0.01)
+    parser.add_argument('--throttle-rate', type=float, default=0.002)
+    parser.add_argument('--league-density', type=float, default=0.7)
+    parser.add_argument('--scenario', action='append', help='Run only these scenarios')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    profile = {
+        'leagues': args.leagues, 'latency': args.latency, 'jitter': args.jitter,
+        'error_rate': args.error_rate, 'throttle_rate': args.throttle_rate,
+        'league_density': args.league_density, 'recorded_fixtures': is_recorded(),
+        }
+    print(f"Fixtures: {'recorded in ' + FIXTURE_DIR if is_recorded() else 'synthetic'}")
+
+    fixtures = load_fixtures()
+    results = {}
+    with running_mock_api(MOCK_PORT, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, throttle_rate=args.throttle_rate,
+                          league_density=args.league_density) as api_url, \
+            tempfile.TemporaryDirectory() as workdir:
+        benchmarks = CrawlBenchmarks(args.leagues, workdir, fixtures, args.league_density)
+        for name, scenario in benchmarks.scenarios().items():
+            if args.scenario and name not in args.scenario:
+                continue
+            # Seeds the retry backoff jitter, so retries cost the same from run to run
+            random.seed(0)
+            results[name] = asyncio.run(scenario())
+        print(f'Mock API responses by status: {get_stats(api_url)}')
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        if stored['profile'] != profile:
+            print(f"Baseline was measured with {stored['profile']}, not comparable")
+        else:
+            baseline = stored['results']
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump({'profile': profile, 'results': {**baseline, **results}}, f, indent=2)
+        print(f'Baseline saved to {args.baseline}')
+    elif regressions:
+        print(f"Regressed beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark of payload decoding: json.loads into generic dicts, as the scrapers did, against the
+typed decoders in scrape_league.schemas. Reports decode time per payload and the memory held by
+the decoded result, on the synthetic payloads of benchmarks.fixtures.
+
+Run from the repository root: python -m benchmarks.bench_decode
+"""
+import json
+import random
+import timeit
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks import fixtures
+from scrape_league import schemas
+
+REPEAT = 200
+
+
+PAYLOADS: List[Tuple[str, Callable[[random.Random], Dict], Callable]] = [
+    ('element-status', fixtures.element_status, schemas.decode_element_status),
+    ('details', fixtures.details, schemas.decode_details),
+    ('transactions', fixtures.transactions, schemas.decode_transactions),
+    ('choices', fixtures.choices, schemas.decode_choices),
+    ('bootstrap-static', fixtures.bootstrap_static, schemas.decode_bootstrap_static),
+]
+
+
+def _retained_bytes(decode: Callable, body: bytes) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = decode(body)
+    retained = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del result
+    return retained
+
+
+def _time(decode: Callable, body: bytes) -> float:
+    """Microseconds per decode"""
+    return timeit.timeit(lambda: decode(body), number=REPEAT) / REPEAT * 1e6
+
+
+def main() -> None:
+    rng = random.Random(0)
+    fast_loads = schemas._loads
+    print(f"Typed decoders use {'orjson' if fast_loads is not json.loads else 'json'}; "
+          f"'typed json us' forces the json fallback")
+    print(f"{'payload':<18}{'bytes':>9}{'dict us':>10}{'typed us':>10}{'typed json us':>15}"
+          f"{'dict KiB':>10}{'typed KiB':>11}")
+    for name, make, decode in PAYLOADS:
+        body = json.dumps(make(rng)).encode()
+        typed_time = _time(decode, body)
+        schemas._loads = json.loads
+        try:
+            typed_json_time = _time(decode, body)
+        finally:
+            schemas._loads = fast_loads
+        print(f"{name:<18}{len(body):>9}{_time(json.loads, body):>10.0f}{typed_time:>10.0f}"
+              f"{typed_json_time:>15.0f}{_retained_bytes(json.loads, body) / 1024:>10.1f}"
+              f"{_retained_bytes(decode, body) / 1024:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Draft API payloads for the benchmarks. Responses recorded by record_fixtures.py into
+benchmarks/fixtures/{endpoint}/ are used where present, otherwise payloads shaped like the draft
+API's are generated from a fixed seed.
+"""
+import json
+import os
+import random
+from typing import Callable, Dict, List
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Gameweek the synthetic h2h results and transactions run up to
+SYNTHETIC_GAMEWEEK = 38
+
+
+def element_status(rng: random.Random) -> Dict:
+    return {'element_status': [
+        {'element': i, 'owner': rng.choice([None, rng.randint(1, 10 ** 6)]),
+         'status': rng.choice('aot'), 'in_accepted_trade': False}
+        for i in range(1, 700)
+        ]}
+
+
+def details(rng: random.Random) -> Dict:
+    league_size = rng.choice([8, 10, 10, 10, 12])
+    entries = [
+        {'id': 10 ** 5 + i, 'entry_id': 10 ** 6 + i, 'entry_name': f'Team {i}',
+         'player_first_name': f'First {i}', 'player_last_name': f'Last {i}',
+         'short_name': f'T{i}', 'joined_time': '2023-08-01T12:00:00Z', 'waiver_pick': i}
+        for i in range(league_size)
+        ]
+    matches = [
+        {'event': gw, 'finished': True, 'started': True, 'winning_league_entry': None,
+         'winning_method': None, 'league_entry_1': 10 ** 5 + i,
+         'league_entry_1_points': rng.randint(20, 90), 'league_entry_2': 10 ** 5 + i + 1,
+         'league_entry_2_points': rng.randint(20, 90)}
+        for gw in range(1, SYNTHETIC_GAMEWEEK + 1) for i in range(0, league_size, 2)
+        ]
+    return {'league': {'id': 1, 'name': 'League', 'scoring': 'h', 'admin_entry': 1},
+            'league_entries': entries, 'matches': matches, 'standings': []}
+
+
+def transactions(rng: random.Random) -> Dict:
+    return {'transactions': [
+        {'id': i, 'added': '2023-09-01T12:00:00Z', 'element_in': rng.randint(1, 699),
+         'element_out': rng.randint(1, 699), 'entry': rng.randint(1, 10 ** 6),
+         'event': rng.randint(1, SYNTHETIC_GAMEWEEK), 'index': i, 'kind': rng.choice('wf'),
+         'priority': 1, 'result': rng.choice(['a', 'di', 'do'])}
+        for i in range(1, 400)
+        ]}
+
+
+def choices(rng: random.Random) -> Dict:
+    # Served for leagues of any size, so a whole 12 team draft of distinct players, which
+    # covers every round of a smaller league's draft too
+    elements = rng.sample(range(1, 700), 12 * 15)
+    return {'choices': [
+        {'id': i, 'element': element, 'entry': rng.randint(1, 10 ** 6),
+         'entry_name': f'Team {i % 12}', 'pick': i, 'round': (i - 1) // 12 + 1,
+         'index': i, 'player_first_name': 'First', 'player_last_name': 'Last',
+         'choice_time': '2023-08-10T18:00:00Z', 'was_auto': False}
+        for i, element in enumerate(elements, 1)
+        ]}
+
+
+def bootstrap_static(rng: random.Random) -> Dict:
+    return {
+        'elements': [
+            {'id': i, 'web_name': f'Player {i}', 'team': rng.randint(1, 20),
+             'first_name': 'First', 'second_name': 'Second', 'element_type': rng.randint(1, 4),
+             'total_points': rng.randint(0, 200), 'form': '3.5', 'news': '', 'status': 'a'}
+            for i in range(1, 700)
+            ],
+        'teams': [{'id': i, 'name': f'Club {i}', 'short_name': f'C{i}', 'code': i}
+                  for i in range(1, 21)],
+        }
+
+
+SYNTHETIC: Dict[str, Callable[[random.Random], Dict]] = {
+    'details': details,
+    'element-status': element_status,
+    'transactions': transactions,
+    'choices': choices,
+    'bootstrap-static': bootstrap_static,
+}
+
+
+def load_fixtures(directory: str = FIXTURE_DIR, synthetic_n: int = 20,
+                  seed: int = 0) -> Dict[str, List[Dict]]:
+    """{endpoint: payloads}, the recorded payloads of each endpoint if there are any,
+    otherwise synthetic_n generated ones (one for bootstrap-static)
+    """
+    rng = random.Random(seed)
+    fixtures = {}
+    for endpoint, make in SYNTHETIC.items():
+        fixtures[endpoint] = _load_recorded(os.path.join(directory, endpoint))
+        if not fixtures[endpoint]:
+            n = 1 if endpoint == 'bootstrap-static' else synthetic_n
+            fixtures[endpoint] = [make(rng) for _ in range(n)]
+    return fixtures
+
+
+def is_recorded(directory: str = FIXTURE_DIR) -> bool:
+    return any(_load_recorded(os.path.join(directory, endpoint)) for endpoint in SYNTHETIC)
+
+
+def _load_recorded(endpoint_dir: str) -> List[Dict]:
+    if not os.path.isdir(endpoint_dir):
+        return []
+    payloads = []
+    for file_name in sorted(os.listdir(endpoint_dir)):
+        if file_name.endswith('.json'):
+            with open(os.path.join(endpoint_dir, file_name), encoding='utf-8') as f:
+                payloads.append(json.load(f))
+    return payloads
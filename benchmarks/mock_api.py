@@ -0,0 +1,161 @@
+"""
+Local stand-in for the draft API, serving benchmark fixtures with injected latency, transient
+errors and 429s, so crawls can be benchmarked repeatably without touching the live API.
+
+A league id exists for a fixed, seeded share of ids. Its details are a fixture with the id
+written in, and its other endpoints are the fixtures picked by the id. GET /_stats returns the
+responses sent by status.
+"""
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+import requests
+from aiohttp import web
+
+from benchmarks.fixtures import load_fixtures
+
+
+class MockDraftAPI:
+    def __init__(self, fixtures: Dict[str, List[Dict]], latency: float = 0.02,
+                 jitter: float = 0.01, error_rate: float = 0.0, throttle_rate: float = 0.0,
+                 retry_after: float = 0.2, league_density: float = 0.7, seed: int = 0) -> None:
+        """Init method
+
+        Args:
+            fixtures (Dict[str, List[Dict]]): Payloads by endpoint, as from load_fixtures
+            latency (float, optional): Seconds every response is delayed by. Defaults to 0.02.
+            jitter (float, optional): Up to this many seconds more, uniformly. Defaults to 0.01.
+            error_rate (float, optional): Share of requests answered 503. Defaults to 0.0.
+            throttle_rate (float, optional): Share of requests answered 429. Defaults to 0.0.
+            retry_after (float, optional): Retry-After seconds sent with a 429. Defaults to 0.2.
+            league_density (float, optional): Share of league ids in use. Defaults to 0.7.
+            seed (int, optional): Seed of the injected latency and failures. Defaults to 0.
+        """
+        self._details = fixtures['details']
+        # Bodies other than details never change, so they are encoded once
+        self._bodies = {
+            endpoint: [json.dumps(payload).encode() for payload in payloads]
+            for endpoint, payloads in fixtures.items() if endpoint != 'details'
+            }
+        self._latency = latency
+        self._jitter = jitter
+        self._error_rate = error_rate
+        self._throttle_rate = throttle_rate
+        self._retry_after = retry_after
+        self._league_density = league_density
+        self._seed = seed
+        self._rng = random.Random(seed)
+        self._stats: Dict[int, int] = {}
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get('/api/league/{id}/details', self._league_details)
+        app.router.add_get('/api/league/{id}/element-status',
+                           self._by_id('element-status'))
+        app.router.add_get('/api/draft/league/{id}/transactions', self._by_id('transactions'))
+        app.router.add_get('/api/draft/{id}/choices', self._by_id('choices'))
+        app.router.add_get('/api/bootstrap-static', self._bootstrap_static)
+        app.router.add_get('/_stats', self._get_stats)
+        return app
+
+    def league_exists(self, league_id: int) -> bool:
+        return league_exists(league_id, self._league_density, self._seed)
+
+    async def _inject(self) -> Optional[web.Response]:
+        """Waits out the response latency, then returns a failure response to send instead,
+        if one is drawn
+        """
+        await asyncio.sleep(self._latency + self._rng.uniform(0, self._jitter))
+        draw = self._rng.random()
+        if draw < self._throttle_rate:
+            return web.Response(status=429, headers={'Retry-After': str(self._retry_after)})
+        if draw < self._throttle_rate + self._error_rate:
+            return web.Response(status=503)
+        return None
+
+    def _respond(self, response: web.Response) -> web.Response:
+        self._stats[response.status] = self._stats.get(response.status, 0) + 1
+        return response
+
+    def _by_id(self, endpoint: str):
+        async def handler(request: web.Request) -> web.Response:
+            failure = await self._inject()
+            if failure is not None:
+                return self._respond(failure)
+            league_id = int(request.match_info['id'])
+            if not self.league_exists(league_id):
+                return self._respond(web.Response(status=404))
+            bodies = self._bodies[endpoint]
+            return self._respond(web.Response(
+                body=bodies[league_id % len(bodies)], content_type='application/json'
+                ))
+        return handler
+
+    async def _league_details(self, request: web.Request) -> web.Response:
+        failure = await self._inject()
+        if failure is not None:
+            return self._respond(failure)
+        league_id = int(request.match_info['id'])
+        if not self.league_exists(league_id):
+            return self._respond(web.Response(status=404))
+        payload = self._details[league_id % len(self._details)]
+        payload = {**payload, 'league': {**payload['league'], 'id': league_id}}
+        return self._respond(web.json_response(payload))
+
+    async def _bootstrap_static(self, request: web.Request) -> web.Response:
+        failure = await self._inject()
+        return self._respond(failure or web.Response(
+            body=self._bodies['bootstrap-static'][0], content_type='application/json'
+            ))
+
+    async def _get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({str(status): n for status, n in sorted(self._stats.items())})
+
+
+def league_exists(league_id: int, league_density: float = 0.7, seed: int = 0) -> bool:
+    """Whether the mock API has a league with league_id"""
+    return random.Random(league_id * 1_000_003 + seed).random() < league_density
+
+
+def serve(port: int, options: Dict) -> None:
+    """Runs a MockDraftAPI until the process is terminated. Module level so it can be the
+    target of a spawned process.
+    """
+    api = MockDraftAPI(load_fixtures(), **options)
+    web.run_app(api.app(), host='127.0.0.1', port=port, print=None)
+
+
+@contextmanager
+def running_mock_api(port: int, **options) -> Iterator[str]:
+    """Serves a MockDraftAPI on port from a separate process, so serving the fixtures does
+    not compete with the crawl being measured for the event loop. Yields the API base url.
+    """
+    process = multiprocessing.get_context('spawn').Process(
+        target=serve, args=(port, options), daemon=True
+        )
+    process.start()
+    base_url = f'http://127.0.0.1:{port}'
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                requests.get(f'{base_url}/_stats', timeout=1)
+                break
+            except requests.ConnectionError:
+                if time.monotonic() > deadline or not process.is_alive():
+                    raise RuntimeError(f'Mock draft API did not start on port {port}')
+                time.sleep(0.1)
+        yield f'{base_url}/api'
+    finally:
+        process.terminate()
+        process.join()
+
+
+def get_stats(api_url: str) -> Dict[str, int]:
+    """Responses the mock API has sent, by status"""
+    return requests.get(f"{api_url.rsplit('/api', 1)[0]}/_stats", timeout=5).json()
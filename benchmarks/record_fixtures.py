@@ -0,0 +1,85 @@
+"""
+Records draft API responses into benchmarks/fixtures/{endpoint}/ for the benchmarks. Leagues are
+sampled from the stored league table, and manager and team names are replaced, so the fixtures
+can be committed.
+
+Run from the repository root with access to the API:
+    python -m benchmarks.record_fixtures --leagues 20
+"""
+import argparse
+import json
+import os
+import random
+from typing import Dict, List, Optional
+
+from app import manage_database
+from benchmarks.fixtures import FIXTURE_DIR
+from scrape_league.response_cache import cached_get_json
+from utils.fpl_constants import DRAFT_API_URL
+
+LEAGUE_ENDPOINTS = {
+    'details': '{api}/league/{league_id}/details',
+    'element-status': '{api}/league/{league_id}/element-status',
+    'transactions': '{api}/draft/league/{league_id}/transactions',
+    'choices': '{api}/draft/{league_id}/choices',
+}
+
+
+def anonymise(endpoint: str, payload: Dict) -> Dict:
+    """Replaces the names of managers and teams"""
+    if endpoint == 'details':
+        for idx, entry in enumerate(payload.get('league_entries', [])):
+            entry.update({'entry_name': f'Team {idx}', 'player_first_name': f'First {idx}',
+                          'player_last_name': f'Last {idx}', 'short_name': f'T{idx}'})
+        payload.get('league', {})['name'] = 'League'
+    elif endpoint == 'choices':
+        for choice in payload.get('choices', []):
+            choice.update({'entry_name': 'Team', 'player_first_name': 'First',
+                           'player_last_name': 'Last'})
+    return payload
+
+
+def _save(endpoint: str, name: str, payload: Dict, directory: str) -> None:
+    endpoint_dir = os.path.join(directory, endpoint)
+    os.makedirs(endpoint_dir, exist_ok=True)
+    with open(os.path.join(endpoint_dir, f'{name}.json'), 'w', encoding='utf-8') as f:
+        json.dump(payload, f)
+
+
+def record(league_ids: List[int], directory: str = FIXTURE_DIR) -> int:
+    """Records every league endpoint of league_ids, and bootstrap-static. Returns the number
+    of leagues recorded.
+    """
+    bootstrap_static = cached_get_json(f'{DRAFT_API_URL}/bootstrap-static')
+    if bootstrap_static is not None:
+        _save('bootstrap-static', '0', bootstrap_static, directory)
+
+    recorded = 0
+    for league_id in league_ids:
+        payloads: Dict[str, Optional[Dict]] = {
+            endpoint: cached_get_json(url.format(api=DRAFT_API_URL, league_id=league_id))
+            for endpoint, url in LEAGUE_ENDPOINTS.items()
+            }
+        if any(payload is None for payload in payloads.values()):
+            # Keep the fixtures of a league together, so the mock serves a consistent league
+            continue
+        for endpoint, payload in payloads.items():
+            _save(endpoint, str(recorded), anonymise(endpoint, payload), directory)
+        recorded += 1
+    return recorded
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Record draft API benchmark fixtures')
+    parser.add_argument('--leagues', type=int, default=20)
+    parser.add_argument('--league-table', default='league')
+    parser.add_argument('--directory', default=FIXTURE_DIR)
+    args = parser.parse_args()
+
+    league_ids = manage_database.select_id(args.league_table)
+    league_ids = random.sample(league_ids, min(args.leagues, len(league_ids)))
+    recorded = record(league_ids, args.directory)
+    print(f'Recorded {recorded} leagues into {args.directory}')
+
+if __name__ == "__main__":
+    main()
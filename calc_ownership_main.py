@@ -1,86 +1,385 @@
 import asyncio
-from typing import Dict, List, Optional, Tuple
+import random
+from contextlib import AsyncExitStack
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from app import manage_database
+from app import manage_database, metrics, response_cache, response_memo
+from database.async_writer import AsyncBatchWriter
+from database.crawl_checkpoint import CrawlCheckpoint
+from database.update_database import ManageDatabase
+from scrape_league.draft_session import DraftSession
+from scrape_league.ownership_history import LeagueOwnershipHistory
+from scrape_league.response_cache import FOREVER, ResponseCache
+from scrape_league.response_memo import ResponseMemo
 from scrape_league.scrape_league_players import ScrapeSingleLeague
-from scrape_league.scrape_league_transfers import SingleGWTransfers
+from scrape_league.scrape_league_transfers import WAIVER_ACCEPTED, SingleGWTransfers
 from scrape_league.scrape_team import TeamPlayers
+from utils.columnar_output import write_output
+from utils.metrics import Metrics, reporting
+from utils.ownership_matrix import OwnershipMatrix
+from utils.ownership_snapshot import OwnershipSnapshotArchive
+from utils.streaming_stats import ColumnSums
+
+# Leagues between progress lines
+PROGRESS_EVERY = 1000
 
 
 class LeagueStats:
-    def __init__(self, league_ids: List) -> None:
-        # Currently gameweek is only used for transfers, not total ownership. Total ownership
-        # is based on the most recent gameweek. TODO: Add ownership for previous gameweeks.
+    def __init__(self, league_ids: List, max_concurrency: int = 50,
+                 cache: Optional[ResponseCache] = None,
+                 league_sizes: Optional[Dict[int, int]] = None, parse_workers: int = 0,
+                 checkpoint_prefix: Optional[str] = None,
+                 mange_database: Optional[ManageDatabase] = None,
+                 metrics: Optional[Metrics] = None,
+                 memo: Optional[ResponseMemo] = None, keep_checkpoints: bool = False) -> None:
+        # Total ownership from populate_player_ownership_dict is for the most recent gameweek.
+        # populate_historical_ownership reconstructs ownership for previous gameweeks.
         self._league_ids = league_ids
-        self._failed_ids: List = []
+        # League id to size, for slicing the ownership matrices by league size
+        self._league_sizes = league_sizes or {}
+        # Names the crawl checkpoints, e.g. 'gw38'. Without one nothing is checkpointed.
+        self._checkpoint_prefix = checkpoint_prefix
+        # A finished job is cleared so the next run crawls afresh, unless kept for another
+        # process to replay, as a crawl shard's are until merged
+        self._keep_checkpoints = keep_checkpoints
+        # Database holding the players table and the checkpoints, e.g. a crawl shard's
+        self._manage_database = mange_database or manage_database
+        # Request and write metrics, reported periodically while crawling
+        self._metrics = metrics
+        # Leagues are crawled concurrently over one shared connection pool, opened per crawl.
+        # parse_workers processes decode the responses, 0 for the event loop, and memo shares
+        # response bodies with the run's other scrapers.
+        self._get_session = partial(DraftSession, max_concurrency, cache=cache,
+                                    parse_workers=parse_workers, metrics=metrics, memo=memo)
 
         self._player_ids = self.get_player_ids()
         self._player_df = self._get_player_df()
 
-        self._player_ownership: Dict = self._get_player_dict()
-        self._player_waivers_in: Dict = self._get_player_dict()
-        self._player_waivers_out: Dict = self._get_player_dict()
+        self._reset_tallies()
 
-    @staticmethod
-    def get_player_ids() -> List:
-        return manage_database.select_all_player_ids('players')
+        # Per-gameweek waivers, populated from a single transactions request per league
+        self._gw_waivers_in: Dict[int, OwnershipMatrix] = {}
+        self._gw_waivers_out: Dict[int, OwnershipMatrix] = {}
+        self._gw_failed_ids: Dict[int, List] = {}
+        # Per-gameweek ownership replayed from draft choices and transactions
+        self._gw_ownership: Dict[int, OwnershipMatrix] = {}
+
+        # Leagues sampled by estimate_ownership, None after a full crawl
+        self._sampled: Optional[int] = None
+        self._confidence = 0.95
+
+    def _reset_tallies(self) -> None:
+        # (leagues x players) tallies. A league is registered once its request succeeds.
+        self._player_ownership = self._get_player_matrix()
+        self._player_waivers_in = self._get_player_matrix(sparse=True)
+        self._player_waivers_out = self._get_player_matrix(sparse=True)
+        self._failed_ids: List = []
+        # Running per player sums of ownership and waivers in/out by league size, so the
+        # intervals of estimate_ownership cost the same after every batch
+        self._column_sums: Dict[str, Dict[int, ColumnSums]] = {
+            stat: {} for stat in ('ownership', 'waivers_in', 'waivers_out')
+            }
+        # Leagues sampled by estimate_ownership whose transactions were fetched, with or
+        # without accepted waivers
+        self._waivers_sampled = 0
+
+    def get_player_ids(self) -> List:
+        return self._manage_database.select_all_player_ids('players')
+
+    def _get_player_matrix(self, sparse: bool = False) -> OwnershipMatrix:
+        # Waivers are a few cells per league, so are kept sparse. Ownership is a bit per cell.
+        return OwnershipMatrix(self._player_ids, sparse)
+
+    def _add_to_matrix(self, matrix: OwnershipMatrix, league_id: int,
+                       player_ids: Iterable[int]) -> None:
+        matrix.add(league_id, player_ids, self._league_sizes.get(league_id))
+
+    async def _crawl(self, job: str, iter_results: Callable[[List, DraftSession], AsyncIterator],
+                     add: Callable[[int, Any], None]) -> None:
+        """Runs iter_results over the leagues, calling add(league_id, result) for each, with a
+        None result for a failed league. With a checkpoint prefix, outcomes are checkpointed
+        under {prefix}_{job} as they arrive. A rerun replays the stored results of leagues
+        already done and only fetches the rest, retrying failed leagues until they run out of
+        attempts. Results must therefore be JSON serialisable. Once every league is done or
+        out of attempts the job is cleared, unless keep_checkpoints was set.
+        """
+        league_ids = self._league_ids
+        checkpoint = None
+        if self._checkpoint_prefix is not None:
+            checkpoint = CrawlCheckpoint(self._manage_database, f'{self._checkpoint_prefix}_{job}')
+            checkpoint.add(self._league_ids)
+            for league_id, result in checkpoint.iter_finished():
+                add(league_id, result)
+            league_ids = list(checkpoint.iter_pending())
+
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(reporting(self._metrics))
+            session = await stack.enter_async_context(self._get_session())
+            writer = None
+            if checkpoint is not None:
+                writer = await stack.enter_async_context(AsyncBatchWriter(
+                    checkpoint.record, metrics=self._metrics, name='checkpoint'
+                    ))
+            idx = 0
+            async for league_id, result in iter_results(league_ids, session):
+                idx += 1
+                # A line per league costs more than the league itself on large runs
+                if idx % PROGRESS_EVERY == 0 or idx == len(league_ids):
+                    print(f'Processing league {job} {idx}/{len(league_ids)}')
+                if writer is not None:
+                    await writer.put((league_id, result))
+                add(league_id, result)
 
-    def _get_player_dict(self) -> Dict[int, List]:
-        return {player_id: [] for player_id in self._player_ids}
+        if checkpoint is not None:
+            print(f'Checkpoint {checkpoint.job}: {checkpoint.counts()}')
+            if not self._keep_checkpoints and checkpoint.finished():
+                checkpoint.clear()
+
+    def _add_to_sums(self, stat: str, league_id: int, player_ids: Iterable[int]) -> None:
+        league_size = self._league_sizes.get(league_id, -1)
+        sums = self._column_sums[stat]
+        if league_size not in sums:
+            sums[league_size] = ColumnSums(len(self._player_ids))
+        sums[league_size].add(self._player_ownership.player_columns(player_ids))
+
+    def _get_sums(self, stat: str, league_size: Optional[int] = None) -> ColumnSums:
+        """stat's running sums over every league, or only leagues of one size"""
+        total = ColumnSums(len(self._player_ids))
+        for size, sums in self._column_sums[stat].items():
+            if league_size is None or size == league_size:
+                total.merge(sums)
+        return total
+
+    def _add_ownership(self, league_id: int, selected_players: Optional[List[int]]) -> None:
+        if selected_players is not None:
+            self._add_to_matrix(self._player_ownership, league_id, selected_players)
+            self._add_to_sums('ownership', league_id, selected_players)
+
+    def _add_waivers(self, league_id: int, transfers: Optional[Tuple[List, List]]) -> None:
+        # A failed request or a league without accepted waivers is left out
+        transfers_in, transfers_out = transfers or ([], [])
+        if not transfers_in and not transfers_out:
+            self._failed_ids.append(league_id)
+            return
+
+        self._add_to_matrix(self._player_waivers_in, league_id, transfers_in)
+        self._add_to_matrix(self._player_waivers_out, league_id, transfers_out)
+        self._add_to_sums('waivers_in', league_id, transfers_in)
+        self._add_to_sums('waivers_out', league_id, transfers_out)
+
+    @staticmethod
+    async def _iter_waivers(gameweek: int, league_ids: List, session: DraftSession
+                            ) -> AsyncIterator:
+        """(league id, (waivers in, waivers out) of gameweek) pairs, None for a failed league"""
+        async for league_id, transfers in \
+                SingleGWTransfers.iter_league_transfers_by_gameweek(league_ids, session):
+            if transfers is None:
+                yield league_id, None
+            else:
+                yield league_id, transfers.get(gameweek, {}).get(WAIVER_ACCEPTED, ([], []))
 
     async def populate_player_ownership_dict(self) -> None:
-        for idx, league_id in enumerate(self._league_ids):
-            print(f'Processing league ownership {idx+1}/{len(self._league_ids)}')
-            selected_players: Optional[List[int]] = await self._get_player_ownership(league_id)
-            if selected_players:
-                for player_id in selected_players:
-                    self._player_ownership[player_id].append(league_id)
+        await self._crawl('ownership', ScrapeSingleLeague.iter_selected_players,
+                          self._add_ownership)
 
     async def populate_player_transfers_dict(self, gameweek: int) -> None:
-        for idx, league_id in enumerate(self._league_ids):
-            print(f'Processing league transfers {idx+1}/{len(self._league_ids)}')
-            transfers_in, transfers_out = await self._get_player_transfers(league_id, gameweek)
-            if not transfers_in and not transfers_out:
-                self._failed_ids.append(league_id)
-                continue
+        await self._crawl(f'waivers_gw{gameweek}', partial(self._iter_waivers, gameweek),
+                          self._add_waivers)
+
+    async def estimate_ownership(self, gameweek: Optional[int] = None,
+                                 target_width: float = 0.02, top_n: Optional[int] = None,
+                                 batch_size: int = 1000, confidence: float = 0.95,
+                                 seed: Optional[int] = None) -> int:
+        """Estimates ownership, and waivers in/out of gameweek if given, from leagues sampled
+        in random batches instead of crawling every league. Sampling stops once the confidence
+        interval of every player, or of the top_n players by each estimate, is at most
+        target_width wide, or every league has been sampled. Read the estimates and their
+        intervals with get_estimates_df. Nothing is checkpointed, and the ownership and
+        waivers of an earlier crawl or estimate are discarded.
+
+        Args:
+            gameweek (int, optional): Gameweek to estimate waivers of. Defaults to None,
+                ownership only.
+            target_width (float, optional): Widest interval accepted, as a fraction. Defaults
+                to 0.02, two percentage points.
+            top_n (int, optional): Only require the top_n players by each estimate to meet
+                target_width. Defaults to None, every player.
+            batch_size (int, optional): Leagues sampled between checks. Defaults to 1000.
+            confidence (float, optional): Confidence level of the intervals. Defaults to 0.95.
+            seed (int, optional): Seed of the league sample. Defaults to None.
 
-            for player_in, player_out in zip(transfers_in, transfers_out):
-                self._player_waivers_in[player_in].append(league_id)
-                self._player_waivers_out[player_out].append(league_id)
+        Returns:
+            int: Leagues sampled
+        """
+        league_ids = list(self._league_ids)
+        random.Random(seed).shuffle(league_ids)
+        self._confidence = confidence
+        self._reset_tallies()
+        self._sampled = 0
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(reporting(self._metrics))
+            session = await stack.enter_async_context(self._get_session())
+            while self._sampled < len(league_ids):
+                batch = league_ids[self._sampled:self._sampled + batch_size]
+                self._sampled += len(batch)
+                async for league_id, selected_players in \
+                        ScrapeSingleLeague.iter_selected_players(batch, session):
+                    self._add_ownership(league_id, selected_players)
+                if gameweek is not None:
+                    async for league_id, transfers in self._iter_waivers(gameweek, batch, session):
+                        if transfers is not None:
+                            self._waivers_sampled += 1
+                        self._add_waivers(league_id, transfers)
 
-    async def _get_player_ownership(self, league_id: int) -> Optional[List[int]]:
-        return await ScrapeSingleLeague.get_selected_players(league_id)
+                width = self._widest_interval(gameweek is not None, top_n)
+                print(f'Sampled {self._sampled}/{len(league_ids)} leagues, '
+                      f'widest interval {width:.1%}')
+                if width <= target_width:
+                    break
+        return self._sampled
 
-    async def _get_player_transfers(self, league_id: int, gameweek: int) -> Tuple[List, List]:
-        return await SingleGWTransfers.get_league_transfers(league_id, gameweek)
+    def _sampled_fraction(self, stat: str) -> float:
+        """Share of stat's population of leagues in the sample. Waivers are only tallied for the
+        leagues with accepted waivers, whose number is estimated from their share of the
+        leagues sampled, so the share of them sampled is that of every league whose
+        transactions were fetched.
+        """
+        if self._sampled is None or not self._league_ids:
+            return 0.0
+        if stat == 'ownership':
+            sampled = self._get_sums(stat).count
+        else:
+            sampled = self._waivers_sampled
+        return sampled / len(self._league_ids)
+
+    def _widest_interval(self, waivers: bool, top_n: Optional[int] = None) -> float:
+        stats = ['ownership'] + (['waivers_in', 'waivers_out'] if waivers else [])
+        widest = 0.0
+        for stat in stats:
+            estimate, low, high = self._get_sums(stat).intervals(
+                self._confidence, self._sampled_fraction(stat)
+                )
+            width = high - low
+            if top_n is not None:
+                width = width[np.argsort(-np.nan_to_num(estimate, nan=0.0))[:top_n]]
+            widest = max(widest, float(width.max(initial=0.0)))
+        return widest
+
+    async def populate_player_transfers_range(self, gameweeks: Iterable[int],
+                                              finished: bool = False) -> None:
+        """Populates waivers in/out for every gameweek in gameweeks from one transactions
+        request per league. As with populate_player_transfers_dict, a league with no accepted
+        waivers in a gameweek is excluded from that gameweek's percentages. Set finished when
+        the gameweeks were over before any cached transactions were fetched, so the cached
+        histories are reused however old they are.
+        """
+        gameweeks = list(gameweeks)
+        for gameweek in gameweeks:
+            self._gw_waivers_in[gameweek] = self._get_player_matrix(sparse=True)
+            self._gw_waivers_out[gameweek] = self._get_player_matrix(sparse=True)
+            self._gw_failed_ids[gameweek] = []
+
+        async def iter_waivers(league_ids: List, session: DraftSession) -> AsyncIterator:
+            async for league_id, transfers in SingleGWTransfers.iter_league_transfers_by_gameweek(
+                    league_ids, session, FOREVER if finished else None):
+                if transfers is None:
+                    yield league_id, None
+                else:
+                    yield league_id, [
+                        (gameweek, *transfers.get(gameweek, {}).get(WAIVER_ACCEPTED, ([], [])))
+                        for gameweek in gameweeks
+                        ]
+
+        def add(league_id: int, transfers: Optional[List[Tuple[int, List, List]]]) -> None:
+            for gameweek, transfers_in, transfers_out in (
+                    transfers or [(gameweek, [], []) for gameweek in gameweeks]):
+                if not transfers_in and not transfers_out:
+                    self._gw_failed_ids[gameweek].append(league_id)
+                    continue
+
+                self._add_to_matrix(self._gw_waivers_in[gameweek], league_id, transfers_in)
+                self._add_to_matrix(self._gw_waivers_out[gameweek], league_id, transfers_out)
+
+        job = f'waivers_gw{gameweeks[0]}-{gameweeks[-1]}' if gameweeks else 'waivers'
+        await self._crawl(job, iter_waivers, add)
+
+    async def populate_historical_ownership(self, gameweeks: Iterable[int]) -> None:
+        """Populates ownership for every gameweek in gameweeks from each league's draft choices
+        and transaction history, two requests per league
+        """
+        gameweeks = list(gameweeks)
+        for gameweek in gameweeks:
+            self._gw_ownership[gameweek] = self._get_player_matrix()
+
+        async def iter_ownership(league_ids: List, session: DraftSession) -> AsyncIterator:
+            async for league_id, ownership in LeagueOwnershipHistory.iter_ownership_by_gameweek(
+                    league_ids, gameweeks, session):
+                yield league_id, None if ownership is None else list(ownership.items())
+
+        def add(league_id: int, ownership: Optional[List[Tuple[int, List[int]]]]) -> None:
+            for gameweek, player_ids in ownership or []:
+                self._add_to_matrix(self._gw_ownership[gameweek], league_id, player_ids)
+
+        job = f'ownership_gw{gameweeks[0]}-{gameweeks[-1]}' if gameweeks else 'ownership'
+        await self._crawl(job, iter_ownership, add)
 
     def _get_player_df(self) -> pd.DataFrame:
-        player_tuple = manage_database.select_player_details('players', list(self._player_ids))
+        player_tuple = self._manage_database.select_player_details(
+            'players', list(self._player_ids)
+            )
         return pd.DataFrame(player_tuple, columns=['id', 'Name', 'Club'])
 
-    def _get_percentage(self, input_dict: Dict, name: str) -> pd.Series:
-        df = pd.DataFrame.from_dict(input_dict, orient='index')
-        df_count = df.count(axis=1)/(len(self._league_ids)-len(self._failed_ids))
-        df_count.name = name
-        return df_count
+    def _get_percentage(self, input_matrix: OwnershipMatrix, name: str,
+                        failed_ids: Optional[List] = None,
+                        league_size: Optional[int] = None) -> pd.Series:
+        # Across all leagues the denominator is every league less the failures, as before the
+        # matrices existed. A size slice is over the leagues of that size that responded.
+        denominator = None
+        if league_size is None:
+            if failed_ids is None:
+                failed_ids = self._failed_ids
+            denominator = len(self._league_ids) - len(failed_ids)
+        return input_matrix.get_series(name, denominator, league_size)
 
-    def get_total_ownership_df(self) -> pd.DataFrame:
-        ownership_count = self._get_percentage(
-            self._player_ownership, 'ownership'
-            )
+    def get_total_ownership_df(self, league_size: Optional[int] = None,
+                               gameweek: Optional[int] = None) -> pd.DataFrame:
+        """Ownership percentages. With a gameweek, reads the tables built by
+        populate_historical_ownership, as a share of the leagues reconstructed.
+        """
+        if gameweek is None:
+            ownership_count = self._get_percentage(
+                self._player_ownership, 'ownership', league_size=league_size
+                )
+        else:
+            ownership_count = self._gw_ownership[gameweek].get_series(
+                'ownership', league_size=league_size
+                )
         out = pd.merge(
             self._player_df, ownership_count, right_index=True, left_on='id'
             )
         return out
 
-    def get_transfers_df(self) -> pd.DataFrame:
+    def get_transfers_df(self, gameweek: Optional[int] = None,
+                         league_size: Optional[int] = None) -> pd.DataFrame:
+        """Waivers in/out percentages. With a gameweek, reads the tables built by
+        populate_player_transfers_range, otherwise those of populate_player_transfers_dict.
+        """
+        if gameweek is None:
+            waivers_in, waivers_out = self._player_waivers_in, self._player_waivers_out
+            failed_ids = self._failed_ids
+        else:
+            waivers_in, waivers_out = self._gw_waivers_in[gameweek], self._gw_waivers_out[gameweek]
+            failed_ids = self._gw_failed_ids[gameweek]
+
         transfers_in_count = self._get_percentage(
-            self._player_waivers_in, 'waivers_in'
+            waivers_in, 'waivers_in', failed_ids, league_size
             )
         transfers_out_count = self._get_percentage(
-            self._player_waivers_out, 'waivers_out'
+            waivers_out, 'waivers_out', failed_ids, league_size
             )
         transfers_df = pd.merge(
             transfers_in_count, transfers_out_count, left_index=True, right_index=True
@@ -91,27 +390,104 @@ class LeagueStats:
             )
         return out
 
+    def get_estimates_df(self, league_size: Optional[int] = None) -> pd.DataFrame:
+        """Ownership and waivers in/out as fractions of the leagues sampled by
+        estimate_ownership, each with the low and high bounds of its confidence interval.
+        Waivers are left out if they were not estimated.
+        """
+        columns = {}
+        for name in ('ownership', 'waivers_in', 'waivers_out'):
+            if self._get_sums(name).count == 0:
+                continue
+            estimate, low, high = self._get_sums(name, league_size).intervals(
+                self._confidence, self._sampled_fraction(name)
+                )
+            columns.update({name: estimate, f'{name}_low': low, f'{name}_high': high})
+        estimates = pd.DataFrame(columns, index=self._player_ownership.player_ids)
+        return pd.merge(self._player_df, estimates, right_index=True, left_on='id')
+
+    def get_co_ownership(self, player_a: int, player_b: int,
+                         league_size: Optional[int] = None) -> float:
+        """Fraction of leagues in which player_a and player_b are both owned"""
+        return self._player_ownership.co_ownership(player_a, player_b, league_size)
+
+    def save_ownership_snapshot(self, archive: OwnershipSnapshotArchive, gameweek: int) -> str:
+        """Persists the crawled ownership so later jobs can reload it without the API"""
+        return archive.save(gameweek, self._player_ownership)
+
+    def save_aggregates(self, gameweek: int, table_name: str = 'player_aggregates') -> None:
+        """Materializes the crawled ownership and waivers for database.query_stats. gameweek is
+        the gameweek of populate_player_ownership_dict and populate_player_transfers_dict.
+        Gameweeks from populate_historical_ownership and populate_player_transfers_range are
+        saved under their own gameweek.
+        """
+        self._manage_database.create_aggregate_tables(table_name)
+        matrices = [
+            ('ownership', gameweek, self._player_ownership),
+            ('waivers_in', gameweek, self._player_waivers_in),
+            ('waivers_out', gameweek, self._player_waivers_out),
+            ]
+        matrices += [('ownership', gw, matrix) for gw, matrix in self._gw_ownership.items()]
+        matrices += [('waivers_in', gw, matrix) for gw, matrix in self._gw_waivers_in.items()]
+        matrices += [('waivers_out', gw, matrix) for gw, matrix in self._gw_waivers_out.items()]
+        for stat, gw, matrix in matrices:
+            if matrix.n_leagues() == 0:
+                # Not crawled this run, so leave any stored aggregates alone
+                continue
+            self._manage_database.replace_aggregates(
+                table_name, stat, gw, matrix.iter_aggregates(), matrix.league_counts().items()
+                )
+
     @property
     def player_ownership(self) -> Dict:
+        return self._player_ownership.to_dict()
+
+    @property
+    def ownership_matrix(self) -> OwnershipMatrix:
         return self._player_ownership
 
 if __name__ == "__main__":
     GAMEWEEK = 38
-    db_league_ids = manage_database.get_league_ids('league', 10)
+    # Width of the 95% intervals to sample leagues until, e.g. 0.02 for two percentage
+    # points, instead of crawling every league. None crawls every league.
+    ESTIMATE_WIDTH = None
+    db_league_sizes = dict(manage_database.iter_leagues('league', 10))
+    db_league_ids = list(db_league_sizes)
 
     loop = asyncio.get_event_loop()
 
-    league_stats = LeagueStats(db_league_ids)
-    loop.run_until_complete(league_stats.populate_player_ownership_dict())
-    ownership_df_league = league_stats.get_total_ownership_df()
+    team_players = TeamPlayers(league_id=38838, cache=response_cache, memo=response_memo)
+    # The own league's element-status is also part of the crawl, so it is kept for
+    # team_players rather than fetched again
+    response_memo.share([team_players.url])
+    league_stats = LeagueStats(db_league_ids, cache=response_cache, league_sizes=db_league_sizes,
+                               checkpoint_prefix=f'gw{GAMEWEEK}', metrics=metrics,
+                               memo=response_memo)
+    if ESTIMATE_WIDTH is None:
+        loop.run_until_complete(league_stats.populate_player_ownership_dict())
+        ownership_df_league = league_stats.get_total_ownership_df()
+        league_stats.save_ownership_snapshot(OwnershipSnapshotArchive(), GAMEWEEK)
 
-    loop.run_until_complete(league_stats.populate_player_transfers_dict(gameweek=GAMEWEEK))
-    transfers_df_league = league_stats.get_transfers_df()
-    total_df = pd.merge(
-        ownership_df_league, transfers_df_league, on=['id', 'Name', 'Club']
-        ).sort_values('waivers_in', ascending=False)
+        loop.run_until_complete(league_stats.populate_player_transfers_dict(gameweek=GAMEWEEK))
+        transfers_df_league = league_stats.get_transfers_df()
+        total_df = pd.merge(
+            ownership_df_league, transfers_df_league, on=['id', 'Name', 'Club']
+            ).sort_values('waivers_in', ascending=False)
+    else:
+        loop.run_until_complete(league_stats.estimate_ownership(GAMEWEEK, ESTIMATE_WIDTH))
+        total_df = league_stats.get_estimates_df().sort_values('waivers_in', ascending=False)
 
-    team_players = TeamPlayers(league_id=38838)
     total_df['Available in league'] = ~total_df['id'].isin(team_players.get_player_ids())
 
-    total_df.to_csv(f'transfers_GW{GAMEWEEK}.csv', index=False, encoding='utf-8-sig')
+    # Estimates carry interval columns a crawl's rows lack, and a dataset takes its schema
+    # from one file, so they are kept apart
+    output_name = 'ownership' if ESTIMATE_WIDTH is None else 'ownership_estimates'
+    print('Ownership written to ' + write_output(
+        total_df, output_name, f'transfers_GW{GAMEWEEK}.csv', ('gameweek', 'league_size'),
+        gameweek=GAMEWEEK, league_size=10
+        ))
+    if ESTIMATE_WIDTH is None:
+        # Sampled counts would pass for totals in the stored aggregates
+        league_stats.save_aggregates(GAMEWEEK)
+    if metrics is not None:
+        print(f'Metrics written to {metrics.dump()}')
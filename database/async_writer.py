@@ -0,0 +1,134 @@
+"""
+AsyncBatchWriter class. Bounded queue between fetch coroutines and a blocking database write,
+flushed in batches on a dedicated thread so network and disk work overlap
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+from utils.metrics import Metrics
+
+
+class AsyncBatchWriter:
+    def __init__(self, write: Callable[[List], None], max_queue: int = 10000,
+                 batch_size: int = 1000, flush_interval: float = 1.0,
+                 metrics: Optional[Metrics] = None, name: str = 'rows') -> None:
+        """Init method
+
+        Args:
+            write (Callable[[List], None]): Blocking function writing a batch of rows, e.g.
+                functools.partial(manage_database.update_id, 'league')
+            max_queue (int, optional): Rows queued before put blocks the producers.
+                Defaults to 10000.
+            batch_size (int, optional): Most rows passed to one write. Defaults to 1000.
+            flush_interval (float, optional): Seconds a partial batch waits for more rows
+                before being written. Defaults to 1.0.
+            metrics (Metrics, optional): Records the time and rows of every flush.
+                Defaults to None.
+            name (str, optional): Writer label of the flush metrics. Defaults to 'rows'.
+        """
+        self._write = write
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        # One thread, so batches are written in order and the connection is never shared
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task: Optional[asyncio.Task] = None
+        self._closed = object()
+        self._rows_written = 0
+        self._metrics = metrics
+        self._labels = (('writer', name),)
+
+    async def __aenter__(self) -> 'AsyncBatchWriter':
+        self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def put(self, row: Any) -> None:
+        """Queues a row, waiting if the writer has fallen max_queue rows behind. Raises the
+        writer's exception if a write failed, including while waiting for room.
+        """
+        if self._task is None:
+            await self._queue.put(row)
+            return
+        if self._task.done():
+            # Surface a failed write instead of filling a queue nobody drains
+            self._task.result()
+        await self._put_or_raise(row)
+
+    async def _put_or_raise(self, row: Any) -> None:
+        try:
+            self._queue.put_nowait(row)
+            return
+        except asyncio.QueueFull:
+            pass
+        # Wait for room or for the writer to stop, which leaves the queue full for good
+        put_task = asyncio.ensure_future(self._queue.put(row))
+        try:
+            await asyncio.wait({put_task, self._task}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            put_task.cancel()
+        if self._task.done():
+            self._task.result()
+
+    async def close(self) -> None:
+        if self._task is None:
+            return
+        try:
+            # A writer that has stopped would never take the sentinel
+            if not self._task.done():
+                await self._put_or_raise(self._closed)
+            await self._task
+        finally:
+            self._task = None
+            self._executor.shutdown(wait=True)
+
+    async def _run(self) -> None:
+        loop = asyncio.get_event_loop()
+        while True:
+            batch, closing = await self._next_batch()
+            if batch:
+                start = time.perf_counter()
+                await loop.run_in_executor(self._executor, self._write, batch)
+                self._rows_written += len(batch)
+                if self._metrics is not None:
+                    self._metrics.observe('fpl_writer_flush_seconds',
+                                          time.perf_counter() - start, self._labels)
+                    self._metrics.inc('fpl_writer_rows_total', self._labels, len(batch))
+            if closing:
+                return
+
+    async def _next_batch(self) -> Tuple[List, bool]:
+        """Waits for a row, then collects more until the batch is full or flush_interval has
+        passed. Returns the batch and whether close was requested.
+        """
+        loop = asyncio.get_event_loop()
+        batch = []
+        row = await self._queue.get()
+        deadline = loop.time() + self._flush_interval
+        while row is not self._closed:
+            batch.append(row)
+            if len(batch) >= self._batch_size:
+                return batch, False
+            try:
+                row = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    return batch, False
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    return batch, False
+        return batch, True
+
+    @property
+    def rows_written(self) -> int:
+        return self._rows_written
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
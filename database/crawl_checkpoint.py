@@ -0,0 +1,87 @@
+"""
+CrawlCheckpoint class. Persists a crawl job's work queue and each item's outcome to SQLite so an
+interrupted job restarted under the same name skips the items already done, replays their
+stored results and retries the ones that failed. Once finished, a job is cleared by its owner
+so the next run under the name starts from scratch.
+"""
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from database.update_database import ManageDatabase
+
+PENDING = 0
+DONE = 1
+FAILED = 2
+
+
+class CrawlCheckpoint:
+    def __init__(self, manage_database: ManageDatabase, job: str,
+                 table_name: str = 'crawl_items', max_attempts: int = 5) -> None:
+        """Init method
+
+        Args:
+            manage_database (ManageDatabase): Database the checkpoint is stored in
+            job (str): Job name. A job started again under the same name resumes.
+            table_name (str, optional): Checkpoint table. Defaults to 'crawl_items'.
+            max_attempts (int, optional): Attempts after which a failing item is given up on
+                and reported as failed. Defaults to 5.
+        """
+        self._manage_database = manage_database
+        self._job = job
+        self._table_name = table_name
+        self._max_attempts = max_attempts
+        self._manage_database.create_crawl_table(table_name)
+
+    def add(self, items: Iterable[int]) -> None:
+        """Queues items not already part of the job"""
+        self._manage_database.add_crawl_items(self._table_name, self._job, items)
+
+    def iter_pending(self) -> Iterator[int]:
+        """Items never attempted, then failed items with attempts left"""
+        for status, max_attempts in ((PENDING, None), (FAILED, self._max_attempts)):
+            for item, _, _ in list(self._manage_database.iter_crawl_items(
+                    self._table_name, self._job, status, max_attempts)):
+                yield item
+
+    def iter_finished(self) -> Iterator[Tuple[int, Optional[Any]]]:
+        """(item, result) of every item done, and (item, None) of every item out of attempts"""
+        for item, _, result in self._manage_database.iter_crawl_items(
+                self._table_name, self._job, DONE):
+            yield item, json.loads(result)
+        for item, attempts, _ in self._manage_database.iter_crawl_items(
+                self._table_name, self._job, FAILED):
+            if attempts >= self._max_attempts:
+                yield item, None
+
+    def record(self, rows: List[Tuple[int, Optional[Any]]]) -> None:
+        """Records (item, result) outcomes, a None result as a failed attempt. Blocking, so
+        suited to an AsyncBatchWriter.
+        """
+        self._manage_database.update_crawl_items(
+            self._table_name, self._job,
+            ((item, FAILED, None) if result is None else (item, DONE, json.dumps(result))
+             for item, result in rows)
+            )
+
+    def finished(self) -> bool:
+        """True once every item is done or out of attempts"""
+        return next(self.iter_pending(), None) is None
+
+    def counts(self) -> Dict[str, int]:
+        counts = self._manage_database.count_crawl_items(self._table_name, self._job)
+        return {
+            'pending': counts.get(PENDING, 0), 'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0)
+            }
+
+    def clear(self) -> None:
+        """Deletes the job, so the next run under its name starts from scratch"""
+        self._manage_database.delete_crawl_job(self._table_name, self._job)
+
+    @property
+    def job(self) -> str:
+        return self._job
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts().values())
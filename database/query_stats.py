@@ -0,0 +1,117 @@
+"""
+QueryStats class. Read-only lookups against the materialized player aggregates written by
+ManageDatabase.replace_aggregates and update_waiver_aggregates. Every query is a primary key or
+index range scan, with no network access or DataFrames involved.
+
+Shares are a stat's count over the leagues counted, e.g. the fraction of 10 team leagues in
+which a player is owned in a gameweek. Without a league size, counts and leagues are summed over
+every size.
+"""
+import sqlite3
+from typing import List, Optional, Tuple
+
+from database.update_database import ManageDatabase
+
+
+class QueryStats:
+    def __init__(self, db_name: str = 'database/fpldraft',
+                 table_name: str = 'player_aggregates') -> None:
+        """Init method. The read-only connection is opened on first use.
+
+        Args:
+            db_name (str, optional): Database file name without the .db suffix.
+                Defaults to 'database/fpldraft'.
+            table_name (str, optional): Aggregate table. Defaults to 'player_aggregates'.
+        """
+        self._db_name = db_name
+        self._table_name = ManageDatabase._check_name(table_name)
+        self._conn: Optional[sqlite3.Connection] = None
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(f'file:{self._db_name}.db?mode=ro', uri=True)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _size_filter(league_size: Optional[int]) -> Tuple[str, tuple]:
+        if league_size is None:
+            return '', ()
+        return 'AND LEAGUESIZE = ?', (league_size,)
+
+    def get_leagues(self, stat: str, gameweek: int, league_size: Optional[int] = None) -> int:
+        """Leagues counted for stat in gameweek"""
+        size_filter, size_params = self._size_filter(league_size)
+        row = self._db.execute(
+            f'SELECT SUM(leagues) FROM {self._table_name}_leagues '
+            f'WHERE stat = ? AND event = ? {size_filter}',
+            (stat, gameweek) + size_params
+            ).fetchone()
+        return row[0] or 0
+
+    def get_share(self, stat: str, player_id: int, gameweek: int,
+                  league_size: Optional[int] = None) -> Optional[float]:
+        """Share of leagues for one player, or None if no leagues were counted"""
+        leagues = self.get_leagues(stat, gameweek, league_size)
+        if not leagues:
+            return None
+        size_filter, size_params = self._size_filter(league_size)
+        row = self._db.execute(
+            f'SELECT SUM(count) FROM {self._table_name} '
+            f'WHERE stat = ? AND event = ? AND player_id = ? {size_filter}',
+            (stat, gameweek, player_id) + size_params
+            ).fetchone()
+        return (row[0] or 0) / leagues
+
+    def get_player_history(self, stat: str, player_id: int, league_size: Optional[int] = None,
+                           first_gameweek: int = 1, last_gameweek: int = 38
+                           ) -> List[Tuple[int, float]]:
+        """(gameweek, share) for every gameweek in [first_gameweek, last_gameweek] with leagues
+        counted, zero where the player was not recorded
+        """
+        size_filter, size_params = self._size_filter(league_size)
+        leagues = self._db.execute(
+            f'SELECT event, SUM(leagues) FROM {self._table_name}_leagues '
+            f'WHERE stat = ? AND event BETWEEN ? AND ? {size_filter} GROUP BY event',
+            (stat, first_gameweek, last_gameweek) + size_params
+            ).fetchall()
+        counts = dict(self._db.execute(
+            f'SELECT event, SUM(count) FROM {self._table_name} '
+            f'WHERE player_id = ? AND stat = ? AND event BETWEEN ? AND ? {size_filter} '
+            f'GROUP BY event',
+            (player_id, stat, first_gameweek, last_gameweek) + size_params
+            ).fetchall())
+        return [
+            (gameweek, counts.get(gameweek, 0) / n_leagues)
+            for gameweek, n_leagues in leagues if n_leagues
+            ]
+
+    def get_top_players(self, stat: str, gameweek: int, league_size: Optional[int] = None,
+                        limit: Optional[int] = 20) -> List[Tuple[int, float]]:
+        """(player id, share) of the limit players with the highest share, or of every player
+        recorded if limit is None
+        """
+        leagues = self.get_leagues(stat, gameweek, league_size)
+        if not leagues:
+            return []
+        size_filter, size_params = self._size_filter(league_size)
+        rows = self._db.execute(
+            f'SELECT player_id, SUM(count) AS total FROM {self._table_name} '
+            f'WHERE stat = ? AND event = ? {size_filter} '
+            f'GROUP BY player_id ORDER BY total DESC LIMIT ?',
+            (stat, gameweek) + size_params + (-1 if limit is None else limit,)
+            ).fetchall()
+        return [(player_id, count / leagues) for player_id, count in rows]
+
+    def get_gameweeks(self, stat: str) -> List[int]:
+        """Gameweeks with aggregates for stat"""
+        rows = self._db.execute(
+            f'SELECT DISTINCT event FROM {self._table_name}_leagues WHERE stat = ? ORDER BY event',
+            (stat,)
+            ).fetchall()
+        return [row[0] for row in rows]
@@ -1,89 +1,556 @@
+import re
 import sqlite3
-from typing import List
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils.metrics import Metrics
+
+# Applied to the shared connection when it is opened. WAL lets readers run alongside the
+# writer and, with synchronous=NORMAL, makes each commit an append rather than an fsync pair.
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',
+    'PRAGMA mmap_size=268435456',
+    'PRAGMA busy_timeout=5000',
+)
 
 
 class ManageDatabase:
-    def __init__(self, db_name:str) -> None:
+    def __init__(self, db_name:str, batch_size:int=10000, exclusive:bool=False,
+                 metrics:Optional[Metrics]=None) -> None:
+        """Init method. The connection is opened on first use and reused by every method.
+
+        Args:
+            db_name (str): Database file name without the .db suffix
+            batch_size (int, optional): Rows written per transaction by bulk inserts, and
+                fetched per round trip by streaming selects. Defaults to 10000.
+            exclusive (bool, optional): Hold the file lock for as long as the connection is
+                open, so WAL needs no shared memory file. For a database only one process
+                uses, e.g. a crawl shard on a network share. Defaults to False.
+            metrics (Metrics, optional): Records the time and rows of every batch written by
+                the bulk inserts, by table. Defaults to None.
+        """
         self._db_name = db_name
+        self._batch_size = batch_size
+        self._exclusive = exclusive
+        self._metrics = metrics
+        self._conn: Optional[sqlite3.Connection] = None
+        # Writes may come from an AsyncBatchWriter thread as well as the main thread
+        self._write_lock = threading.Lock()
+
+    @property
+    def db_name(self) -> str:
+        return self._db_name
 
     def create_db(self):
-        sqlite3.connect(f"{self._db_name}.db")
+        self._connect_db()
 
     def _connect_db(self):
-        connection_obj = sqlite3.connect(f"{self._db_name}.db")
-        cursor = connection_obj.cursor()
-        return connection_obj, cursor
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"{self._db_name}.db", check_same_thread=False)
+            if self._exclusive:
+                # Must precede the switch to WAL for WAL to skip the shared memory file. Only
+                # main, as without a schema databases attached later would be locked too.
+                self._conn.execute('PRAGMA main.locking_mode=EXCLUSIVE')
+            for pragma in PRAGMAS:
+                self._conn.execute(pragma)
+        return self._conn, self._conn.cursor()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _check_name(table_name: str) -> str:
+        # Table names cannot be bound as parameters, so only plain identifiers are formatted in
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', table_name):
+            raise ValueError(f"Invalid table name {table_name!r}")
+        return table_name
+
+    def _executemany_batched(self, sql: str, data: Iterable) -> None:
+        # One transaction per batch keeps memory flat for generators of any length
+        conn, cursor = self._connect_db()
+        rows = iter(data)
+        labels = ()
+        if self._metrics is not None:
+            table = re.search(r'(?:into|INTO|UPDATE)\s+(\w+)', sql)
+            labels = (('table', table.group(1) if table else ''),)
+        while True:
+            batch = list(islice(rows, self._batch_size))
+            if not batch:
+                break
+            start = time.perf_counter()
+            with self._write_lock, conn:
+                cursor.executemany(sql, batch)
+            if self._metrics is not None:
+                self._metrics.observe('fpl_db_write_seconds', time.perf_counter() - start, labels)
+                self._metrics.inc('fpl_db_rows_total', labels, len(batch))
 
     def create_league_table(self, table_name:str) ->None:
-        _, cursor = self._connect_db()
+        table_name = self._check_name(table_name)
+        conn, cursor = self._connect_db()
         table = (
-            f"CREATE TABLE {table_name}"
+            f"CREATE TABLE IF NOT EXISTS {table_name}"
             f"(TIMESTAMP DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,"
             f"LEAGUEID INT NOT NULL,"
             f"LEAGUESIZE INT,"
             f"UNIQUE(LEAGUEID))"
             )
-        cursor.execute(table)
-
-    def update_id(self, table_name:str, data:List) -> None:
-        conn, cursor = self._connect_db()
         with conn:
-            cursor.executemany(
-                f'INSERT or IGNORE into {table_name} (LEAGUEID, LEAGUESIZE) values (?,?)', data
-                )
+            cursor.execute(table)
+            self._create_league_indexes(cursor, table_name)
 
-    def select_id(self, table_name:str) -> List:
-        conn, cursor = self._connect_db()
-        with conn:
-            cursor.execute(
-                f'SELECT LEAGUEID from {table_name}'
+    @staticmethod
+    def _create_league_indexes(cursor: sqlite3.Cursor, table_name: str) -> None:
+        # Covers get_league_ids, which filters on LEAGUESIZE and reads only LEAGUEID
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table_name}_size_id ON {table_name} (LEAGUESIZE, LEAGUEID)"
             )
-            output = list(cursor)
-        return cursor.fetchall()
+
+    def update_id(self, table_name:str, data:Iterable) -> None:
+        table_name = self._check_name(table_name)
+        self._executemany_batched(
+            f'INSERT or IGNORE into {table_name} (LEAGUEID, LEAGUESIZE) values (?,?)', data
+            )
+
+    def select_id(self, table_name:str) -> List:
+        return list(self.iter_league_ids(table_name))
 
     def create_fpl_players_table(self, table_name:str) -> None:
-        _, cursor = self._connect_db()
+        table_name = self._check_name(table_name)
+        conn, cursor = self._connect_db()
         table = (
             f"""CREATE TABLE IF NOT EXISTS {table_name}
             (TIMESTAMP DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
             player_id INTEGER PRIMARY KEY,
-            name TEXT, 
+            name TEXT,
             team_name TEXT)"""
             )
-        cursor.execute(table)
+        with conn:
+            cursor.execute(table)
+
+    def update_fpl_players(self, table_name:str, data:Iterable) -> None:
+        table_name = self._check_name(table_name)
+        self._executemany_batched(
+            f'INSERT or IGNORE into {table_name} (player_id, name, team_name) values (?,?,?)',
+            data
+            )
+
+    def select_player_details(self, table_name:str, player_ids:List) -> List:
+        table_name = self._check_name(table_name)
+        _, cursor = self._connect_db()
+        # Query the table
+        cursor.execute('''
+        SELECT player_id, name, team_name FROM {} WHERE player_id IN ({})
+        '''.format(table_name, ','.join(['?'] * len(player_ids))), player_ids)
 
-    def update_fpl_players(self, table_name:str, data:List) -> None:
+        results = cursor.fetchall()
+        return results
+
+    def select_all_player_ids(self, table_name: str) -> List:
+        table_name = self._check_name(table_name)
+        _, cursor = self._connect_db()
+        cursor.execute(
+            f'SELECT player_id from {table_name}'
+        )
+        return [item[0] for item in cursor.fetchall()]
+
+    def get_league_ids(self, table_name: str, league_size: int) -> List:
+        return list(self.iter_league_ids(table_name, league_size))
+
+    def iter_league_ids(self, table_name: str, league_size: Optional[int] = None
+                        ) -> Iterator[int]:
+        """Streams league ids, optionally of one league size, without loading them all"""
+        for league_id, _ in self.iter_leagues(table_name, league_size):
+            yield league_id
+
+    def iter_leagues(self, table_name: str, league_size: Optional[int] = None
+                     ) -> Iterator[tuple]:
+        """Streams (league id, league size) rows, optionally of one league size"""
+        table_name = self._check_name(table_name)
+        if league_size is None:
+            return self._iter_rows(f'SELECT LEAGUEID, LEAGUESIZE from {table_name}')
+        return self._iter_rows(
+            f'SELECT LEAGUEID, LEAGUESIZE from {table_name} WHERE LEAGUESIZE = ?', (league_size,)
+            )
+
+    def _iter_rows(self, sql: str, params: tuple = ()) -> Iterator[tuple]:
+        conn, _ = self._connect_db()
+        # A dedicated cursor so other queries can run while the stream is consumed
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        try:
+            while True:
+                rows = cursor.fetchmany(self._batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+
+    def create_draft_pick_tables(self, table_name: str) -> None:
+        """Tables for the incremental ADP aggregate: {table_name}_leagues records every league
+        whose draft is counted, {table_name}_counts the (league size, player, pick) counts
+        """
+        table_name = self._check_name(table_name)
         conn, cursor = self._connect_db()
         with conn:
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name}_leagues"
+                f"(LEAGUEID INTEGER PRIMARY KEY, LEAGUESIZE INT)"
+                )
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name}_counts"
+                f"(LEAGUESIZE INT NOT NULL, player_id INT NOT NULL, pick INT NOT NULL,"
+                f"count INT NOT NULL, PRIMARY KEY (LEAGUESIZE, player_id, pick)) WITHOUT ROWID"
+                )
+
+    def update_draft_picks(self, table_name: str, leagues: List,
+                           count_leagues: Callable[[List[int]], Iterable]) -> int:
+        """Records leagues, (league id, league size) rows, and adds count_leagues(new league
+        ids), the (league size, player id, pick, count) rows of the leagues not recorded
+        before, in one transaction so a league is never half counted. A league already
+        recorded, e.g. by an overlapping run, is not counted again. Returns the leagues added.
+        """
+        table_name = self._check_name(table_name)
+        conn, cursor = self._connect_db()
+        with self._write_lock, conn:
+            new_league_ids = []
+            for league in leagues:
+                cursor.execute(
+                    f'INSERT OR IGNORE into {table_name}_leagues (LEAGUEID, LEAGUESIZE) '
+                    f'values (?,?)', league
+                    )
+                if cursor.rowcount:
+                    new_league_ids.append(league[0])
             cursor.executemany(
-                f'INSERT or IGNORE into {table_name} (player_id, name, team_name) \
-                    values (?,?,?)', data
+                f'INSERT into {table_name}_counts (LEAGUESIZE, player_id, pick, count) '
+                f'values (?,?,?,?) ON CONFLICT (LEAGUESIZE, player_id, pick) '
+                f'DO UPDATE SET count = count + excluded.count',
+                count_leagues(new_league_ids)
                 )
+        return len(new_league_ids)
 
-    def select_player_details(self, table_name:str, player_ids:List) -> List:
+    def iter_draft_pick_counts(self, table_name: str) -> Iterator[tuple]:
+        """Streams the stored (league size, player id, pick, count) rows"""
+        table_name = self._check_name(table_name)
+        return self._iter_rows(
+            f'SELECT LEAGUESIZE, player_id, pick, count from {table_name}_counts'
+            )
+
+    def select_draft_pick_leagues(self, table_name: str) -> List:
+        """(league size, leagues counted) per league size"""
+        table_name = self._check_name(table_name)
+        _, cursor = self._connect_db()
+        cursor.execute(
+            f'SELECT LEAGUESIZE, COUNT(*) from {table_name}_leagues GROUP BY LEAGUESIZE'
+            )
+        return cursor.fetchall()
+
+    def iter_leagues_without_draft_picks(self, league_table: str, table_name: str
+                                         ) -> Iterator[tuple]:
+        """Streams (league id, league size) rows of league_table not yet counted in table_name"""
+        league_table = self._check_name(league_table)
+        table_name = self._check_name(table_name)
+        return self._iter_rows(
+            f'SELECT l.LEAGUEID, l.LEAGUESIZE from {league_table} l '
+            f'LEFT JOIN {table_name}_leagues d ON d.LEAGUEID = l.LEAGUEID '
+            f'WHERE d.LEAGUEID IS NULL'
+            )
+
+    def create_transactions_tables(self, table_name: str) -> None:
+        """{table_name} holds every ingested transaction keyed by its id and {table_name}_marks
+        the highest transaction id ingested per league
+        """
+        table_name = self._check_name(table_name)
         conn, cursor = self._connect_db()
         with conn:
-            # Query the table
-            cursor.execute('''
-            SELECT player_id, name, team_name FROM {} WHERE player_id IN ({})
-            '''.format(table_name, ','.join(['?'] * len(player_ids))), player_ids)
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name}"
+                f"(id INTEGER PRIMARY KEY, LEAGUEID INT NOT NULL, entry INT, event INT,"
+                f"kind TEXT, result TEXT, element_in INT, element_out INT)"
+                )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_event ON {table_name} "
+                f"(event, kind, result)"
+                )
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name}_marks"
+                f"(LEAGUEID INTEGER PRIMARY KEY, last_id INT NOT NULL)"
+                )
 
-        results = cursor.fetchall()
-        return results
+    def select_transaction_marks(self, table_name: str) -> Dict[int, int]:
+        """{league id: highest transaction id ingested}"""
+        table_name = self._check_name(table_name)
+        return dict(self._iter_rows(f'SELECT LEAGUEID, last_id from {table_name}_marks'))
 
-    def select_all_player_ids(self, table_name: str) -> List:
+    def update_transactions(self, table_name: str, data: List, marks: List) -> None:
+        """Inserts transactions, (id, league id, entry, event, kind, result, element in,
+        element out) rows, and raises the leagues' high-water marks, (league id, last id) rows,
+        in one transaction so a mark never runs ahead of the rows it covers
+        """
+        table_name = self._check_name(table_name)
+        conn, cursor = self._connect_db()
+        with self._write_lock, conn:
+            cursor.executemany(
+                f'INSERT or IGNORE into {table_name} (id, LEAGUEID, entry, event, kind, result, '
+                f'element_in, element_out) values (?,?,?,?,?,?,?,?)', data
+                )
+            cursor.executemany(
+                f'INSERT into {table_name}_marks (LEAGUEID, last_id) values (?,?) '
+                f'ON CONFLICT (LEAGUEID) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)',
+                marks
+                )
+
+    def update_waiver_aggregates(self, table_name: str, league_table: str,
+                                 gameweeks: Iterable[int],
+                                 aggregate_table: str = 'player_aggregates') -> None:
+        """Recomputes the waivers_in and waivers_out aggregates of gameweeks only from the
+        accepted waivers in table_name. Leagues missing from league_table are counted under
+        league size -1. Only the league sizes with an accepted waiver are replaced, so sizes
+        written by LeagueStats.save_aggregates from a crawl of other leagues are kept.
+        """
+        table_name = self._check_name(table_name)
+        league_table = self._check_name(league_table)
+        aggregate_table = self._check_name(aggregate_table)
+        gameweeks = list(gameweeks)
+        if not gameweeks:
+            return
+        placeholders = ','.join(['?'] * len(gameweeks))
+        waivers = (
+            f"SELECT t.event, COALESCE(l.LEAGUESIZE, -1) AS LEAGUESIZE, t.LEAGUEID, "
+            f"t.element_in, t.element_out FROM {table_name} t "
+            f"LEFT JOIN {league_table} l ON l.LEAGUEID = t.LEAGUEID "
+            f"WHERE t.kind = 'w' AND t.result = 'a' AND t.event IN ({placeholders})"
+            )
+        conn, cursor = self._connect_db()
+        with self._write_lock, conn:
+            cursor.execute(f"SELECT DISTINCT event, LEAGUESIZE FROM ({waivers})", gameweeks)
+            keys = cursor.fetchall()
+            for stat, column in (('waivers_in', 'element_in'), ('waivers_out', 'element_out')):
+                self._delete_aggregates(cursor, aggregate_table, stat, keys)
+                cursor.execute(
+                    f"INSERT INTO {aggregate_table} (stat, event, LEAGUESIZE, player_id, count) "
+                    f"SELECT ?, event, LEAGUESIZE, {column}, COUNT(*) FROM ({waivers}) "
+                    f"GROUP BY event, LEAGUESIZE, {column}",
+                    [stat] + gameweeks
+                    )
+                # Leagues with an accepted waiver, the denominator used by LeagueStats
+                cursor.execute(
+                    f"INSERT INTO {aggregate_table}_leagues (stat, event, LEAGUESIZE, leagues) "
+                    f"SELECT ?, event, LEAGUESIZE, COUNT(DISTINCT LEAGUEID) FROM ({waivers}) "
+                    f"GROUP BY event, LEAGUESIZE",
+                    [stat] + gameweeks
+                    )
+
+    def create_aggregate_tables(self, table_name: str) -> None:
+        """Materialized per player aggregates, read by database.query_stats. {table_name} holds
+        the count of leagues of each size recording each stat ('ownership', 'waivers_in',
+        'waivers_out') for each player and gameweek, {table_name}_leagues the leagues counted.
+        The primary key serves point lookups and a gameweek range for one stat, the index a
+        player's history.
+        """
+        table_name = self._check_name(table_name)
         conn, cursor = self._connect_db()
         with conn:
             cursor.execute(
-                f'SELECT player_id from {table_name}'
-            )
-        return [item[0] for item in cursor.fetchall()]
+                f"CREATE TABLE IF NOT EXISTS {table_name}"
+                f"(stat TEXT NOT NULL, event INT NOT NULL, LEAGUESIZE INT NOT NULL,"
+                f"player_id INT NOT NULL, count INT NOT NULL,"
+                f"PRIMARY KEY (stat, event, LEAGUESIZE, player_id)) WITHOUT ROWID"
+                )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_player ON {table_name} "
+                f"(player_id, stat, LEAGUESIZE, event, count)"
+                )
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table_name}_leagues"
+                f"(stat TEXT NOT NULL, event INT NOT NULL, LEAGUESIZE INT NOT NULL,"
+                f"leagues INT NOT NULL, PRIMARY KEY (stat, event, LEAGUESIZE)) WITHOUT ROWID"
+                )
 
-    def get_league_ids(self, table_name: str, league_size: int) -> List:
+    @staticmethod
+    def _delete_aggregates(cursor: sqlite3.Cursor, table_name: str, stat: str,
+                           keys: List[Tuple[int, int]]) -> None:
+        # Only the (gameweek, league size) keys being replaced. The transaction ingest and a
+        # crawl both write waivers, each for its own league sizes.
+        for table in (table_name, f'{table_name}_leagues'):
+            cursor.executemany(
+                f'DELETE FROM {table} WHERE stat = ? AND event = ? AND LEAGUESIZE = ?',
+                [(stat, *key) for key in keys]
+                )
+
+    def replace_aggregates(self, table_name: str, stat: str, gameweek: int, counts: Iterable,
+                           leagues: Iterable) -> None:
+        """Replaces stat's aggregates for gameweek with counts, (league size, player id, count)
+        rows, and leagues, (league size, leagues counted) rows, in one transaction. Only the
+        league sizes in leagues are replaced.
+        """
+        table_name = self._check_name(table_name)
+        leagues = list(leagues)
+        conn, cursor = self._connect_db()
+        with self._write_lock, conn:
+            self._delete_aggregates(
+                cursor, table_name, stat, [(gameweek, league_size) for league_size, _ in leagues]
+                )
+            cursor.executemany(
+                f'INSERT into {table_name} (stat, event, LEAGUESIZE, player_id, count) '
+                f'values (?,?,?,?,?)',
+                ((stat, gameweek, *row) for row in counts)
+                )
+            cursor.executemany(
+                f'INSERT into {table_name}_leagues (stat, event, LEAGUESIZE, leagues) '
+                f'values (?,?,?,?)',
+                ((stat, gameweek, *row) for row in leagues)
+                )
+
+    def create_crawl_table(self, table_name: str) -> None:
+        """Checkpoint table of crawl jobs: one row per (job, item) with its status, attempts and
+        JSON encoded result
+        """
+        table_name = self._check_name(table_name)
         conn, cursor = self._connect_db()
         with conn:
             cursor.execute(
-                f'SELECT LEAGUEID from {table_name} WHERE LEAGUESIZE = {league_size}'
+                f"CREATE TABLE IF NOT EXISTS {table_name}"
+                f"(job TEXT NOT NULL, item INT NOT NULL, status INT NOT NULL DEFAULT 0,"
+                f"attempts INT NOT NULL DEFAULT 0, result TEXT,"
+                f"PRIMARY KEY (job, item)) WITHOUT ROWID"
+                )
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table_name}_status ON {table_name} (job, status)"
+                )
+
+    def add_crawl_items(self, table_name: str, job: str, items: Iterable[int]) -> None:
+        """Queues items for job, leaving any already queued untouched"""
+        table_name = self._check_name(table_name)
+        self._executemany_batched(
+            f'INSERT or IGNORE into {table_name} (job, item) values (?,?)',
+            ((job, item) for item in items)
             )
 
-        return [item[0] for item in cursor.fetchall()]
+    def update_crawl_items(self, table_name: str, job: str, data: Iterable) -> None:
+        """Records attempts, (item, status, result) rows, for job"""
+        table_name = self._check_name(table_name)
+        self._executemany_batched(
+            f'UPDATE {table_name} SET status = ?, result = ?, attempts = attempts + 1 '
+            f'WHERE job = ? AND item = ?',
+            ((status, result, job, item) for item, status, result in data)
+            )
+
+    def iter_crawl_items(self, table_name: str, job: str, status: int,
+                         max_attempts: Optional[int] = None) -> Iterator[tuple]:
+        """Streams (item, attempts, result) rows of job with status, optionally only those
+        attempted fewer than max_attempts times
+        """
+        table_name = self._check_name(table_name)
+        if max_attempts is None:
+            return self._iter_rows(
+                f'SELECT item, attempts, result from {table_name} WHERE job = ? AND status = ?',
+                (job, status)
+                )
+        return self._iter_rows(
+            f'SELECT item, attempts, result from {table_name} '
+            f'WHERE job = ? AND status = ? AND attempts < ?',
+            (job, status, max_attempts)
+            )
+
+    def count_crawl_items(self, table_name: str, job: str) -> Dict[int, int]:
+        """{status: items} for job"""
+        table_name = self._check_name(table_name)
+        _, cursor = self._connect_db()
+        cursor.execute(
+            f'SELECT status, COUNT(*) from {table_name} WHERE job = ? GROUP BY status', (job,)
+            )
+        return dict(cursor.fetchall())
+
+    def select_crawl_jobs(self, table_name: str) -> List[str]:
+        table_name = self._check_name(table_name)
+        _, cursor = self._connect_db()
+        cursor.execute(f'SELECT DISTINCT job from {table_name}')
+        return [job for job, in cursor.fetchall()]
+
+    def delete_crawl_job(self, table_name: str, job: str) -> None:
+        table_name = self._check_name(table_name)
+        conn, cursor = self._connect_db()
+        with self._write_lock, conn:
+            cursor.execute(f'DELETE FROM {table_name} WHERE job = ?', (job,))
+
+    @contextmanager
+    def _attached(self, source_db: str) -> Iterator[sqlite3.Cursor]:
+        """Cursor inside one write transaction with source_db attached as src, so rows are
+        copied between the databases in SQL without passing through Python
+        """
+        conn, cursor = self._connect_db()
+        with self._write_lock:
+            cursor.execute('ATTACH DATABASE ? AS src', (f'{source_db}.db',))
+            try:
+                with conn:
+                    yield cursor
+            finally:
+                cursor.execute('DETACH DATABASE src')
+
+    @staticmethod
+    def _source_has_table(cursor: sqlite3.Cursor, table_name: str) -> bool:
+        cursor.execute(
+            "SELECT 1 FROM src.sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+            )
+        return cursor.fetchone() is not None
+
+    def import_leagues(self, table_name: str, source_db: str,
+                       shard: Optional[Tuple[int, int]] = None) -> int:
+        """Copies the leagues of source_db's table_name not already stored, optionally only
+        those in shard (index, count), i.e. with an id congruent to index modulo count.
+        Returns the number of leagues added.
+        """
+        table_name = self._check_name(table_name)
+        with self._attached(source_db) as cursor:
+            if not self._source_has_table(cursor, table_name):
+                return 0
+            sql = (
+                f'INSERT or IGNORE into {table_name} (TIMESTAMP, LEAGUEID, LEAGUESIZE) '
+                f'SELECT TIMESTAMP, LEAGUEID, LEAGUESIZE FROM src.{table_name}'
+                )
+            if shard is None:
+                cursor.execute(sql)
+            else:
+                index, count = shard
+                cursor.execute(f'{sql} WHERE LEAGUEID % ? = ?', (count, index))
+            return cursor.rowcount
+
+    def import_fpl_players(self, table_name: str, source_db: str) -> None:
+        """Copies the players of source_db's table_name not already stored"""
+        table_name = self._check_name(table_name)
+        with self._attached(source_db) as cursor:
+            if self._source_has_table(cursor, table_name):
+                cursor.execute(
+                    f'INSERT or IGNORE into {table_name} (TIMESTAMP, player_id, name, team_name) '
+                    f'SELECT TIMESTAMP, player_id, name, team_name FROM src.{table_name}'
+                    )
+
+    def import_crawl_items(self, table_name: str, source_db: str, done_status: int) -> int:
+        """Merges source_db's crawl checkpoints into table_name. An item done here is kept,
+        otherwise the source's row wins if it is done or was attempted more often, so merging
+        the same source twice changes nothing. Returns the number of rows added or updated.
+        """
+        table_name = self._check_name(table_name)
+        with self._attached(source_db) as cursor:
+            if not self._source_has_table(cursor, table_name):
+                return 0
+            # WHERE true stops the parser reading ON CONFLICT as a join constraint
+            cursor.execute(
+                f'INSERT into {table_name} (job, item, status, attempts, result) '
+                f'SELECT job, item, status, attempts, result FROM src.{table_name} WHERE true '
+                f'ON CONFLICT (job, item) DO UPDATE SET status = excluded.status, '
+                f'attempts = excluded.attempts, result = excluded.result '
+                f'WHERE {table_name}.status != :done AND '
+                f'(excluded.status = :done OR excluded.attempts > {table_name}.attempts)',
+                {'done': done_status}
+                )
+            return cursor.rowcount
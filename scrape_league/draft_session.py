@@ -0,0 +1,261 @@
+"""
+DraftSession class. One long-lived, bounded connection pool shared by every request in a crawl
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import (AsyncIterator, Awaitable, Callable, Dict, Iterable, Optional, Tuple,
+                    TypeVar)
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector
+
+from scrape_league.rate_limiter import AdaptiveRateLimiter, RetryPolicy
+from scrape_league.response_cache import ResponseCache
+from scrape_league.response_memo import ResponseMemo
+from scrape_league.schemas import SchemaError
+from utils.metrics import Labels, Metrics, endpoint_of
+
+T = TypeVar('T')
+
+
+class DraftSession:
+    def __init__(self, max_concurrency: int = 50, connection_limit: int = 60,
+                 cache: Optional[ResponseCache] = None,
+                 rate_limiter: Optional[AdaptiveRateLimiter] = None,
+                 retry_policy: Optional[RetryPolicy] = None, timeout: float = 30.0,
+                 parse_workers: int = 0, metrics: Optional[Metrics] = None,
+                 memo: Optional[ResponseMemo] = None) -> None:
+        """Init method
+
+        Args:
+            max_concurrency (int, optional): Maximum requests in flight at once. Defaults to 50.
+            connection_limit (int, optional): Socket limit of the shared connector. Windows only
+                allows max 64 in async loop. Defaults to 60.
+            cache (ResponseCache, optional): On-disk response cache consulted before every
+                request. Defaults to None.
+            rate_limiter (AdaptiveRateLimiter, optional): Token bucket every request waits
+                on. Defaults to a new AdaptiveRateLimiter.
+            retry_policy (RetryPolicy, optional): Backoff and retry budget for transient
+                failures. Defaults to a new RetryPolicy.
+            timeout (float, optional): Total seconds allowed per request. Defaults to 30.0.
+            parse_workers (int, optional): Processes get_parsed decodes response bodies on.
+                0 parses on the event loop. Defaults to 0.
+            metrics (Metrics, optional): Records every request by endpoint and status, its
+                latency and size, retries, cache hits and parse time. Defaults to None.
+            memo (ResponseMemo, optional): Requests for a url already in flight wait on it
+                instead, and the bodies of the urls shared with the memo are kept for the
+                other scrapers of the run, consulted before the cache. Defaults to None.
+        """
+        self._max_concurrency = max_concurrency
+        self._connection_limit = connection_limit
+        self._cache = cache
+        self._rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self._retry_policy = retry_policy or RetryPolicy()
+        self._timeout = timeout
+        self._parse_workers = parse_workers
+        self._parse_executor: Optional[ProcessPoolExecutor] = None
+        self._metrics = metrics
+        self._memo = memo
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._session: Optional[ClientSession] = None
+
+    async def __aenter__(self) -> 'DraftSession':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        if self._session is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            connector = TCPConnector(limit=self._connection_limit)
+            self._session = ClientSession(
+                connector=connector, timeout=ClientTimeout(total=self._timeout)
+                )
+            if self._parse_workers > 0:
+                self._parse_executor = ProcessPoolExecutor(self._parse_workers)
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        if self._parse_executor is not None:
+            # Joining the workers blocks, so it runs off the event loop
+            executor, self._parse_executor = self._parse_executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+
+    async def get_json(self, url: str, ttl: Optional[float] = None) -> Optional[Dict]:
+        """Returns the decoded payload for url, or None if the request failed"""
+        _, data = await self.fetch(url, ttl)
+        return data
+
+    async def get_parsed(self, url: str, parse: Callable[[bytes], T],
+                         ttl: Optional[float] = None) -> Optional[T]:
+        """Returns parse(response body) for url, or None if the request failed or parse raised
+        SchemaError. With parse_workers, parse runs in the process pool so decoding large
+        payloads never blocks the event loop. parse must then be a picklable module level
+        function, and should return only the fields used, as its result is pickled back.
+        """
+        _, body = await self.fetch_bytes(url, ttl)
+        if body is None:
+            return None
+        start = time.perf_counter()
+        try:
+            if self._parse_executor is None:
+                return parse(body)
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._parse_executor, parse, body)
+        except SchemaError as e:
+            print(f"Invalid payload from {url}: {e}")
+            return None
+        finally:
+            if self._metrics is not None:
+                self._metrics.observe('fpl_parse_seconds', time.perf_counter() - start,
+                                      (('endpoint', endpoint_of(url)),))
+
+    async def fetch(self, url: str, ttl: Optional[float] = None
+                    ) -> Tuple[Optional[int], Optional[Dict]]:
+        """Returns (status, decoded payload) for url, as fetch_bytes"""
+        status, body = await self.fetch_bytes(url, ttl)
+        return status, None if body is None else json.loads(body)
+
+    async def fetch_bytes(self, url: str, ttl: Optional[float] = None
+                          ) -> Tuple[Optional[int], Optional[bytes]]:
+        """Returns (status, raw body) for url. The status is None if every attempt failed to
+        connect. A cached response younger than ttl (the cache's ttl for url if not given)
+        skips the request, as does a body already in the memo. Transient failures are retried
+        with backoff until the attempts or the shared retry budget run out.
+        """
+        if self._memo is not None:
+            return await self._memo.coalesce(url, lambda: self._fetch_bytes(url, ttl), ttl)
+        return await self._fetch_bytes(url, ttl)
+
+    async def _fetch_bytes(self, url: str, ttl: Optional[float] = None
+                           ) -> Tuple[Optional[int], Optional[bytes]]:
+        labels: Labels = () if self._metrics is None else (('endpoint', endpoint_of(url)),)
+        headers = {}
+        if self._cache is not None:
+            body = self._cache.get(url, ttl)
+            if body is not None:
+                if self._metrics is not None:
+                    self._metrics.inc('fpl_cache_hits_total', labels)
+                return 200, body
+            headers = self._cache.validators(url)
+
+        status, error = None, None
+        for attempt in range(self._retry_policy.max_attempts):
+            error = None
+            await self._rate_limiter.acquire()
+            self._retry_policy.record_request()
+            async with self._semaphore:
+                if self._metrics is not None:
+                    self._metrics.add_gauge('fpl_requests_in_flight', 1)
+                    start = time.perf_counter()
+                try:
+                    async with self._session.get(url, headers=headers) as resp:
+                        status = resp.status
+                        if status == 304 and self._cache is not None:
+                            body = self._cache.revalidated(url)
+                            if body is not None:
+                                self._rate_limiter.on_success()
+                                return 200, body
+                            headers = {}
+                        elif status == 200:
+                            body = await resp.read()
+                            if self._metrics is not None:
+                                self._metrics.inc('fpl_response_bytes_total', labels, len(body))
+                            self._rate_limiter.on_success()
+                            if self._cache is not None:
+                                self._cache.store(url, body, resp.headers)
+                            return status, body
+                        elif status == 429:
+                            self._rate_limiter.on_throttle(
+                                self._retry_policy.retry_after(resp.headers)
+                                )
+                        elif not self._retry_policy.is_transient(status):
+                            # e.g. 404 for an unused league id, an answer rather than an error
+                            return status, None
+                except (ClientError, asyncio.TimeoutError) as e:
+                    status, error = None, e
+                finally:
+                    if self._metrics is not None:
+                        self._record_attempt(labels, status, time.perf_counter() - start)
+
+            if attempt + 1 == self._retry_policy.max_attempts or not self._retry_policy.spend():
+                break
+            if self._metrics is not None:
+                self._metrics.inc('fpl_retries_total', labels)
+            await asyncio.sleep(self._retry_policy.backoff(attempt))
+
+        print(f"Error retrieving {url}: {status if error is None else repr(error)}")
+        return status, None
+
+    def _record_attempt(self, labels: Labels, status: Optional[int], seconds: float) -> None:
+        self._metrics.add_gauge('fpl_requests_in_flight', -1)
+        self._metrics.observe('fpl_request_seconds', seconds, labels)
+        self._metrics.inc(
+            'fpl_requests_total', (*labels, ('status', 'error' if status is None else str(status)))
+            )
+
+    async def imap_unordered(self, func: Callable[[int], Awaitable], items: Iterable
+                             ) -> AsyncIterator[Tuple[int, object]]:
+        """Runs func over items with at most max_concurrency calls in flight and yields
+        (item, result) pairs as they complete. Items are pulled lazily so a long league list
+        never materialises as thousands of pending tasks.
+        """
+        iterator = iter(items)
+        results: asyncio.Queue = asyncio.Queue(maxsize=self._max_concurrency)
+        done = object()
+
+        async def worker() -> None:
+            try:
+                for item in iterator:
+                    await results.put((item, await func(item)))
+            except Exception as e:
+                await results.put(e)
+            await results.put(done)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self._max_concurrency)]
+        finished = 0
+        try:
+            while finished < len(workers):
+                result = await results.get()
+                if result is done:
+                    finished += 1
+                elif isinstance(result, Exception):
+                    raise result
+                else:
+                    yield result
+        finally:
+            for task in workers:
+                task.cancel()
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        return self._cache
+
+    @property
+    def memo(self) -> Optional[ResponseMemo]:
+        return self._memo
+
+    @property
+    def rate_limiter(self) -> AdaptiveRateLimiter:
+        return self._rate_limiter
+
+    @property
+    def retry_policy(self) -> RetryPolicy:
+        return self._retry_policy
+
+    @property
+    def max_concurrency(self) -> int:
+        return self._max_concurrency
+
+    @property
+    def parse_workers(self) -> int:
+        return self._parse_workers
+
+    @property
+    def metrics(self) -> Optional[Metrics]:
+        return self._metrics
@@ -0,0 +1,67 @@
+"""
+Reconstructs a league's ownership for every gameweek from its draft choices plus a replay of its
+accepted waivers and free agent moves, two requests per league instead of one entry/event
+request per entry per gameweek
+"""
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+from scrape_league.draft_session import DraftSession
+from scrape_league.schemas import Choice, Transaction, decode_choices, decode_transactions
+from utils.fpl_constants import DRAFT_API_URL
+
+GameweekOwnership = Dict[int, List[int]]
+LeagueGameweekOwnership = Tuple[int, Optional[GameweekOwnership]]
+
+
+class LeagueOwnershipHistory:
+    @classmethod
+    async def get_ownership_by_gameweek(cls, league_id: int, gameweeks: Iterable[int],
+                                        session: DraftSession
+                                        ) -> Optional[GameweekOwnership]:
+        """Returns {gameweek: player ids owned in the league} for each of gameweeks, or None if
+        either request failed. Trades only move players between teams in the league, so
+        league-level ownership does not need them.
+        """
+        choices, transactions = await asyncio.gather(
+            session.get_parsed(f'{DRAFT_API_URL}/draft/{league_id}/choices', decode_choices),
+            session.get_parsed(f'{DRAFT_API_URL}/draft/league/{league_id}/transactions',
+                               decode_transactions),
+            )
+        if choices is None or transactions is None:
+            return None
+        return cls._replay(choices, transactions, gameweeks)
+
+    @classmethod
+    async def iter_ownership_by_gameweek(cls, league_ids: Iterable[int],
+                                         gameweeks: Iterable[int], session: DraftSession
+                                         ) -> AsyncIterator[LeagueGameweekOwnership]:
+        """Reconstructs every league concurrently, yielding (league_id, ownership by gameweek)
+        pairs in completion order
+        """
+        gameweeks = list(gameweeks)
+        async for league_id, ownership in session.imap_unordered(
+                lambda _id: cls.get_ownership_by_gameweek(_id, gameweeks, session), league_ids):
+            yield league_id, ownership
+
+    @classmethod
+    def _replay(cls, choices: List[Choice], transactions: List[Transaction],
+                gameweeks: Iterable[int]) -> GameweekOwnership:
+        owned = {choice.element for choice in choices}
+
+        # Accepted moves in the order they were processed. A move with event g takes effect
+        # for gameweek g.
+        moves = sorted(
+            (event for event in transactions if event.result == 'a'),
+            key=lambda event: (event.event, event.id)
+            )
+
+        ownership: GameweekOwnership = {}
+        move_idx = 0
+        for gameweek in sorted(gameweeks):
+            while move_idx < len(moves) and moves[move_idx].event <= gameweek:
+                owned.discard(moves[move_idx].element_out)
+                owned.add(moves[move_idx].element_in)
+                move_idx += 1
+            ownership[gameweek] = sorted(owned)
+        return ownership
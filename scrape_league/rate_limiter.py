@@ -0,0 +1,151 @@
+"""
+AdaptiveRateLimiter and RetryPolicy classes. Shared request scheduling for DraftSession: a token
+bucket that backs off when the API throttles us, and exponential backoff with a retry budget
+for transient failures
+"""
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Mapping, Optional
+
+# Statuses worth retrying. Anything else (e.g. 404 for an unused league id) is final.
+TRANSIENT_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, rate: float = 50.0, burst: int = 50, min_rate: float = 1.0,
+                 max_rate: float = 200.0, increase: float = 1.0, decrease: float = 0.5,
+                 cooldown: float = 1.0) -> None:
+        """Init method. The rate grows additively on success and shrinks multiplicatively on a
+        429 (AIMD), so it settles just under the rate the API will sustain.
+
+        Args:
+            rate (float, optional): Starting requests per second. Defaults to 50.0.
+            burst (int, optional): Bucket size, the most requests sent back to back.
+                Defaults to 50.
+            min_rate (float, optional): Floor for the rate. Defaults to 1.0.
+            max_rate (float, optional): Ceiling for the rate. Defaults to 200.0.
+            increase (float, optional): Requests per second added for every second of
+                successful requests at the current rate. Defaults to 1.0.
+            decrease (float, optional): Factor the rate is multiplied by on a 429.
+                Defaults to 0.5.
+            cooldown (float, optional): Seconds after a decrease, or after the Retry-After
+                pause if longer, in which further 429s do not shrink the rate again. They
+                answer requests sent before the rate was cut. Defaults to 1.0.
+        """
+        self._rate = rate
+        self._burst = burst
+        self._min_rate = min_rate
+        self._max_rate = max_rate
+        self._increase = increase
+        self._decrease = decrease
+        self._cooldown = cooldown
+        self._cooldown_until = 0.0
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Waits until a request may be sent"""
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            self._refill(now)
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def on_success(self) -> None:
+        self._rate = min(self._max_rate, self._rate + self._increase / self._rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None) -> None:
+        """Backs off after a 429, pausing all requests for retry_after seconds if given. The
+        rate is cut at most once per cool-down window, so a burst of concurrent 429s halves it
+        once rather than once per request.
+        """
+        now = time.monotonic()
+        if now >= self._cooldown_until:
+            self._rate = max(self._min_rate, self._rate * self._decrease)
+            self._cooldown_until = now + max(self._cooldown, retry_after or 0.0)
+        self._tokens = min(self._tokens, 0.0)
+        if retry_after:
+            self._paused_until = max(self._paused_until, now + retry_after)
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.5, max_delay: float = 30.0,
+                 budget_ratio: float = 0.2, min_budget: int = 20) -> None:
+        """Init method
+
+        Args:
+            max_attempts (int, optional): Attempts per request, including the first.
+                Defaults to 5.
+            base_delay (float, optional): Backoff cap of the first retry in seconds, doubled
+                for each further attempt. Defaults to 0.5.
+            max_delay (float, optional): Largest backoff in seconds. Defaults to 30.0.
+            budget_ratio (float, optional): Retries allowed per request sent, so an outage
+                cannot multiply traffic. Defaults to 0.2.
+            min_budget (int, optional): Retries always allowed on top of the ratio.
+                Defaults to 20.
+        """
+        self._max_attempts = max_attempts
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+        self._budget_ratio = budget_ratio
+        self._min_budget = min_budget
+        self._requests = 0
+        self._retries = 0
+
+    def record_request(self) -> None:
+        self._requests += 1
+
+    def spend(self) -> bool:
+        """Takes a retry from the budget, returning False if it is exhausted"""
+        if self._retries >= self._min_budget + self._budget_ratio * self._requests:
+            return False
+        self._retries += 1
+        return True
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: uniform over [0, capped exponential]
+        return random.uniform(0, min(self._max_delay, self._base_delay * 2 ** attempt))
+
+    @staticmethod
+    def is_transient(status: Optional[int]) -> bool:
+        # A None status is a connection error or timeout
+        return status is None or status in TRANSIENT_STATUSES
+
+    @staticmethod
+    def retry_after(headers: Mapping[str, str]) -> Optional[float]:
+        """Seconds requested by a Retry-After header, given as seconds or an HTTP date"""
+        value = headers.get('Retry-After')
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def max_attempts(self) -> int:
+        return self._max_attempts
+
+    @property
+    def retries(self) -> int:
+        return self._retries
@@ -0,0 +1,230 @@
+"""
+ResponseCache class. Persistent on-disk cache of draft API responses keyed by url, so re-running
+an analysis reuses payloads already downloaded instead of hitting the API again
+"""
+import json
+import re
+import sqlite3
+import time
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import requests
+
+from scrape_league.response_memo import ResponseMemo
+
+# Use as a ttl to serve a cached response however old it is
+FOREVER = float('inf')
+
+# First matching pattern wins. Transactions only change while a gameweek is in play, so a
+# caller that knows its gameweeks are finished can request them with ttl=FOREVER. Choices are
+# final once the draft is made, but a league yet to draft answers with none, or some mid-draft,
+# so they expire too.
+DEFAULT_TTLS: List[Tuple[str, float]] = [
+    (r'/bootstrap-static$', 6 * 60 * 60),
+    (r'/draft/\d+/choices$', 24 * 60 * 60),
+    (r'/league/\d+/details$', 60 * 60),
+    (r'/league/\d+/element-status$', 15 * 60),
+    (r'/draft/league/\d+/transactions$', 60 * 60),
+    (r'/entry/\d+/event/\d+$', 60 * 60),
+]
+
+
+class ResponseCache:
+    def __init__(self, db_name: str = 'database/http_cache', max_bytes: int = 512 * 1024 ** 2,
+                 ttls: Optional[List[Tuple[str, float]]] = None, default_ttl: float = 60 * 60
+                 ) -> None:
+        """Init method
+
+        Args:
+            db_name (str, optional): SQLite file the responses are stored in, without the .db
+                suffix. Defaults to 'database/http_cache'.
+            max_bytes (int, optional): Total body size kept before the least recently used
+                responses are evicted. Defaults to 512MB.
+            ttls (List[Tuple[str, float]], optional): (url regex, seconds) pairs, first match
+                wins. Defaults to DEFAULT_TTLS.
+            default_ttl (float, optional): ttl of urls matching no pattern. Defaults to 1 hour.
+        """
+        self._db_name = db_name
+        # Opened on first use, like ManageDatabase, so importing app has no side effects
+        self._conn: Optional[sqlite3.Connection] = None
+        self._max_bytes = max_bytes
+        self._ttls = [(re.compile(pattern), ttl) for pattern, ttl in (ttls or DEFAULT_TTLS)]
+        self._default_ttl = default_ttl
+        self._total_bytes = 0
+
+        self._hits = 0
+        self._misses = 0
+        self._revalidations = 0
+        self._evictions = 0
+
+    @property
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(f"{self._db_name}.db")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses"
+                "(url TEXT PRIMARY KEY,"
+                "body BLOB NOT NULL,"
+                "etag TEXT,"
+                "last_modified TEXT,"
+                "fetched_at REAL NOT NULL,"
+                "accessed_at REAL NOT NULL,"
+                "size INT NOT NULL)"
+                )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+                )
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses"
+                ).fetchone()[0]
+        return self._conn
+
+    def ttl_for(self, url: str) -> float:
+        for pattern, ttl in self._ttls:
+            if pattern.search(url):
+                return ttl
+        return self._default_ttl
+
+    def get(self, url: str, ttl: Optional[float] = None) -> Optional[bytes]:
+        """Returns the cached body for url if it is younger than ttl (the url's configured
+        ttl if not given), otherwise None
+        """
+        row = self._db.execute(
+            "SELECT body, fetched_at FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        if ttl is None:
+            ttl = self.ttl_for(url)
+        now = time.time()
+        if row is None or now - row[1] > ttl:
+            self._misses += 1
+            return None
+        self._hits += 1
+        with self._db:
+            self._db.execute("UPDATE responses SET accessed_at = ? WHERE url = ?", (now, url))
+        return row[0]
+
+    def validators(self, url: str) -> Dict[str, str]:
+        """Conditional request headers for a stale cached response"""
+        row = self._db.execute(
+            "SELECT etag, last_modified FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+        headers = {}
+        if row is not None:
+            if row[0]:
+                headers['If-None-Match'] = row[0]
+            if row[1]:
+                headers['If-Modified-Since'] = row[1]
+        return headers
+
+    def revalidated(self, url: str) -> Optional[bytes]:
+        """Marks a cached response as fresh after a 304 and returns its body"""
+        now = time.time()
+        with self._db:
+            self._db.execute(
+                "UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE url = ?",
+                (now, now, url)
+                )
+        row = self._db.execute("SELECT body FROM responses WHERE url = ?", (url,)).fetchone()
+        if row is not None:
+            self._revalidations += 1
+            return row[0]
+        return None
+
+    def store(self, url: str, body: bytes, headers: Mapping[str, str]) -> None:
+        now = time.time()
+        with self._db:
+            old = self._db.execute(
+                "SELECT size FROM responses WHERE url = ?", (url,)
+                ).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses "
+                "(url, body, etag, last_modified, fetched_at, accessed_at, size) "
+                "VALUES (?,?,?,?,?,?,?)",
+                (url, body, headers.get('ETag'), headers.get('Last-Modified'), now, now, len(body))
+                )
+        self._total_bytes += len(body) - (old[0] if old else 0)
+        if self._total_bytes > self._max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        # Drop least recently used responses until back under 90% of max_bytes
+        target = self._max_bytes * 0.9
+        with self._db:
+            rows = self._db.execute(
+                "SELECT url, size FROM responses ORDER BY accessed_at"
+                )
+            evict = []
+            for url, size in rows:
+                if self._total_bytes <= target:
+                    break
+                evict.append((url,))
+                self._total_bytes -= size
+            self._db.executemany("DELETE FROM responses WHERE url = ?", evict)
+        self._evictions += len(evict)
+
+    def clear(self) -> None:
+        with self._db:
+            self._db.execute("DELETE FROM responses")
+        self._total_bytes = 0
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self._hits,
+            'misses': self._misses,
+            'revalidations': self._revalidations,
+            'evictions': self._evictions,
+            'bytes': self._total_bytes,
+        }
+
+
+def cached_get(url: str, cache: Optional[ResponseCache] = None,
+               ttl: Optional[float] = None, memo: Optional[ResponseMemo] = None
+               ) -> Optional[bytes]:
+    """Blocking GET through the memo and the cache for the scrapers that use requests,
+    returning the raw body or None if the request failed
+    """
+    if memo is not None:
+        body = memo.get(url, ttl)
+        if body is not None:
+            return body
+        body = _cached_get(url, cache, ttl)
+        if body is not None:
+            memo.put(url, body)
+        return body
+    return _cached_get(url, cache, ttl)
+
+
+def _cached_get(url: str, cache: Optional[ResponseCache], ttl: Optional[float]
+                ) -> Optional[bytes]:
+    if cache is not None:
+        body = cache.get(url, ttl)
+        if body is not None:
+            return body
+
+    headers = cache.validators(url) if cache is not None else {}
+    response = requests.get(url, headers=headers)
+    if response.status_code == 304 and cache is not None:
+        body = cache.revalidated(url)
+        if body is not None:
+            return body
+        response = requests.get(url)
+    if response.status_code != 200:
+        print(f"Error retrieving {url}: {response.status_code}")
+        return None
+    if cache is not None:
+        cache.store(url, response.content, response.headers)
+    return response.content
+
+
+def cached_get_json(url: str, cache: Optional[ResponseCache] = None,
+                    ttl: Optional[float] = None, memo: Optional[ResponseMemo] = None
+                    ) -> Optional[Dict]:
+    """cached_get, decoded"""
+    body = cached_get(url, cache, ttl, memo)
+    return None if body is None else json.loads(body)
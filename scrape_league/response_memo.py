@@ -0,0 +1,145 @@
+"""
+ResponseMemo class. Concurrent DraftSession requests for a url already in flight wait on that
+request instead of sending their own. Bodies of the urls shared with the memo, those another
+scraper of the run reads again, are also kept in an in-memory LRU, so a job combining scrapers
+never downloads them twice. Other bodies are not kept, so a crawl's responses do not churn
+through the memo.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from utils.metrics import Metrics, endpoint_of
+
+Fetched = Tuple[Optional[int], Optional[bytes]]
+
+
+class ResponseMemo:
+    def __init__(self, max_bytes: int = 64 * 1024 ** 2,
+                 metrics: Optional[Metrics] = None) -> None:
+        """Init method
+
+        Args:
+            max_bytes (int, optional): Total body size kept before the least recently used
+                bodies are dropped. Defaults to 64MB.
+            metrics (Metrics, optional): Counts the requests saved, by endpoint. Defaults to
+                None.
+        """
+        self._max_bytes = max_bytes
+        self._metrics = metrics
+        # Urls whose bodies are kept once fetched
+        self._shared: Set[str] = set()
+        # url to (body, time fetched), least recently used first
+        self._bodies: 'OrderedDict[str, Tuple[bytes, float]]' = OrderedDict()
+        self._total_bytes = 0
+        # Requests in flight on the event loop, by url
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        # The blocking scrapers may share the memo from other threads
+        self._lock = threading.Lock()
+
+        self._hits = 0
+        self._coalesced = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def share(self, urls: Iterable[str]) -> None:
+        """Keeps the bodies of urls once fetched, for the scrapers later in the run that read
+        them again
+        """
+        with self._lock:
+            self._shared.update(urls)
+
+    def get(self, url: str, ttl: Optional[float] = None) -> Optional[bytes]:
+        """Returns the body fetched for url this run, or None if there is none. With a ttl,
+        only a body younger than ttl seconds is returned.
+        """
+        body = self._lookup(url, ttl)
+        if body is None:
+            self._misses += 1
+        else:
+            self._hits += 1
+            self._count(url)
+        return body
+
+    def _lookup(self, url: str, ttl: Optional[float]) -> Optional[bytes]:
+        with self._lock:
+            entry = self._bodies.get(url)
+            if entry is None or (ttl is not None and time.time() - entry[1] > ttl):
+                return None
+            self._bodies.move_to_end(url)
+        return entry[0]
+
+    def put(self, url: str, body: bytes) -> None:
+        """Keeps body if url is shared, otherwise does nothing"""
+        if url not in self._shared or len(body) > self._max_bytes:
+            return
+        with self._lock:
+            old = self._bodies.pop(url, None)
+            if old is not None:
+                self._total_bytes -= len(old[0])
+            self._bodies[url] = (body, time.time())
+            self._total_bytes += len(body)
+            while self._total_bytes > self._max_bytes:
+                _, (evicted, _) = self._bodies.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self._evictions += 1
+
+    async def coalesce(self, url: str, fetch: Callable[[], Awaitable[Fetched]],
+                       ttl: Optional[float] = None) -> Fetched:
+        """Returns (status, body) for url from the memo, from the request for url already in
+        flight, or else from fetch(), whose successful body is then kept if url is shared
+        """
+        while True:
+            body = self._lookup(url, ttl)
+            if body is not None:
+                self._hits += 1
+                self._count(url)
+                return 200, body
+            future = self._in_flight.get(url)
+            if future is None:
+                break
+            self._coalesced += 1
+            self._count(url)
+            try:
+                # Shielded, so a waiter being cancelled leaves the request to the others
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The task sending the request was cancelled, so send it again
+
+        self._misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[url] = future
+        try:
+            status, body = await fetch()
+        except BaseException:
+            future.cancel()
+            raise
+        finally:
+            del self._in_flight[url]
+        if body is not None:
+            self.put(url, body)
+        future.set_result((status, body))
+        return status, body
+
+    def _count(self, url: str) -> None:
+        if self._metrics is not None:
+            self._metrics.inc('fpl_memo_hits_total', (('endpoint', endpoint_of(url)),))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bodies.clear()
+            self._total_bytes = 0
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {
+            'hits': self._hits,
+            'coalesced': self._coalesced,
+            'misses': self._misses,
+            'evictions': self._evictions,
+            'bytes': self._total_bytes,
+        }
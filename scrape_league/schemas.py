@@ -0,0 +1,189 @@
+"""
+Typed schemas for the draft API payloads the scrapers read. Each decode_* function turns a raw
+response body into compact __slots__ objects holding only the fields used, checking each one
+on the way, so the full payload dicts are dropped as soon as a response is decoded and a
+malformed payload raises SchemaError instead of failing somewhere downstream.
+
+orjson is used to decode the JSON when it is installed, json otherwise.
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+
+class SchemaError(ValueError):
+    """A payload is missing a required field or has a field of the wrong type"""
+
+
+_INT = (int,)
+_STR = (str,)
+_BOOL = (bool,)
+
+
+def _field(obj: Dict, name: str, types: Tuple[type, ...], optional: bool = False) -> Any:
+    # An exact type match, so a bool is not accepted where an int is expected
+    value = obj.get(name)
+    if type(value) in types:
+        return value
+    if value is None:
+        if optional:
+            return None
+        raise SchemaError(f"missing field {name!r}")
+    raise SchemaError(f"field {name!r} has type {type(value).__name__}")
+
+
+def _list(obj: Any, name: str) -> List:
+    if not isinstance(obj, dict):
+        raise SchemaError(f"expected an object holding {name!r}")
+    value = obj.get(name, [])
+    if not isinstance(value, list):
+        raise SchemaError(f"field {name!r} has type {type(value).__name__}")
+    return value
+
+
+def _object(obj: Any) -> Dict:
+    if not isinstance(obj, dict):
+        raise SchemaError(f"expected an object, got {type(obj).__name__}")
+    return obj
+
+
+class ElementStatus:
+    """/league/{id}/element-status entry"""
+    __slots__ = ('element', 'owner')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.element: int = _field(obj, 'element', _INT)
+        self.owner: Optional[int] = _field(obj, 'owner', _INT, optional=True)
+
+
+class LeagueEntry:
+    """/league/{id}/details league_entries entry"""
+    __slots__ = ('id', 'entry_name', 'player_first_name')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.id: int = _field(obj, 'id', _INT)
+        self.entry_name: Optional[str] = _field(obj, 'entry_name', _STR, optional=True)
+        self.player_first_name: Optional[str] = _field(
+            obj, 'player_first_name', _STR, optional=True
+            )
+
+
+class Match:
+    """/league/{id}/details h2h matches entry"""
+    __slots__ = ('event', 'finished', 'league_entry_1', 'league_entry_1_points',
+                 'league_entry_2', 'league_entry_2_points')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.event: int = _field(obj, 'event', _INT)
+        self.finished: bool = bool(_field(obj, 'finished', _BOOL, optional=True))
+        self.league_entry_1: Optional[int] = _field(obj, 'league_entry_1', _INT, optional=True)
+        self.league_entry_1_points: int = _field(obj, 'league_entry_1_points', _INT)
+        self.league_entry_2: Optional[int] = _field(obj, 'league_entry_2', _INT, optional=True)
+        self.league_entry_2_points: int = _field(obj, 'league_entry_2_points', _INT)
+
+
+class LeagueDetails:
+    """/league/{id}/details. Matches are only decoded for h2h leagues."""
+    __slots__ = ('id', 'scoring', 'entries', 'matches')
+
+    def __init__(self, obj: Dict) -> None:
+        league = _object(_object(obj).get('league'))
+        self.id: int = _field(league, 'id', _INT)
+        self.scoring: Optional[str] = _field(league, 'scoring', _STR, optional=True)
+        self.entries: List[LeagueEntry] = [
+            LeagueEntry(entry) for entry in _list(obj, 'league_entries')
+            ]
+        self.matches: List[Match] = [
+            Match(match) for match in _list(obj, 'matches')
+            ] if self.scoring == 'h' else []
+
+
+class Transaction:
+    """/draft/league/{id}/transactions entry"""
+    __slots__ = ('id', 'entry', 'event', 'kind', 'result', 'element_in', 'element_out')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.id: int = _field(obj, 'id', _INT)
+        self.entry: Optional[int] = _field(obj, 'entry', _INT, optional=True)
+        self.event: int = _field(obj, 'event', _INT)
+        self.kind: str = _field(obj, 'kind', _STR)
+        self.result: str = _field(obj, 'result', _STR)
+        self.element_in: int = _field(obj, 'element_in', _INT)
+        self.element_out: int = _field(obj, 'element_out', _INT)
+
+
+class Choice:
+    """/draft/{id}/choices entry"""
+    __slots__ = ('element', 'entry', 'pick')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.element: int = _field(obj, 'element', _INT)
+        self.entry: Optional[int] = _field(obj, 'entry', _INT, optional=True)
+        self.pick: int = _field(obj, 'pick', _INT)
+
+
+class Element:
+    """/bootstrap-static elements entry"""
+    __slots__ = ('id', 'web_name', 'team')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.id: int = _field(obj, 'id', _INT)
+        self.web_name: str = _field(obj, 'web_name', _STR)
+        self.team: int = _field(obj, 'team', _INT)
+
+
+class Team:
+    """/bootstrap-static teams entry"""
+    __slots__ = ('id', 'name')
+
+    def __init__(self, obj: Dict) -> None:
+        obj = _object(obj)
+        self.id: int = _field(obj, 'id', _INT)
+        self.name: str = _field(obj, 'name', _STR)
+
+
+class BootstrapStatic:
+    """/bootstrap-static"""
+    __slots__ = ('elements', 'teams')
+
+    def __init__(self, obj: Dict) -> None:
+        self.elements: List[Element] = [Element(element) for element in _list(obj, 'elements')]
+        self.teams: List[Team] = [Team(team) for team in _list(obj, 'teams')]
+
+
+def loads(body: Union[bytes, str]) -> Any:
+    try:
+        return _loads(body)
+    except ValueError as e:
+        raise SchemaError(f"invalid JSON: {e}") from None
+
+
+def decode_element_status(body: Union[bytes, str]) -> List[ElementStatus]:
+    return [ElementStatus(status) for status in _list(loads(body), 'element_status')]
+
+
+def decode_details(body: Union[bytes, str]) -> LeagueDetails:
+    return LeagueDetails(loads(body))
+
+
+def decode_transactions(body: Union[bytes, str]) -> List[Transaction]:
+    return [Transaction(event) for event in _list(loads(body), 'transactions')]
+
+
+def decode_choices(body: Union[bytes, str]) -> List[Choice]:
+    return [Choice(choice) for choice in _list(loads(body), 'choices')]
+
+
+def decode_bootstrap_static(body: Union[bytes, str]) -> BootstrapStatic:
+    return BootstrapStatic(loads(body))
@@ -0,0 +1,43 @@
+from typing import Dict, List, Optional
+
+from scrape_league.draft_session import DraftSession
+from scrape_league.schemas import Choice, decode_choices
+from utils.fpl_constants import DRAFT_API_URL
+
+DraftPicks = Dict[int, int]
+
+
+class DraftChoices:
+    @classmethod
+    async def get_draft_picks(cls, league_id: int, session: Optional[DraftSession] = None
+                              ) -> Optional[DraftPicks]:
+        """Retrieves a league's draft order.
+
+        Args:
+            league_id: The ID of the league.
+            session: Shared DraftSession. A single-use session is opened if not given.
+
+        Returns:
+            {player_id: overall pick number}, empty if the league has not drafted yet, or None
+            if the request failed.
+        """
+        if session is None:
+            async with DraftSession(max_concurrency=1) as session:
+                return await cls.get_draft_picks(league_id, session)
+
+        picks = await session.get_parsed(
+            f"{DRAFT_API_URL}/draft/{league_id}/choices", _decode_draft_picks
+            )
+        if picks is not None:
+            return picks
+        print("Error retrieving draft choices for league {}".format(league_id))
+        return None
+
+    @staticmethod
+    def _parse_draft_picks(choices: List[Choice]) -> DraftPicks:
+        return {choice.element: choice.pick for choice in choices}
+
+
+# Module level so DraftSession can run it in its parse process pool
+def _decode_draft_picks(body: bytes) -> DraftPicks:
+    return DraftChoices._parse_draft_picks(decode_choices(body))
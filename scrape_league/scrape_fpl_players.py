@@ -1,33 +1,37 @@
-from typing import List
-import requests
+from typing import List, Optional
+
+from scrape_league.response_cache import ResponseCache, cached_get
+from scrape_league.schemas import SchemaError, decode_bootstrap_static
+from utils.fpl_constants import DRAFT_API_URL
 
 class FantasyFootballMetadata:
-    def __init__(self) -> None:
-        self.url = "https://draft.premierleague.com/api/bootstrap-static"
+    def __init__(self, cache: Optional[ResponseCache] = None) -> None:
+        self.url = f"{DRAFT_API_URL}/bootstrap-static"
+        self._cache = cache
         self.players = []
         self.teams = {}
         self.team_names = {}
 
     def _get_data(self) -> None:
-        response = requests.get(self.url)
-        data = response.json()
-        self.players = data.get("elements")
-        self.teams = data.get("teams")
+        body = cached_get(self.url, self._cache)
+        if body is None:
+            return
+        try:
+            data = decode_bootstrap_static(body)
+        except SchemaError as e:
+            print(f"Invalid payload from {self.url}: {e}")
+            return
+        self.players = data.elements
+        self.teams = data.teams
 
     def _get_teams(self) -> None:
         for team in self.teams:
-            team_id = team.get("id")
-            team_name = team.get("name")
-            self.team_names[team_id] = team_name
+            self.team_names[team.id] = team.name
 
     def get_player_names(self) -> List:
         self._get_data()
         self._get_teams()
         player_data = []
         for player in self.players:
-            player_id = player.get("id")
-            name = player.get("web_name")
-            team_id = player.get("team")
-            team_name = self.team_names[team_id]
-            player_data.append((player_id, name, team_name))
+            player_data.append((player.id, player.web_name, self.team_names[player.team]))
         return player_data
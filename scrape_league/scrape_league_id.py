@@ -2,59 +2,200 @@
 ScrapeLeagueID class. Scrapes chunks of league ids and ids as well as league size
 """
 import asyncio
-from typing import Dict, List
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
 
-from aiohttp import ClientSession, TCPConnector
+from database.async_writer import AsyncBatchWriter
+from scrape_league.draft_session import DraftSession
+from scrape_league.schemas import SchemaError, decode_details
+from utils.fpl_constants import DRAFT_API_URL
+from utils.probe_bitmap import ERROR, HIT, MISS, ProbeBitmap
+
+
+class _SearchFailed(Exception):
+    """Probes around a point of the upper bound search kept failing"""
 
 
 class ScrapeLeagueID:
-    def __init__(self, max_api_requests:int=250) -> None:
+    def __init__(self, max_api_requests:int=250,
+                 probe_bitmap: Optional[ProbeBitmap] = None) -> None:
         """Init method
 
         Args:
             max_api_requests (int, optional): _description_. Defaults to 250.
+            probe_bitmap (ProbeBitmap, optional): Records the outcome of every id probed.
+                Defaults to None.
         """
-        self._fpl_league = 'https://draft.premierleague.com/api/league/'
+        self._fpl_league = f'{DRAFT_API_URL}/league/'
         self._max_api_requests = max_api_requests
         self._valid_ids = []
+        # Ids still failing after the session's retries, to be searched again later
+        self._failed_ids = []
+        self._probe_bitmap = probe_bitmap
+        # When set, valid ids are streamed to the writer instead of collected in valid_ids
+        self._writer: Optional[AsyncBatchWriter] = None
 
-    async def league_search_async(self, league_id:List) -> None:
-        """Searches for league ids and returns list of valid ids"""
-        # Set socket limit to 60 as windows only allows max 64 in aysnc loop 
-        connector = TCPConnector(limit=60)
+    async def league_search_async(self, league_id:List,
+                                  session: Optional[DraftSession] = None) -> None:
+        """Searches for league ids and returns list of valid ids. Pass a shared DraftSession
+        so its rate limiter carries over between chunks.
+        """
+        if session is None:
+            async with DraftSession() as session:
+                return await self.league_search_async(league_id, session)
 
-        async with ClientSession(connector=connector) as session:
-            tasks = []
-            for _id in league_id:
-                tasks.append(asyncio.ensure_future(self._fetch(session, _id)))
-            await asyncio.gather(*tasks)
-    
-    async def _fetch(self, session: ClientSession, _id) -> None:
+        tasks = []
+        for _id in league_id:
+            tasks.append(asyncio.ensure_future(self._fetch(session, _id)))
+        await asyncio.gather(*tasks)
+
+    async def league_search_stream(self, league_ids: Iterable[int], session: DraftSession
+                                   ) -> AsyncIterator[Tuple[int, Optional[bool]]]:
+        """Probes league ids over the session's bounded pool, pulling ids lazily, and yields
+        (id, league exists) pairs as they complete, with None for a failed probe
+        """
+        async for result in session.imap_unordered(
+                lambda _id: self._fetch(session, _id), league_ids):
+            yield result
+
+    async def _fetch(self, session: DraftSession, _id) -> Optional[bool]:
+        """Probes a league id, returning True if the league exists and was added, False if it
+        does not and None if the probe failed or its details could not be decoded
+        """
         url = f'{self._fpl_league}{_id}/details'
-        async with session.get(url) as resp:
-            if resp.status == 200:
-                data = await resp.json()
-                await self._check_league_size(data)
+        status, body = await session.fetch_bytes(url)
+        if body is not None:
+            if await self._check_league_size(_id, body):
+                self._mark_probe(_id, HIT)
+                return True
+            # Marked as an error so the id is probed again rather than taken as stored
+            self._mark_probe(_id, ERROR)
+            return None
+        elif session.retry_policy.is_transient(status):
+            self._mark_probe(_id, ERROR)
+            self._failed_ids.append(_id)
+            return None
+        self._mark_probe(_id, MISS)
+        return False
+
+    async def find_upper_bound(self, session: DraftSession, start_hint: int,
+                               window: int = 5, probe_attempts: int = 3) -> Optional[int]:
+        """Finds the highest league id in use with an exponential search up from start_hint
+        followed by a binary search. An id counts as in use if any of the window ids from it
+        exist, so deleted leagues leave no false bound. A failed probe is repeated, and an id
+        still failing does not count towards the window. A point with window such ids abandons
+        the search, so throttling never moves the bound down. Leagues found along the way are
+        added to valid_ids like any other probe.
+
+        Args:
+            session (DraftSession): Shared session
+            start_hint (int): Guess of the upper bound, e.g. the last value found
+            window (int, optional): Consecutive ids probed before a point counts as unused.
+                Defaults to 5.
+            probe_attempts (int, optional): Probes of an id before it counts as failed, each
+                retried by the session. Defaults to 3.
+
+        Returns:
+            Optional[int]: Highest league id found, None if the search was abandoned
+        """
+        highest_found = 0
+
+        async def probe(_id: int) -> Optional[bool]:
+            for _ in range(probe_attempts):
+                found = await self._fetch(session, _id)
+                if found is not None:
+                    return found
+            return None
+
+        async def in_use(point: int) -> bool:
+            nonlocal highest_found
+            # Probed one at a time as a live point usually answers on the first id. A failed
+            # probe says nothing about its id, so only a 404 counts towards the window.
+            misses, failures, _id = 0, 0, point
+            while misses < window:
+                found = await probe(_id)
+                if found:
+                    highest_found = max(highest_found, _id)
+                    return True
+                if found is None:
+                    failures += 1
+                    if failures >= window:
+                        raise _SearchFailed(point)
+                else:
+                    misses += 1
+                _id += 1
+            return False
 
-    async def _check_league_size(self, resp_json: Dict) -> None:
         try:
-            await self._add_id(
-                resp_json.get('league', {}).get('id', {}), 
-                len(resp_json.get('league_entries', []))
-                )
-        except:
-            print("cannot add league id")
+            low, high = 1, max(start_hint, 2)
+            if await in_use(high):
+                step = max(window, high // 64)
+                low = high
+                high = low + step
+                while await in_use(high):
+                    low = high
+                    step *= 2
+                    high = low + step
+
+            while high - low > window:
+                mid = (low + high) // 2
+                if await in_use(mid):
+                    low = mid
+                else:
+                    high = mid
+            # Ids between the last point in use and the first unused one
+            for _id in range(max(highest_found, low) + 1, high):
+                if await self._fetch(session, _id):
+                    highest_found = _id
+            return max(highest_found, low)
+        except _SearchFailed as e:
+            print(f"League id upper bound search abandoned, probes near {e} kept failing")
+            return None
+
+    def _mark_probe(self, _id: int, state: int) -> None:
+        if self._probe_bitmap is not None:
+            self._probe_bitmap.mark(_id, state)
+
+    async def _check_league_size(self, _id: int, body: bytes) -> bool:
+        try:
+            details = decode_details(body)
+        except SchemaError as e:
+            print(f"cannot add league id {_id}: {e}")
+            return False
+        await self._add_id(details.id, len(details.entries))
+        return True
 
     async def _add_id(self, id: int, league_size: int) -> None:
-        # Add league ID and corresponding league size to list
-        self._valid_ids.append((id, league_size))
+        # Add league ID and corresponding league size to the writer queue or list
+        if self._writer is not None:
+            await self._writer.put((id, league_size))
+        else:
+            self._valid_ids.append((id, league_size))
 
     def clear_valid_ids(self) -> None:
         self._valid_ids = []
 
+    def clear_failed_ids(self) -> None:
+        self._failed_ids = []
+
     @property
     def valid_ids(self) -> List:
         return self._valid_ids
+
+    @property
+    def failed_ids(self) -> List:
+        return self._failed_ids
+
+    @property
+    def probe_bitmap(self) -> Optional[ProbeBitmap]:
+        return self._probe_bitmap
+
+    @property
+    def writer(self) -> Optional[AsyncBatchWriter]:
+        return self._writer
+
+    @writer.setter
+    def writer(self, writer: Optional[AsyncBatchWriter]) -> None:
+        self._writer = writer
     
     @property
     def max_api_requests(self) -> int:
@@ -1,76 +1,117 @@
-from typing import Dict, List, Optional, Tuple
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-import requests
-from aiohttp import ClientSession, TCPConnector
+
+from scrape_league.draft_session import DraftSession
+from scrape_league.response_cache import ResponseCache, cached_get
+from scrape_league.response_memo import ResponseMemo
+from scrape_league.schemas import (ElementStatus, LeagueDetails, LeagueEntry, Match,
+                                   SchemaError, decode_details, decode_element_status)
+from utils.expected_points import season_expected_points
+from utils.fpl_constants import DRAFT_API_URL
 
 
 class ScrapeSingleLeague:
     @classmethod
-    async def get_selected_players(cls, league_id: int) -> Optional[List[int]]:
+    async def get_selected_players(cls, league_id: int,
+                                   session: Optional[DraftSession] = None) -> Optional[List[int]]:
+        """
+        Returns a list of the player ids currently owned by a team in the league. Pass a
+        shared DraftSession to reuse its connection pool across leagues.
         """
-        Returns a dictionary mapping team names to lists of player names for the
-        league.
+        if session is None:
+            async with DraftSession(max_concurrency=1) as session:
+                return await cls.get_selected_players(league_id, session)
+
+        url = f'{DRAFT_API_URL}/league/{league_id}/element-status'
+        return await session.get_parsed(url, _decode_players)
 
-        TODO: Update to take a list of leagues
+    @classmethod
+    async def iter_selected_players(cls, league_ids: Iterable[int], session: DraftSession
+                                    ) -> AsyncIterator[Tuple[int, Optional[List[int]]]]:
+        """
+        Fetches the selected players of every league concurrently over the shared session,
+        yielding (league_id, player ids) pairs in completion order.
         """
-        url = f'https://draft.premierleague.com/api/league/{league_id}/element-status'
-        connector = TCPConnector(limit=60)
-        async with ClientSession(connector=connector) as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return await cls._parse_players(data)
+        async for league_id, players in session.imap_unordered(
+                lambda _id: cls.get_selected_players(_id, session), league_ids):
+            yield league_id, players
 
     @classmethod
-    async def _parse_players(cls, data: Dict) -> List:
-        league_player_list = data.get('element_status', [])
-        selected_player_id_list = [
-            player.get('element') for player in league_player_list \
-                if player.get('owner') is not None
-                ]
-        return selected_player_id_list
+    def _parse_players(cls, element_status: List[ElementStatus]) -> List:
+        return [status.element for status in element_status if status.owner is not None]
 
     @classmethod
-    def get_league_results(cls, league_id: int) -> Tuple[Dict[str, Dict[str, str]],
+    def get_league_results(cls, league_id: int, cache: Optional[ResponseCache] = None,
+                           memo: Optional[ResponseMemo] = None
+                           ) -> Tuple[Dict[str, Dict[str, str]],
     Dict[str, Dict[str, Tuple[int, str]]]]:
         """
-        Returns a dictionary mapping game weeks and manager IDs for h2h leagues.
+        Returns a dictionary mapping game weeks and manager IDs for h2h leagues. Pass the
+        run's ResponseMemo to reuse details already fetched, e.g. by the league id search.
+        """
+        url = f'{DRAFT_API_URL}/league/{league_id}/details'
+        body = cached_get(url, cache, memo=memo)
+        if body is not None:
+            try:
+                return cls._parse_league_details(decode_details(body))
+            except SchemaError as e:
+                print(f"Invalid payload from {url}: {e}")
+
+    @classmethod
+    async def get_league_results_async(cls, league_id: int, session: DraftSession
+                                       ) -> Optional[Tuple[Dict, Dict]]:
+        """
+        get_league_results over a shared DraftSession. Returns None if the request failed.
+        """
+        url = f'{DRAFT_API_URL}/league/{league_id}/details'
+        return await session.get_parsed(url, _decode_league_details)
+
+    @classmethod
+    async def iter_league_results(cls, league_ids: Iterable[int], session: DraftSession
+                                  ) -> AsyncIterator[Tuple[int, Optional[Tuple[Dict, Dict]]]]:
+        """
+        Fetches the results of every league concurrently, yielding (league_id, (team info,
+        results)) pairs in completion order.
         """
-        url = f'https://draft.premierleague.com/api/league/{league_id}/details'
-        response = requests.get(url)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('league', {}).get('scoring') == 'h':
-                return cls._parse_h2h_results(data.get('league_entries'), data.get('matches', []))
-            else:
-                # TOOD: implement for regular leagues
-                return {}, {}
+        async for league_id, results in session.imap_unordered(
+                lambda _id: cls.get_league_results_async(_id, session), league_ids):
+            yield league_id, results
+
+    @classmethod
+    def _parse_league_details(cls, details: LeagueDetails) -> Tuple[Dict, Dict]:
+        if details.scoring == 'h':
+            return cls._parse_h2h_results(details.entries, details.matches)
+        else:
+            # TOOD: implement for regular leagues
+            return {}, {}
 
     @classmethod
-    def _parse_h2h_results(cls, teams: List, matches: List) -> Tuple[Dict[str, Dict[str, str]],
+    def _parse_h2h_results(cls, teams: List[LeagueEntry], matches: List[Match]
+                           ) -> Tuple[Dict[str, Dict[str, str]],
     Dict[str, Dict[str, Tuple[int, str]]]]:
         results = {}
         team_info = {}
         for team in teams:
-            team_info[team.get('id')] = {
-                'team_name': team.get('entry_name'),
-                'player_name': team.get('player_first_name')
+            team_info[team.id] = {
+                'team_name': team.entry_name,
+                'player_name': team.player_first_name
                 }
 
         for match in matches:
-            if match.get('finished'):
-                gameweek = match.get('event')
-                entry_1_points = match.get('league_entry_1_points')
-                entry_2_points = match.get('league_entry_2_points')
+            if match.finished:
+                gameweek = match.event
+                entry_1_points = match.league_entry_1_points
+                entry_2_points = match.league_entry_2_points
 
                 result_1, result_2 = cls._parse_gw_result(entry_1_points, entry_2_points)
 
                 if str(gameweek) not in results.keys():
                     results[str(gameweek)] = {}
                 results[str(gameweek)].update(
-                    {match.get('league_entry_1'): (entry_1_points, result_1),
-                    match.get('league_entry_2'): (entry_2_points, result_2)}
+                    {match.league_entry_1: (entry_1_points, result_1),
+                    match.league_entry_2: (entry_2_points, result_2)}
                 )
 
         return team_info, results
@@ -89,38 +130,21 @@ class ScrapeSingleLeague:
         """
         Returns a pandas DataFrame of the league table for the given league.
         """
-        league_table = {}
-        for team_id, team_info in team_info.items():
-            league_table[team_id] = {
-                'team_name': team_info.get('team_name'),
-                'player_name': team_info.get('player_name'),
-                'total_points': 0,
-                'points': 0,
-                'xPts': 0,
-                'wins': 0,
-                'draws': 0,
-                'losses': 0,
-                'gw_points': {}
-            }
-
-        for gw, gw_results in league_results.items():
-            gw_point_list = [team[0] for team in gw_results.values()]
-            for team_id, team_result in gw_results.items():
-                league_table[team_id]['total_points'] += team_result[0]
-                league_table[team_id]['gw_points'][gw] = team_result[0]
-                xpts = cls._get_expected_points(gw_point_list, team_result[0])
-
-                league_table[team_id]['xPts'] += xpts
-                if team_result[1] == 'W':
-                    league_table[team_id]['wins'] += 1
-                    league_table[team_id]['points'] += 3
-                elif team_result[1] == 'L':
-                    league_table[team_id]['losses'] += 1
-                else:
-                    league_table[team_id]['draws'] += 1
-                    league_table[team_id]['points'] += 1
-
-        league_table = pd.DataFrame.from_dict(league_table, orient='index')
+        team_ids = list(team_info.keys())
+        scores, outcomes = cls.get_score_matrix(team_ids, league_results)
+        wins = (outcomes == 'W').sum(axis=1)
+        draws = (outcomes == 'D').sum(axis=1)
+
+        league_table = pd.DataFrame({
+            'team_name': [info.get('team_name') for info in team_info.values()],
+            'player_name': [info.get('player_name') for info in team_info.values()],
+            'total_points': scores.sum(axis=1),
+            'points': 3 * wins + draws,
+            'xPts': season_expected_points(scores, outcomes != ''),
+            'wins': wins,
+            'draws': draws,
+            'losses': (outcomes == 'L').sum(axis=1),
+            }, index=team_ids)
         league_table = league_table.sort_values(by=['points'], ascending=False)
         league_table['rank'] = range(1, len(league_table) + 1)
         league_table['xPts'] = league_table['xPts'].round(2)
@@ -130,13 +154,40 @@ class ScrapeSingleLeague:
             ]
         return league_table
 
+    @classmethod
+    def get_score_matrix(cls, team_ids: List, league_results: Dict
+                          ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (teams x gameweeks) arrays of gameweek points and W/D/L results, with rows in
+        team_ids order. A team without a finished match in a gameweek has 0 points and an
+        empty result there, so outcomes != '' masks the cells present.
+        """
+        team_index = {team_id: idx for idx, team_id in enumerate(team_ids)}
+        scores = np.zeros((len(team_ids), len(league_results)), dtype=np.int64)
+        outcomes = np.full(scores.shape, '', dtype='<U1')
+        for gw_idx, gw_results in enumerate(league_results.values()):
+            for team_id, (points, result) in gw_results.items():
+                scores[team_index[team_id], gw_idx] = points
+                outcomes[team_index[team_id], gw_idx] = result
+        return scores, outcomes
+
     @classmethod
     def _get_expected_points(cls, gw: List, points: int) -> float:
         """
-        Returns the expected points for a given gameweek.
+        Returns the expected points for a given gameweek. Scalar reference for
+        utils.expected_points, which get_league_table uses.
         """
         # Percentage of teams that scored less than the team or equal to a given team
         # multiplied by 3 points for a win, plus 1 point for a draw
         xpts = 3 * (sum(i < points for i in gw) / (len(gw) -1) ) + \
             1 * ((sum(i == points for i in gw) - 1) / (len(gw) -1) )
         return xpts
+
+
+# Module level so DraftSession can run them in its parse process pool
+def _decode_players(body: bytes) -> List:
+    return ScrapeSingleLeague._parse_players(decode_element_status(body))
+
+
+def _decode_league_details(body: bytes) -> Tuple[Dict, Dict]:
+    return ScrapeSingleLeague._parse_league_details(decode_details(body))
@@ -1,47 +1,149 @@
-from typing import Dict, List, Tuple
+from functools import partial
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Tuple
 
-from aiohttp import ClientSession, TCPConnector
+from scrape_league.draft_session import DraftSession
+from scrape_league.schemas import Transaction, decode_transactions
+from utils.fpl_constants import DRAFT_API_URL
+
+# Transaction kinds and results as (kind, result) bucket keys. Any result other than
+# accepted ('a') is a rejected claim, e.g. player already taken or out player gone.
+WAIVER_ACCEPTED = ('w', 'a')
+WAIVER_REJECTED = ('w', 'r')
+FREE_AGENT_ACCEPTED = ('f', 'a')
+FREE_AGENT_REJECTED = ('f', 'r')
+
+GameweekTransfers = Dict[int, Dict[Tuple[str, str], Tuple[List, List]]]
 
 
 class SingleGWTransfers:
     @classmethod
-    async def get_league_transfers(cls, league_id: int, gameweek: int) -> Tuple[List, List]:
-        """Retrieves the waivers and free transfers for a given league and game week.
-        TODO: Distinguish between free transfers and waivers.
-        TODO: Update to take a list of leagues
+    async def get_league_transfers(cls, league_id: int, gameweek: int,
+                                   session: Optional[DraftSession] = None) -> Tuple[List, List]:
+        """Retrieves the accepted waivers of a league in one game week. The league's whole
+        transaction history comes from one request; get_league_transfers_by_gameweek returns
+        every gameweek of it.
 
         Args:
             league_id: The ID of the league.
             gameweek: The game week number.
+            session: Shared DraftSession. A single-use session is opened if not given.
+
+        Returns:
+            (players_in, players_out) of the accepted waivers in the game week, both empty if
+            there were none or the request failed.
+        """
+        if session is None:
+            async with DraftSession(max_concurrency=1) as session:
+                return await cls.get_league_transfers(league_id, gameweek, session)
+
+        url = f"{DRAFT_API_URL}/draft/league/{league_id}/transactions"
+        transfers = await session.get_parsed(
+            url, partial(_decode_league_transfers, gameweek=gameweek)
+            )
+        if transfers is not None:
+            return transfers
+        print("Error retrieving waivers and free transfers for league {} and "
+              "game week {}".format(league_id, gameweek))
+        return [], []
+
+    @classmethod
+    async def iter_league_transfers(cls, league_ids: Iterable[int], gameweek: int,
+                                    session: DraftSession
+                                    ) -> AsyncIterator[Tuple[int, Tuple[List, List]]]:
+        """Retrieves the waivers for every league concurrently over the shared session,
+        yielding (league_id, (players_in, players_out)) pairs in completion order.
+        """
+        async for league_id, transfers in session.imap_unordered(
+                lambda _id: cls.get_league_transfers(_id, gameweek, session), league_ids):
+            yield league_id, transfers
+
+    @classmethod
+    async def get_league_transfers_by_gameweek(cls, league_id: int,
+                                               session: Optional[DraftSession] = None,
+                                               ttl: Optional[float] = None
+                                               ) -> Optional[GameweekTransfers]:
+        """Retrieves a league's whole transaction history in one request and buckets it by
+        gameweek and (kind, result).
+
+        Args:
+            league_id: The ID of the league.
+            session: Shared DraftSession. A single-use session is opened if not given.
+            ttl: Maximum age of a cached transaction history. Pass FOREVER when only
+                finished gameweeks are needed.
 
         Returns:
-            A dictionary containing the waivers and free transfers for the given league
-            and game week.
+            {gameweek: {(kind, result): (players_in, players_out)}}, or None if the request
+            failed.
         """
-        url = "https://draft.premierleague.com/api/draft/league/{}/transactions".format(league_id)
-
-        connector = TCPConnector(limit=60)
-        async with ClientSession(connector=connector) as session:
-            async with session.get(url) as resp:
-                if resp.status == 200:
-                    data = await resp.json()
-                    return await cls._parse_league_transfers(data, gameweek)
-                else:
-                    # TODO: Add retry with exponential backoff and logging
-                    print("Error retrieving waivers and free transfers for league {} and \
-                        game week {}: {}".format(league_id, gameweek, resp.text))
-                    return [], []
+        if session is None:
+            async with DraftSession(max_concurrency=1) as session:
+                return await cls.get_league_transfers_by_gameweek(league_id, session, ttl)
+
+        url = f"{DRAFT_API_URL}/draft/league/{league_id}/transactions"
+        transfers = await session.get_parsed(url, _decode_transfers_by_gameweek, ttl)
+        if transfers is not None:
+            return transfers
+        print("Error retrieving transactions for league {}".format(league_id))
+        return None
+
+    @classmethod
+    async def iter_league_transfers_by_gameweek(cls, league_ids: Iterable[int],
+                                                session: DraftSession,
+                                                ttl: Optional[float] = None
+                                                ) -> AsyncIterator[
+                                                    Tuple[int, Optional[GameweekTransfers]]]:
+        """Retrieves every league's bucketed transactions concurrently, yielding
+        (league_id, transfers by gameweek) pairs in completion order.
+        """
+        async for league_id, transfers in session.imap_unordered(
+                lambda _id: cls.get_league_transfers_by_gameweek(_id, session, ttl), league_ids):
+            yield league_id, transfers
+
+    @classmethod
+    async def iter_new_transactions(cls, league_ids: Iterable[int], marks: Dict[int, int],
+                                    session: DraftSession
+                                    ) -> AsyncIterator[Tuple[int, Optional[List[Transaction]]]]:
+        """Retrieves every league's transactions concurrently, yielding (league_id, transactions
+        with an id above the league's mark in marks) pairs in completion order, or
+        (league_id, None) if the request failed.
+        """
+        async def get_new_transactions(league_id: int) -> Optional[List[Transaction]]:
+            url = f"{DRAFT_API_URL}/draft/league/{league_id}/transactions"
+            transactions = await session.get_parsed(url, decode_transactions)
+            if transactions is None:
+                print("Error retrieving transactions for league {}".format(league_id))
+                return None
+            last_id = marks.get(league_id, 0)
+            return [event for event in transactions if event.id > last_id]
+
+        async for league_id, transactions in session.imap_unordered(
+                get_new_transactions, league_ids):
+            yield league_id, transactions
+
+    @classmethod
+    def _parse_league_transfers(cls, transactions: List[Transaction],
+                                gameweek: int) -> Tuple[List, List]:
+        # TODO: Record free transfers as well as waivers
+        gameweek_transfers = cls._parse_transfers_by_gameweek(transactions).get(gameweek, {})
+        return gameweek_transfers.get(WAIVER_ACCEPTED, ([], []))
 
     @classmethod
-    async def _parse_league_transfers(cls, resp_json: Dict, gameweek: int) -> Tuple[List, List]:
-        players_in = []
-        players_out = []
-
-        for event in resp_json.get('transactions', []):
-            if event.get('event') == gameweek:
-                if event.get('result') == 'a' and event.get('kind') == 'w':
-                    # TODO: Record free transfers as well as waivers
-                    players_in.append(event.get('element_in'))
-                    players_out.append(event.get('element_out'))
-
-        return players_in, players_out
+    def _parse_transfers_by_gameweek(cls, transactions: List[Transaction]) -> GameweekTransfers:
+        transfers: GameweekTransfers = {}
+        for event in transactions:
+            result = 'a' if event.result == 'a' else 'r'
+            bucket = transfers.setdefault(event.event, {}).setdefault(
+                (event.kind, result), ([], [])
+                )
+            bucket[0].append(event.element_in)
+            bucket[1].append(event.element_out)
+        return transfers
+
+
+# Module level so DraftSession can run them in its parse process pool
+def _decode_league_transfers(body: bytes, gameweek: int) -> Tuple[List, List]:
+    return SingleGWTransfers._parse_league_transfers(decode_transactions(body), gameweek)
+
+
+def _decode_transfers_by_gameweek(body: bytes) -> GameweekTransfers:
+    return SingleGWTransfers._parse_transfers_by_gameweek(decode_transactions(body))
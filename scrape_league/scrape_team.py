@@ -1,20 +1,35 @@
 """
 Scrapes players from the FPL API for an individual team ID in a league.
 """
-from typing import List
-import requests
+from typing import List, Optional
+
+from scrape_league.response_cache import ResponseCache, cached_get
+from scrape_league.response_memo import ResponseMemo
+from scrape_league.schemas import SchemaError, decode_element_status
+from utils.fpl_constants import DRAFT_API_URL
 
 class TeamPlayers:
-    def __init__(self, league_id: int) -> None:
-        self._url = f"https://draft.premierleague.com/api/league/{league_id}/element-status"
+    def __init__(self, league_id: int, cache: Optional[ResponseCache] = None,
+                 memo: Optional[ResponseMemo] = None) -> None:
+        self._url = f"{DRAFT_API_URL}/league/{league_id}/element-status"
+        self._cache = cache
+        # Shares element-status with a crawl of the same league earlier in the run
+        self._memo = memo
         self.players = []
 
     def _get_data(self) -> None:
-        response = requests.get(self._url)
-        data = response.json()
-        self.players = data.get("element_status")
+        body = cached_get(self._url, self._cache, memo=self._memo)
+        if body is None:
+            return
+        try:
+            self.players = decode_element_status(body)
+        except SchemaError as e:
+            print(f"Invalid payload from {self._url}: {e}")
 
     def get_player_ids(self) -> List:
         self._get_data()
-        return [player.get("element") for player in self.players \
-                if player.get("owner") is not None]
+        return [player.element for player in self.players if player.owner is not None]
+
+    @property
+    def url(self) -> str:
+        return self._url
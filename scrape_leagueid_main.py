@@ -4,27 +4,61 @@ Main script to scrape league ids
 Manages the scraping of league ids and updating the database
 """
 import asyncio
+import json
+import os
 import random
-from datetime import datetime
-from time import sleep
-from typing import List
+from contextlib import AsyncExitStack
+from datetime import date, datetime, timedelta
+from functools import partial
+from itertools import islice
+from typing import Iterator, List, Optional, Tuple
 
-from app import manage_database
+from app import manage_database, metrics
+from database.async_writer import AsyncBatchWriter
+from database.crawl_checkpoint import CrawlCheckpoint
 from database.update_database import ManageDatabase
+from scrape_league.draft_session import DraftSession
+from scrape_league.response_memo import ResponseMemo
 from scrape_league.scrape_league_id import ScrapeLeagueID
 from utils.fpl_constants import TOTAL_LEAGUES
+from utils.metrics import Metrics, reporting
+from utils.probe_bitmap import HIT, ProbeBitmap
 
 
 class ManageLeagueIDScrape:
-    def __init__(self, mange_database: ManageDatabase, scrape_league_id: ScrapeLeagueID) -> None:
+    def __init__(self, mange_database: ManageDatabase, scrape_league_id: ScrapeLeagueID,
+                 upper_bound_file: str = 'database/league_upper_bound.json',
+                 upper_bound_max_age: timedelta = timedelta(days=1),
+                 shard: Optional[Tuple[int, int]] = None,
+                 metrics: Optional[Metrics] = None,
+                 memo: Optional[ResponseMemo] = None) -> None:
         """Injecting ManageDatabase and ScrapeLeagueID instances
 
         Args:
             mange_database (ManageDatabase): _description_
             scrape_league_id (ScrapeLeagueID): _description_
+            upper_bound_file (str, optional): Cache of the detected highest league id.
+                Defaults to 'database/league_upper_bound.json'.
+            upper_bound_max_age (timedelta, optional): Age after which the upper bound is
+                detected again. Defaults to one day.
+            shard (Tuple[int, int], optional): (index, count) to probe only the ids congruent
+                to index modulo count, so count processes can split the id space between them.
+                Defaults to None, every id.
+            metrics (Metrics, optional): Request and write metrics, reported periodically
+                while probing. Defaults to None.
+            memo (ResponseMemo, optional): Keeps the details of the leagues found whose urls
+                are shared with it, for scrapers later in the same run. Defaults to None.
         """
         self._manage_database = mange_database
         self._scrape_league_id = scrape_league_id
+        self._probe_bitmap = scrape_league_id.probe_bitmap
+        self._upper_bound_file = upper_bound_file
+        self._upper_bound_max_age = upper_bound_max_age
+        # Exclusive end of the id range sampled, refreshed at the start of each run
+        self._total_leagues = TOTAL_LEAGUES
+        self._shard = shard
+        self._metrics = metrics
+        self._memo = memo
 
     def db_setup(self, table_name: str) -> None:
         try:
@@ -35,25 +69,106 @@ class ManageLeagueIDScrape:
             self._manage_database.create_league_table(table_name)
         except Exception as e:
             print(e)
+        self.seed_probe_bitmap(table_name)
 
-    async def manage_update_league_id(self, request_n: int, table_name: str) -> None:
-        # Break up request_n into chunks <= max_api_requests
-        request_chunk = self._get_request_chunks(request_n)
-        for idx, chunk in enumerate(request_chunk):
-            print(f"new chunk {idx}")
-            # Get list of leauge IDS in db
-            time_now = datetime.now()
-            id_search_list = self._random_league_id_sample(chunk)
-            # Scrape league IDS
-            await self._scrape_league_id.league_search_async(id_search_list)
-            # Get valid ids just scraped
-            id_list = self._scrape_league_id.valid_ids
-            # Update league_id table
-            self._manage_database.update_id(table_name, id_list)
-            # Once added clear valid_id list
-            self._scrape_league_id.clear_valid_ids()
-            print(f"Time taken: {datetime.now()-time_now}")
-            sleep(5)
+    def seed_probe_bitmap(self, table_name: str) -> None:
+        # Leagues already stored never need probing again, even if probed before the bitmap
+        if self._probe_bitmap is not None:
+            self._probe_bitmap.mark_many(self._manage_database.select_id(table_name), HIT)
+            self._probe_bitmap.save()
+
+    async def manage_update_league_id(self, request_n: int, table_name: str,
+                                      sweep: bool = False, job: Optional[str] = None) -> None:
+        """Probes up to request_n league ids and stores the valid ones
+
+        Args:
+            request_n (int): Total requests to make
+            table_name (str): League table to update
+            sweep (bool, optional): Probe ids in order instead of at random, resuming from
+                the first id the probe bitmap has not yet seen. Defaults to False.
+            job (str, optional): Checkpoints the ids drawn and probed under this name. Run
+                again with the same job after an interruption to probe only the ids left,
+                retrying those that failed. The job is cleared once finished, so a later run
+                under the same name probes request_n new ids. Defaults to None.
+        """
+        checkpoint = CrawlCheckpoint(self._manage_database, job) if job is not None else None
+        # Probes stream through the session's bounded pool while valid ids are flushed to the
+        # database by the writer thread, so network and disk overlap. Pacing is left to the
+        # session's adaptive rate limiter.
+        async with AsyncExitStack() as stack:
+            await stack.enter_async_context(reporting(self._metrics))
+            session = await stack.enter_async_context(DraftSession(
+                metrics=self._metrics, memo=self._memo
+                ))
+            writer = await stack.enter_async_context(AsyncBatchWriter(
+                partial(self._manage_database.update_id, table_name), metrics=self._metrics,
+                name=table_name
+                ))
+            checkpoint_writer = None
+            if checkpoint is not None:
+                checkpoint_writer = await stack.enter_async_context(AsyncBatchWriter(
+                    checkpoint.record, metrics=self._metrics, name='checkpoint'
+                    ))
+            self._scrape_league_id.writer = writer
+            try:
+                self._total_leagues = await self._get_total_leagues(session) + 1
+                sweep_ids = self._sweep_league_ids() if sweep else None
+                id_stream = self._league_id_stream(request_n, sweep_ids, checkpoint)
+
+                max_api = self._scrape_league_id.max_api_requests
+                time_now = datetime.now()
+                completed = 0
+                async for probe in self._scrape_league_id.league_search_stream(
+                        id_stream, session):
+                    if checkpoint_writer is not None:
+                        await checkpoint_writer.put(probe)
+                    completed += 1
+                    if completed % max_api == 0:
+                        self._report_progress(completed, time_now, session, writer)
+                        time_now = datetime.now()
+                self._report_progress(completed, time_now, session, writer)
+            finally:
+                self._scrape_league_id.writer = None
+        # After the writers have flushed, so the outcome of every probe is recorded
+        if checkpoint is not None and checkpoint.finished():
+            checkpoint.clear()
+
+    def _league_id_stream(self, request_n: int, sweep_ids: Optional[Iterator[int]],
+                          checkpoint: Optional[CrawlCheckpoint] = None) -> Iterator[int]:
+        """Yields up to request_n new ids, drawn a chunk at a time so ids that failed since
+        the last draw are searched again first. With a checkpoint, ids left over from an
+        earlier run of the job come first and count towards request_n, and every id drawn
+        is queued in the checkpoint before it is probed.
+        """
+        if checkpoint is not None:
+            resumed = list(checkpoint.iter_pending())
+            # A finished job is cleared, so any ids here are from an interrupted run of this
+            # request
+            request_n = max(request_n - checkpoint.total, 0)
+            if resumed:
+                print(f"Resuming {checkpoint.job}: {len(resumed)} ids left to probe")
+            yield from resumed
+            if request_n == 0:
+                return
+
+        for chunk in self._get_request_chunks(request_n):
+            new_ids = self._next_league_ids(chunk, sweep_ids)
+            if checkpoint is not None:
+                checkpoint.add(new_ids)
+            id_search_list = list(dict.fromkeys(self._scrape_league_id.failed_ids + new_ids))
+            self._scrape_league_id.clear_failed_ids()
+            if not id_search_list:
+                print("No league ids left to probe")
+                return
+            yield from id_search_list
+
+    def _report_progress(self, completed: int, time_now: datetime, session: DraftSession,
+                         writer: AsyncBatchWriter) -> None:
+        if self._probe_bitmap is not None:
+            self._probe_bitmap.save()
+        print(f"{completed} ids probed, time taken: {datetime.now()-time_now} "
+              f"rate: {session.rate_limiter.rate:.1f}/s "
+              f"rows written: {writer.rows_written} queued: {writer.pending}")
 
     def _get_request_chunks(self, request_total: int) -> List:
         """Splits total request into chunks of size scrape_league_id.max_api_requests
@@ -73,17 +188,74 @@ class ManageLeagueIDScrape:
             chunk_list.append(request_total%max_api)
         return chunk_list
 
+    async def _get_total_leagues(self, session: DraftSession) -> int:
+        """Highest league id in use, from the cache if fresh, otherwise detected live"""
+        cached = self._load_upper_bound()
+        if cached is not None:
+            upper_bound, timestamp = cached
+            if datetime.now() - timestamp < self._upper_bound_max_age:
+                return upper_bound
+        else:
+            upper_bound = TOTAL_LEAGUES
+
+        detected = await self._scrape_league_id.find_upper_bound(session, upper_bound)
+        if detected is None:
+            # Not cached, so the next run detects it again
+            print(f"Using league id upper bound {upper_bound}")
+            return upper_bound
+        print(f"Detected league id upper bound {detected}")
+        self._save_upper_bound(detected)
+        return detected
+
+    def _load_upper_bound(self) -> Optional[Tuple[int, datetime]]:
+        if not os.path.exists(self._upper_bound_file):
+            return None
+        with open(self._upper_bound_file) as f:
+            cached = json.load(f)
+        return cached['upper_bound'], datetime.fromisoformat(cached['timestamp'])
+
+    def _save_upper_bound(self, upper_bound: int) -> None:
+        with open(self._upper_bound_file, 'w') as f:
+            json.dump({'upper_bound': upper_bound, 'timestamp': datetime.now().isoformat()}, f)
+
+    def _next_league_ids(self, n: int, sweep_ids: Optional[Iterator[int]]) -> List:
+        if sweep_ids is not None:
+            return list(islice(sweep_ids, n))
+        return self._random_league_id_sample(n)
+
+    def _league_id_range(self) -> range:
+        """Ids this scrape may probe: all of them, or every count-th id of a shard"""
+        if self._shard is None:
+            return range(1, self._total_leagues)
+        index, count = self._shard
+        return range(index if index >= 1 else count, self._total_leagues, count)
+
+    def _sweep_league_ids(self) -> Iterator[int]:
+        id_range = self._league_id_range()
+        if self._probe_bitmap is not None:
+            return self._probe_bitmap.iter_eligible(id_range.start, id_range.stop, id_range.step)
+        return iter(id_range)
+
     def _random_league_id_sample(self, league_sample_n: int) -> List:
-        # existing_ids = self._manage_database.select_id(table_name)
-        return random.sample(range(1, TOTAL_LEAGUES), league_sample_n)
+        id_range = self._league_id_range()
+        # Without a probe bitmap ids already stored or known to 404 may be drawn again
+        if self._probe_bitmap is not None:
+            return self._probe_bitmap.sample_eligible(
+                league_sample_n, id_range.start, id_range.stop, id_range.step
+                )
+        return random.sample(id_range, min(league_sample_n, len(id_range)))
 
 
 if __name__ == '__main__':
-    scrape_league = ScrapeLeagueID()
+    scrape_league = ScrapeLeagueID(probe_bitmap=ProbeBitmap('database/league_probes.bin'))
 
-    manage_data = ManageLeagueIDScrape(manage_database, scrape_league)
+    manage_data = ManageLeagueIDScrape(manage_database, scrape_league, metrics=metrics)
     # Create fpldraft db and league table if not existing
     manage_data.db_setup('league')
 
     loop = asyncio.get_event_loop()
-    loop.run_until_complete(manage_data.manage_update_league_id(25000, 'league'))
+    loop.run_until_complete(
+        manage_data.manage_update_league_id(25000, 'league', job=f'league_ids_{date.today()}')
+        )
+    if metrics is not None:
+        print(f'Metrics written to {metrics.dump()}')
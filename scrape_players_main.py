@@ -1,9 +1,9 @@
-from app import manage_database
+from app import manage_database, response_cache
 from scrape_league.scrape_fpl_players import FantasyFootballMetadata
 
 
 def main() -> None:
-    api = FantasyFootballMetadata()
+    api = FantasyFootballMetadata(cache=response_cache)
     player_data = api.get_player_names()
     manage_database.create_fpl_players_table('players')
     manage_database.update_fpl_players('players', player_data)
@@ -0,0 +1,255 @@
+"""
+Main script for sharded crawls
+
+Splits league id discovery and the ownership crawl across worker processes, each with its own
+event loop, connection pool and rate limiter, optionally on different hosts that share only a
+results directory. League ids are assigned to shard id % shards, which spreads the densely
+populated recent ids evenly, and every shard works in its own SQLite database in the results
+directory:
+
+    plan   copies each shard's leagues, its probe bitmap and the players table out of the
+           main database
+    work   runs one shard's discovery or ownership crawl. A rerun resumes from the shard's
+           checkpoints.
+    merge  folds every shard database back into the main one. Rows are only added, or replaced
+           by a more complete outcome, so merging a shard again changes nothing. Finished
+           checkpoint jobs are then cleared from the shard.
+    run    plan, work every shard in a local process each, then merge
+
+After an ownership crawl is merged, run calc_ownership_main.py with the same gameweek: its
+checkpoints now hold every shard's results, so only leagues no shard crawled are fetched.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from typing import Dict, Tuple
+
+from app import manage_database
+from calc_ownership_main import LeagueStats
+from database.crawl_checkpoint import DONE, CrawlCheckpoint
+from database.update_database import ManageDatabase
+from scrape_league.scrape_league_id import ScrapeLeagueID
+from scrape_leagueid_main import ManageLeagueIDScrape
+from utils.probe_bitmap import ProbeBitmap
+
+CHECKPOINT_TABLE = 'crawl_items'
+
+
+class ShardedCrawl:
+    def __init__(self, mange_database: ManageDatabase, shards: int,
+                 results_dir: str = 'database/shards', league_table: str = 'league',
+                 players_table: str = 'players',
+                 probe_bitmap_file: str = 'database/league_probes.bin',
+                 upper_bound_file: str = 'database/league_upper_bound.json') -> None:
+        """Init method
+
+        Args:
+            mange_database (ManageDatabase): Main database. Only plan and merge use it.
+            shards (int): Number of shards the crawl is split into
+            results_dir (str, optional): Directory of the shard databases. Defaults to
+                'database/shards'.
+            league_table (str, optional): League table. Defaults to 'league'.
+            players_table (str, optional): Players table. Defaults to 'players'.
+            probe_bitmap_file (str, optional): Main probe bitmap. Defaults to
+                'database/league_probes.bin'.
+            upper_bound_file (str, optional): Main cache of the league id upper bound, handed
+                to the shards so they do not each detect it. Defaults to
+                'database/league_upper_bound.json'.
+        """
+        self._manage_database = mange_database
+        self._shards = shards
+        self._results_dir = results_dir
+        self._league_table = league_table
+        self._players_table = players_table
+        self._probe_bitmap_file = probe_bitmap_file
+        self._upper_bound_file = upper_bound_file
+
+    def shard_database(self, index: int) -> ManageDatabase:
+        # Only the shard's own worker opens it, so it can be locked exclusively
+        return ManageDatabase(self._shard_path(index), exclusive=True)
+
+    def _shard_path(self, index: int, suffix: str = '') -> str:
+        return os.path.join(self._results_dir, f'shard_{index}of{self._shards}{suffix}')
+
+    def _shard_bitmap(self, index: int) -> ProbeBitmap:
+        return ProbeBitmap(self._shard_path(index, '_probes.bin'))
+
+    def plan(self) -> None:
+        """Creates every shard database with the shard's stored leagues and the players table,
+        and its probe bitmap with the main bitmap's state of the shard's ids. Running it again
+        adds only what is new in the main database.
+        """
+        os.makedirs(self._results_dir, exist_ok=True)
+        main_bitmap = ProbeBitmap(self._probe_bitmap_file)
+        for index in range(self._shards):
+            shard_database = self.shard_database(index)
+            try:
+                shard_database.create_league_table(self._league_table)
+                shard_database.create_fpl_players_table(self._players_table)
+                added = shard_database.import_leagues(
+                    self._league_table, self._manage_database.db_name, (index, self._shards)
+                    )
+                shard_database.import_fpl_players(
+                    self._players_table, self._manage_database.db_name
+                    )
+            finally:
+                shard_database.close()
+            shard_bitmap = self._shard_bitmap(index)
+            shard_bitmap.merge(main_bitmap, index, self._shards)
+            shard_bitmap.save()
+            upper_bound_file = self._shard_path(index, '_upper_bound.json')
+            if os.path.exists(self._upper_bound_file) and not os.path.exists(upper_bound_file):
+                shutil.copyfile(self._upper_bound_file, upper_bound_file)
+            print(f'Shard {index}/{self._shards}: {added} leagues added')
+
+    async def discover(self, index: int, request_n: int, sweep: bool = False) -> None:
+        """Probes up to request_n of the shard's league ids, resuming today's job if it was
+        interrupted
+        """
+        shard_database = self.shard_database(index)
+        scrape_league = ScrapeLeagueID(probe_bitmap=self._shard_bitmap(index))
+        manage_data = ManageLeagueIDScrape(
+            shard_database, scrape_league,
+            upper_bound_file=self._shard_path(index, '_upper_bound.json'),
+            shard=(index, self._shards)
+            )
+        try:
+            manage_data.db_setup(self._league_table)
+            await manage_data.manage_update_league_id(
+                request_n, self._league_table, sweep,
+                job=f'league_ids_{date.today()}_shard{index}of{self._shards}'
+                )
+        finally:
+            shard_database.close()
+
+    async def crawl_ownership(self, index: int, gameweek: int, league_size: int = 10,
+                              max_concurrency: int = 50) -> None:
+        """Crawls the ownership and gameweek waivers of the shard's leagues of league_size into
+        the shard's checkpoints, under the prefix calc_ownership_main.py uses for gameweek
+        """
+        shard_database = self.shard_database(index)
+        try:
+            league_sizes = dict(shard_database.iter_leagues(self._league_table, league_size))
+            league_stats = LeagueStats(
+                list(league_sizes), max_concurrency, league_sizes=league_sizes,
+                checkpoint_prefix=f'gw{gameweek}', mange_database=shard_database,
+                keep_checkpoints=True
+                )
+            await league_stats.populate_player_ownership_dict()
+            await league_stats.populate_player_transfers_dict(gameweek)
+        finally:
+            shard_database.close()
+
+    def merge(self) -> Dict[str, int]:
+        """Folds every shard found in the results directory into the main database: new
+        leagues, the probe bitmap and the crawl checkpoints. Idempotent, so it can run after
+        each batch of shards finishes.
+        """
+        totals = {'shards': 0, 'leagues': 0, 'checkpoints': 0}
+        self._manage_database.create_league_table(self._league_table)
+        self._manage_database.create_crawl_table(CHECKPOINT_TABLE)
+        main_bitmap = ProbeBitmap(self._probe_bitmap_file)
+        for index in range(self._shards):
+            shard_db_name = self._shard_path(index)
+            if not os.path.exists(f'{shard_db_name}.db'):
+                print(f'Shard {index}/{self._shards} not found, skipped')
+                continue
+            totals['shards'] += 1
+            totals['leagues'] += self._manage_database.import_leagues(
+                self._league_table, shard_db_name
+                )
+            totals['checkpoints'] += self._manage_database.import_crawl_items(
+                CHECKPOINT_TABLE, shard_db_name, DONE
+                )
+            self._clear_merged_checkpoints(index)
+            main_bitmap.merge(self._shard_bitmap(index), index, self._shards)
+        main_bitmap.save()
+        return totals
+
+    def _clear_merged_checkpoints(self, index: int) -> None:
+        # Finished jobs now live in the main database, which clears them once replayed, so a
+        # later crawl under the same name starts afresh in the shard too. Unfinished jobs
+        # stay for the shard to resume.
+        shard_database = self.shard_database(index)
+        try:
+            shard_database.create_crawl_table(CHECKPOINT_TABLE)
+            for job in shard_database.select_crawl_jobs(CHECKPOINT_TABLE):
+                checkpoint = CrawlCheckpoint(shard_database, job, CHECKPOINT_TABLE)
+                if checkpoint.finished():
+                    checkpoint.clear()
+        finally:
+            shard_database.close()
+
+
+def work_shard(shards: int, results_dir: str, index: int, task: str, options: Dict
+               ) -> Tuple[int, str]:
+    """Runs one shard's task on a fresh event loop. Module level, and given only picklable
+    arguments, so it can run in a worker process.
+    """
+    crawl = ShardedCrawl(manage_database, shards, results_dir)
+    if task == 'discover':
+        coroutine = crawl.discover(index, options['request_n'], options['sweep'])
+    else:
+        coroutine = crawl.crawl_ownership(
+            index, options['gameweek'], options['league_size'], options['max_concurrency']
+            )
+    asyncio.run(coroutine)
+    return index, task
+
+
+def run_local(shards: int, results_dir: str, task: str, options: Dict) -> None:
+    """Works every shard in a process of its own"""
+    # Spawned rather than forked so no worker inherits the parent's SQLite connections
+    with ProcessPoolExecutor(shards, mp_context=multiprocessing.get_context('spawn')) as pool:
+        futures = [pool.submit(work_shard, shards, results_dir, index, task, options)
+                   for index in range(shards)]
+        for future in futures:
+            try:
+                index, _ = future.result()
+                print(f'Shard {index}/{shards} finished {task}')
+            except Exception as e:
+                # The shard resumes from its checkpoints when worked again
+                print(e)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('step', choices=['plan', 'work', 'merge', 'run'])
+    parser.add_argument('--shards', type=int, default=os.cpu_count())
+    parser.add_argument('--index', type=int, help='Shard to work, for the work step')
+    parser.add_argument('--task', choices=['discover', 'ownership'], default='discover')
+    parser.add_argument('--results-dir', default='database/shards')
+    parser.add_argument('--request-n', type=int, default=25000,
+                        help='League ids to probe across all shards')
+    parser.add_argument('--sweep', action='store_true')
+    parser.add_argument('--gameweek', type=int, default=38)
+    parser.add_argument('--league-size', type=int, default=10)
+    parser.add_argument('--max-concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    crawl = ShardedCrawl(manage_database, args.shards, args.results_dir)
+    options = {
+        'request_n': -(-args.request_n // args.shards), 'sweep': args.sweep,
+        'gameweek': args.gameweek, 'league_size': args.league_size,
+        'max_concurrency': args.max_concurrency,
+        }
+    if args.step in ('plan', 'run'):
+        crawl.plan()
+    if args.step == 'work':
+        if args.index is None:
+            parser.error('work needs --index')
+        work_shard(args.shards, args.results_dir, args.index, args.task, options)
+    if args.step == 'run':
+        run_local(args.shards, args.results_dir, args.task, options)
+    if args.step in ('merge', 'run'):
+        print(f'Merged {crawl.merge()}')
+        if args.task == 'ownership':
+            checkpoint = CrawlCheckpoint(manage_database, f'gw{args.gameweek}_ownership')
+            print(f'Checkpoint {checkpoint.job}: {checkpoint.counts()}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+DraftPositionAggregator runs against a local stand-in for the choices endpoint: a league that
+has not finished drafting is skipped, and counted by a later run once its cached choices expire
+"""
+import asyncio
+import socket
+from typing import Dict, List
+
+import pytest
+from aiohttp import web
+
+from adp_main import DraftPositionAggregator
+from database.update_database import ManageDatabase
+from scrape_league import response_cache as response_cache_module
+from scrape_league import scrape_draft_choices
+from scrape_league.response_cache import ResponseCache
+from utils.fpl_constants import DRAFT_ROUNDS
+
+LEAGUE_SIZE = 8
+
+
+def draft(n_picks: int) -> Dict:
+    return {'choices': [{'element': pick, 'entry': 100 + pick % LEAGUE_SIZE, 'pick': pick}
+                        for pick in range(1, n_picks + 1)]}
+
+
+@pytest.fixture
+def port(monkeypatch) -> int:
+    """A free port the choices are served from on every run, so their urls stay the same"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    monkeypatch.setattr(scrape_draft_choices, 'DRAFT_API_URL', f'http://127.0.0.1:{port}/api')
+    return port
+
+
+async def run_aggregator(aggregator: DraftPositionAggregator, drafts: Dict[int, Dict],
+                         port: int) -> List[str]:
+    """Runs aggregator.update with the choices served from drafts on port, returning the
+    paths requested
+    """
+    requested = []
+
+    async def choices(request: web.Request) -> web.Response:
+        requested.append(request.path)
+        return web.json_response(drafts[int(request.match_info['id'])])
+
+    app = web.Application()
+    app.router.add_get('/api/draft/{id}/choices', choices)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', port).start()
+    try:
+        await aggregator.update()
+    finally:
+        await runner.cleanup()
+    return requested
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(response_cache_module.time, 'time', lambda: now[0])
+    return now
+
+
+def test_undrafted_league_is_counted_on_later_run(tmp_path, port, clock):
+    manage_database = ManageDatabase(str(tmp_path / 'fpl'))
+    manage_database.create_league_table('league')
+    manage_database.update_id('league', [(1, LEAGUE_SIZE), (2, LEAGUE_SIZE), (3, LEAGUE_SIZE)])
+    cache = ResponseCache(str(tmp_path / 'http_cache'))
+    complete = draft(LEAGUE_SIZE * DRAFT_ROUNDS)
+    # League 2 has not drafted yet and league 3 is half way through its draft
+    drafts = {1: complete, 2: draft(0), 3: draft(LEAGUE_SIZE * DRAFT_ROUNDS // 2)}
+
+    aggregator = DraftPositionAggregator(manage_database, cache=cache, max_concurrency=2)
+    aggregator.db_setup()
+    asyncio.run(run_aggregator(aggregator, drafts, port))
+    assert (aggregator.leagues_added, aggregator.leagues_skipped) == (1, 2)
+    assert manage_database.select_draft_pick_leagues('adp') == [(LEAGUE_SIZE, 1)]
+
+    # Both drafts finish, but until the cached choices expire the old ones are served
+    drafts[2] = drafts[3] = complete
+    aggregator = DraftPositionAggregator(manage_database, cache=cache, max_concurrency=2)
+    assert asyncio.run(run_aggregator(aggregator, drafts, port)) == []
+    assert aggregator.leagues_added == 0
+
+    clock[0] += cache.ttl_for('/draft/2/choices') + 1
+    aggregator = DraftPositionAggregator(manage_database, cache=cache, max_concurrency=2)
+    requested = asyncio.run(run_aggregator(aggregator, drafts, port))
+    assert sorted(requested) == ['/api/draft/2/choices', '/api/draft/3/choices']
+    assert aggregator.leagues_added == 2
+    assert manage_database.select_draft_pick_leagues('adp') == [(LEAGUE_SIZE, 3)]
+
+    cache.close()
+    manage_database.close()
+
+
+def test_complete_draft_counts_every_pick(tmp_path, port):
+    manage_database = ManageDatabase(str(tmp_path / 'fpl'))
+    manage_database.create_league_table('league')
+    manage_database.update_id('league', [(1, LEAGUE_SIZE)])
+    drafts = {1: draft(LEAGUE_SIZE * DRAFT_ROUNDS)}
+
+    aggregator = DraftPositionAggregator(manage_database)
+    aggregator.db_setup()
+    asyncio.run(run_aggregator(aggregator, drafts, port))
+    counts = sorted(manage_database.iter_draft_pick_counts('adp'))
+    assert counts == [(LEAGUE_SIZE, pick, pick, 1)
+                      for pick in range(1, LEAGUE_SIZE * DRAFT_ROUNDS + 1)]
+    manage_database.close()
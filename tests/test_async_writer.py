@@ -0,0 +1,65 @@
+"""
+AsyncBatchWriter batching and surfacing a failed write to the producers, including producers
+waiting on a full queue
+"""
+import asyncio
+import threading
+
+import pytest
+
+from database.async_writer import AsyncBatchWriter
+
+
+def test_rows_are_written_in_order():
+    batches = []
+
+    async def run():
+        async with AsyncBatchWriter(batches.append, batch_size=3) as writer:
+            for row in range(10):
+                await writer.put(row)
+        return writer
+
+    writer = asyncio.run(run())
+    assert [row for batch in batches for row in batch] == list(range(10))
+    assert all(len(batch) <= 3 for batch in batches)
+    assert writer.rows_written == 10
+
+
+def test_failed_write_is_raised_while_queue_is_full():
+    release = threading.Event()
+
+    def write(batch):
+        release.wait()
+        raise ValueError('disk full')
+
+    async def run():
+        async with AsyncBatchWriter(write, max_queue=2, batch_size=1) as writer:
+            # The first row is taken by the blocked write, the next two fill the queue
+            for row in range(3):
+                await writer.put(row)
+            await asyncio.sleep(0.01)
+            put = asyncio.ensure_future(writer.put(3))
+            await asyncio.sleep(0.01)
+            assert not put.done()
+            release.set()
+            await asyncio.wait_for(put, 5)
+
+    with pytest.raises(ValueError, match='disk full'):
+        asyncio.run(asyncio.wait_for(run(), 10))
+
+
+def test_close_raises_failed_write_with_full_queue():
+    def write(batch):
+        raise ValueError('disk full')
+
+    async def run():
+        writer = AsyncBatchWriter(write, max_queue=1, batch_size=1)
+        await writer.__aenter__()
+        await writer.put(0)
+        # Let the write fail, leaving a row nobody will take in the queue
+        await asyncio.sleep(0.05)
+        writer._queue.put_nowait(1)
+        await writer.close()
+
+    with pytest.raises(ValueError, match='disk full'):
+        asyncio.run(asyncio.wait_for(run(), 10))
@@ -0,0 +1,83 @@
+"""
+CrawlCheckpoint resuming an interrupted job from a temporary SQLite file, and clearing a job once
+finished
+"""
+import pytest
+
+from database.crawl_checkpoint import CrawlCheckpoint
+from database.update_database import ManageDatabase
+
+
+@pytest.fixture
+def db_name(tmp_path) -> str:
+    return str(tmp_path / 'fpl')
+
+
+def open_checkpoint(db_name: str, job: str = 'gw38_ownership', max_attempts: int = 3):
+    manage_database = ManageDatabase(db_name)
+    return manage_database, CrawlCheckpoint(manage_database, job, max_attempts=max_attempts)
+
+
+def test_resume_skips_done_and_retries_failed(db_name):
+    manage_database, checkpoint = open_checkpoint(db_name)
+    checkpoint.add(range(1, 7))
+    checkpoint.record([(1, {'owned': [10, 11]}), (2, None), (3, [4])])
+    # Interrupted before items 4 to 6 were attempted
+    manage_database.close()
+
+    manage_database, checkpoint = open_checkpoint(db_name)
+    # Adding the job's items again leaves their outcomes alone
+    checkpoint.add(range(1, 7))
+    assert checkpoint.counts() == {'pending': 3, 'done': 2, 'failed': 1}
+    assert checkpoint.total == 6
+    # Never attempted first, then failed ones with attempts left
+    assert list(checkpoint.iter_pending()) == [4, 5, 6, 2]
+    assert sorted(checkpoint.iter_finished()) == [(1, {'owned': [10, 11]}), (3, [4])]
+    assert not checkpoint.finished()
+    manage_database.close()
+
+
+def test_item_out_of_attempts_is_finished_as_failed(db_name):
+    manage_database, checkpoint = open_checkpoint(db_name, max_attempts=3)
+    checkpoint.add([1, 2])
+    checkpoint.record([(1, 'ok')])
+    for attempt in range(3):
+        assert list(checkpoint.iter_pending()) == [2]
+        checkpoint.record([(2, None)])
+
+    assert list(checkpoint.iter_pending()) == []
+    assert checkpoint.finished()
+    assert sorted(checkpoint.iter_finished()) == [(1, 'ok'), (2, None)]
+    manage_database.close()
+
+
+def test_failed_item_done_on_retry(db_name):
+    manage_database, checkpoint = open_checkpoint(db_name)
+    checkpoint.add([1])
+    checkpoint.record([(1, None)])
+    checkpoint.record([(1, 0)])
+    # A falsy result is still a result
+    assert list(checkpoint.iter_finished()) == [(1, 0)]
+    assert checkpoint.finished()
+    manage_database.close()
+
+
+def test_clear_starts_job_afresh_and_leaves_other_jobs(db_name):
+    manage_database, checkpoint = open_checkpoint(db_name, job='league_ids_2026-10-18')
+    other = CrawlCheckpoint(manage_database, 'league_ids_2026-10-17')
+    checkpoint.add([1, 2])
+    other.add([1, 2])
+    checkpoint.record([(1, True), (2, False)])
+    assert checkpoint.finished()
+
+    checkpoint.clear()
+    assert checkpoint.total == 0
+    assert manage_database.select_crawl_jobs('crawl_items') == ['league_ids_2026-10-17']
+    manage_database.close()
+
+    # The next run under the name crawls every item again
+    manage_database, checkpoint = open_checkpoint(db_name, job='league_ids_2026-10-18')
+    checkpoint.add([1, 2])
+    assert list(checkpoint.iter_pending()) == [1, 2]
+    assert list(checkpoint.iter_finished()) == []
+    manage_database.close()
@@ -0,0 +1,92 @@
+"""
+LeagueStats.estimate_ownership over stubbed league responses: repeated estimates do not add up,
+and the waiver intervals narrow with the share of leagues whose transactions were fetched
+"""
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from calc_ownership_main import LeagueStats
+from database.update_database import ManageDatabase
+from scrape_league.scrape_league_players import ScrapeSingleLeague
+
+N_LEAGUES = 40
+PLAYER_IDS = list(range(1, 21))
+
+
+async def selected_players(league_ids, session):
+    for league_id in league_ids:
+        yield league_id, [1, 2, 3, 4, 5, 6 + league_id % 10]
+
+
+def waivers(failed):
+    async def iter_waivers(gameweek, league_ids, session):
+        for league_id in league_ids:
+            if league_id in failed:
+                yield league_id, None
+            elif league_id % 2:
+                yield league_id, ([1], [2 + league_id % 3])
+            else:
+                yield league_id, ([], [])
+    return staticmethod(iter_waivers)
+
+
+@pytest.fixture
+def league_stats(tmp_path, monkeypatch):
+    manage_database = ManageDatabase(str(tmp_path / 'fpl'))
+    manage_database.create_fpl_players_table('players')
+    manage_database.update_fpl_players(
+        'players', [(player_id, f'Player {player_id}', 'Club') for player_id in PLAYER_IDS]
+        )
+    monkeypatch.setattr(ScrapeSingleLeague, 'iter_selected_players', selected_players)
+    league_ids = list(range(N_LEAGUES))
+    yield LeagueStats(league_ids, league_sizes={league_id: 10 for league_id in league_ids},
+                      mange_database=manage_database)
+    manage_database.close()
+
+
+def estimate(league_stats, target_width=0.0):
+    return asyncio.run(league_stats.estimate_ownership(
+        gameweek=3, batch_size=10, target_width=target_width, seed=0))
+
+
+def test_repeated_estimate_does_not_double_count(league_stats, monkeypatch):
+    monkeypatch.setattr(LeagueStats, '_iter_waivers', waivers(failed=set()))
+    # Any interval is accepted, so each estimate stops after its first batch
+    assert estimate(league_stats, target_width=1.0) == 10
+    first = league_stats.get_estimates_df().set_index('id')
+    assert estimate(league_stats, target_width=1.0) == 10
+    second = league_stats.get_estimates_df().set_index('id')
+    pd.testing.assert_frame_equal(first, second)
+
+    assert estimate(league_stats) == N_LEAGUES
+    estimates = league_stats.get_estimates_df().set_index('id')
+    assert estimates.loc[1, 'ownership'] == 1.0
+    assert estimates.loc[6, 'ownership'] == pytest.approx(0.1)
+    # Waivers are a share of the leagues with accepted waivers
+    assert estimates.loc[1, 'waivers_in'] == 1.0
+    assert estimates.loc[2:4, 'waivers_out'].sum() == pytest.approx(1.0)
+
+
+def test_every_league_sampled_leaves_no_uncertainty(league_stats, monkeypatch):
+    monkeypatch.setattr(LeagueStats, '_iter_waivers', waivers(failed=set()))
+    estimate(league_stats)
+    estimates = league_stats.get_estimates_df()
+    for stat in ('ownership', 'waivers_in', 'waivers_out'):
+        np.testing.assert_allclose(estimates[f'{stat}_low'], estimates[f'{stat}_high'])
+
+
+def test_waiver_interval_uses_leagues_fetched(league_stats, monkeypatch):
+    # A quarter of the transactions requests fail, so a quarter of the waivers are unseen
+    failed = set(range(0, N_LEAGUES, 4))
+    monkeypatch.setattr(LeagueStats, '_iter_waivers', waivers(failed))
+    estimate(league_stats)
+    estimates = league_stats.get_estimates_df().set_index('id')
+
+    np.testing.assert_allclose(estimates['ownership_low'], estimates['ownership_high'])
+    width = estimates['waivers_out_high'] - estimates['waivers_out_low']
+    assert (width.loc[2:4] > 0).all()
+    assert league_stats._sampled_fraction('waivers_out') == pytest.approx(0.75)
+    assert league_stats._sampled_fraction('ownership') == 1.0
@@ -0,0 +1,82 @@
+"""
+Equivalence of the vectorised league table with the scalar reference,
+ScrapeSingleLeague._get_expected_points, on random h2h leagues
+"""
+import random
+from typing import Dict, Tuple
+
+import numpy as np
+import pytest
+
+from scrape_league.scrape_league_players import ScrapeSingleLeague
+from utils.expected_points import expected_points_matrix
+
+
+def random_league(rng: random.Random, n_teams: int, n_gameweeks: int,
+                  unfinished: int = 0) -> Tuple[Dict, Dict]:
+    """(team info, results) as from _parse_h2h_results. The last gameweek has unfinished
+    matches, whose teams are missing from it.
+    """
+    team_ids = [100 + i for i in range(n_teams)]
+    team_info = {team_id: {'team_name': f'Team {team_id}', 'player_name': f'Player {team_id}'}
+                 for team_id in team_ids}
+    results = {}
+    for gw in range(1, n_gameweeks + 1):
+        order = rng.sample(team_ids, n_teams)
+        pairs = [order[i:i + 2] for i in range(0, n_teams, 2)]
+        if gw == n_gameweeks:
+            pairs = pairs[unfinished:]
+        gw_results = {}
+        for team_1, team_2 in pairs:
+            # A narrow range, so ties are common
+            points_1, points_2 = rng.randint(20, 30), rng.randint(20, 30)
+            result_1, result_2 = ScrapeSingleLeague._parse_gw_result(points_1, points_2)
+            gw_results.update({team_1: (points_1, result_1), team_2: (points_2, result_2)})
+        results[str(gw)] = gw_results
+    return team_info, results
+
+
+def reference_xpts(team_info: Dict, results: Dict) -> Dict[int, float]:
+    """Season xPts of each team, a gameweek at a time over the teams present in it"""
+    xpts = {team_id: 0.0 for team_id in team_info}
+    for gw_results in results.values():
+        gw_points = [points for points, _ in gw_results.values()]
+        for team_id, (points, _) in gw_results.items():
+            xpts[team_id] += ScrapeSingleLeague._get_expected_points(gw_points, points)
+    return xpts
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('unfinished', [0, 1, 2])
+def test_league_table_matches_reference(seed: int, unfinished: int) -> None:
+    rng = random.Random(seed)
+    team_info, results = random_league(rng, rng.choice([6, 8, 10, 12]), rng.randint(1, 38),
+                                       unfinished)
+    table = ScrapeSingleLeague.get_league_table(team_info, results)
+    expected = reference_xpts(team_info, results)
+    for team_id, row in table.iterrows():
+        assert row['xPts'] == pytest.approx(round(expected[team_id], 2), abs=1e-9)
+        played = [result for gw in results.values() if team_id in gw
+                  for _, result in [gw[team_id]]]
+        assert row['wins'] == played.count('W')
+        assert row['draws'] == played.count('D')
+        assert row['losses'] == played.count('L')
+
+
+def test_partial_gameweek() -> None:
+    # Team 1 beats team 2, teams 3 and 4 draw, and the match of teams 5 and 6 is unfinished
+    results = {'1': {1: (50, 'W'), 2: (40, 'L'), 3: (45, 'D'), 4: (45, 'D')}}
+    team_info = {team_id: {'team_name': '', 'player_name': ''} for team_id in range(1, 7)}
+    table = ScrapeSingleLeague.get_league_table(team_info, results)
+    assert table.loc[1, 'xPts'] == pytest.approx(3.0)
+    assert table.loc[3, 'xPts'] == pytest.approx(round(4 / 3, 2))
+    assert table.loc[5, 'xPts'] == 0.0
+    assert table['xPts'].sum() == pytest.approx(
+        sum(reference_xpts(team_info, results).values()), abs=0.02
+        )
+
+
+def test_single_team_present_scores_nothing() -> None:
+    present = np.array([[True], [False], [False]])
+    assert expected_points_matrix(np.array([[10], [0], [0]]), present).tolist() == \
+        [[0.0], [0.0], [0.0]]
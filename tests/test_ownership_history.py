@@ -0,0 +1,73 @@
+"""
+LeagueOwnershipHistory replay of a small hand-written draft and transaction history
+"""
+import asyncio
+import json
+
+from scrape_league.ownership_history import LeagueOwnershipHistory
+
+CHOICES = {'choices': [
+    {'element': element, 'entry': 100 + element % 2, 'pick': element} for element in range(1, 7)
+    ]}
+
+# Out of order, as the replay must sort by (event, id)
+TRANSACTIONS = {'transactions': [
+    # Player 5, dropped for 7 earlier in gameweek 3, is picked up again by the other team
+    {'id': 12, 'entry': 101, 'event': 3, 'kind': 'f', 'result': 'a',
+     'element_in': 5, 'element_out': 6},
+    {'id': 10, 'entry': 100, 'event': 3, 'kind': 'w', 'result': 'a',
+     'element_in': 7, 'element_out': 5},
+    # Rejected, so never applied
+    {'id': 11, 'entry': 101, 'event': 3, 'kind': 'w', 'result': 'di',
+     'element_in': 8, 'element_out': 1},
+    {'id': 20, 'entry': 100, 'event': 5, 'kind': 'f', 'result': 'a',
+     'element_in': 9, 'element_out': 2},
+    ]}
+
+EXPECTED = {
+    1: [1, 2, 3, 4, 5, 6],
+    2: [1, 2, 3, 4, 5, 6],
+    3: [1, 2, 3, 4, 5, 7],
+    4: [1, 2, 3, 4, 5, 7],
+    5: [1, 3, 4, 5, 7, 9],
+    }
+
+
+class StubSession:
+    """Serves fixed bodies by url suffix, None for a failed request"""
+    def __init__(self, bodies) -> None:
+        self._bodies = bodies
+
+    async def get_parsed(self, url, decode):
+        for suffix, body in self._bodies.items():
+            if url.endswith(suffix):
+                return None if body is None else decode(json.dumps(body))
+        raise AssertionError(f'unexpected request {url}')
+
+
+def get_ownership(bodies, gameweeks):
+    return asyncio.run(LeagueOwnershipHistory.get_ownership_by_gameweek(
+        1234, gameweeks, StubSession(bodies)))
+
+
+def test_ownership_by_gameweek():
+    bodies = {'/draft/1234/choices': CHOICES,
+              '/draft/league/1234/transactions': TRANSACTIONS}
+    assert get_ownership(bodies, range(1, 6)) == EXPECTED
+
+
+def test_gameweeks_in_any_order():
+    bodies = {'/draft/1234/choices': CHOICES,
+              '/draft/league/1234/transactions': TRANSACTIONS}
+    assert get_ownership(bodies, [5, 2, 3]) == {gw: EXPECTED[gw] for gw in (2, 3, 5)}
+
+
+def test_no_transactions_keeps_draft():
+    bodies = {'/draft/1234/choices': CHOICES,
+              '/draft/league/1234/transactions': {'transactions': []}}
+    assert get_ownership(bodies, [1, 38]) == {1: EXPECTED[1], 38: EXPECTED[1]}
+
+
+def test_failed_request_returns_none():
+    bodies = {'/draft/1234/choices': CHOICES, '/draft/league/1234/transactions': None}
+    assert get_ownership(bodies, [1]) is None
@@ -0,0 +1,113 @@
+"""
+OwnershipMatrix packed ownership flags and sparse waiver counts, checked against a dense numpy
+reference built from the same random leagues
+"""
+import numpy as np
+import pytest
+
+from utils import ownership_matrix
+from utils.ownership_matrix import OwnershipMatrix
+
+
+def random_leagues(rng: np.random.Generator, player_ids: np.ndarray, n_leagues: int,
+                   sparse: bool):
+    """(league id, league size, player ids) triples. Sparse leagues repeat players, as a player
+    can be waived in more than once.
+    """
+    leagues = []
+    for league_id in rng.choice(100_000, n_leagues, replace=False):
+        league_size = int(rng.choice([8, 10, 12]))
+        if sparse:
+            players = rng.choice(player_ids, rng.integers(0, 6), replace=True)
+        else:
+            players = rng.choice(player_ids, rng.integers(0, 60), replace=False)
+        leagues.append((int(league_id), league_size, [int(player) for player in players]))
+    return leagues
+
+
+def dense_reference(player_ids: np.ndarray, leagues, sparse: bool) -> np.ndarray:
+    column = {int(player_id): idx for idx, player_id in enumerate(player_ids)}
+    dense = np.zeros((len(leagues), len(player_ids)), dtype=np.int64)
+    for row, (_, _, players) in enumerate(leagues):
+        for player in players:
+            if sparse:
+                dense[row, column[player]] += 1
+            else:
+                dense[row, column[player]] = 1
+    return dense
+
+
+@pytest.fixture(params=[False, True], ids=['flags', 'sparse'])
+def built(request, monkeypatch):
+    # Few rows per unpacked chunk and a small initial allocation, so both are exercised
+    monkeypatch.setattr(ownership_matrix, 'UNPACK_ROWS', 7)
+    sparse = request.param
+    rng = np.random.default_rng(0)
+    # Not a multiple of 8, so the last packed byte is partly padding
+    player_ids = rng.choice(10_000, 203, replace=False)
+    leagues = random_leagues(rng, player_ids, 50, sparse)
+    matrix = OwnershipMatrix(player_ids, sparse=sparse, initial_leagues=4)
+    for league_id, league_size, players in leagues:
+        matrix.add(league_id, players, league_size)
+    return matrix, leagues, dense_reference(player_ids, leagues, sparse)
+
+
+def test_matrix_matches_reference(built):
+    matrix, leagues, dense = built
+    np.testing.assert_array_equal(matrix.matrix, dense)
+    np.testing.assert_array_equal(matrix.league_ids, [league[0] for league in leagues])
+
+
+def test_packed_round_trip(built):
+    matrix, _, dense = built
+    packed = matrix.packed_rows()
+    np.testing.assert_array_equal(packed, np.packbits(dense > 0, axis=1))
+    unpacked = np.unpackbits(packed, axis=1, count=dense.shape[1])
+    np.testing.assert_array_equal(unpacked, dense > 0)
+
+
+@pytest.mark.parametrize('league_size', [None, 8, 10, 12])
+def test_counts_match_reference(built, league_size):
+    matrix, leagues, dense = built
+    sizes = np.array([league[1] for league in leagues])
+    rows = np.ones(len(leagues), dtype=bool) if league_size is None else sizes == league_size
+    np.testing.assert_array_equal(matrix.counts(league_size), dense[rows].sum(axis=0))
+    assert matrix.n_leagues(league_size) == rows.sum()
+
+
+def test_columns_and_aggregates(built):
+    matrix, leagues, dense = built
+    sizes = np.array([league[1] for league in leagues])
+    for idx, player_id in enumerate(matrix.player_ids[:20]):
+        np.testing.assert_array_equal(matrix.column(int(player_id)), dense[:, idx])
+
+    expected = {
+        (int(size), int(player_id), int(count))
+        for size in np.unique(sizes)
+        for player_id, count in zip(matrix.player_ids, dense[sizes == size].sum(axis=0))
+        if count
+        }
+    assert set(matrix.iter_aggregates()) == expected
+
+
+def test_to_dict_repeats_league_per_count(built):
+    matrix, leagues, dense = built
+    league_ids = np.array([league[0] for league in leagues])
+    by_player = matrix.to_dict()
+    for idx, player_id in enumerate(matrix.player_ids):
+        assert by_player[int(player_id)] == np.repeat(league_ids, dense[:, idx]).tolist()
+
+
+def test_flags_ignore_repeated_player():
+    matrix = OwnershipMatrix([1, 2, 3])
+    matrix.add(10, [1, 1, 3], 8)
+    matrix.add(10, [1], 8)
+    np.testing.assert_array_equal(matrix.matrix, [[1, 0, 1]])
+
+
+def test_league_without_players_is_counted():
+    matrix = OwnershipMatrix([1, 2], sparse=True)
+    matrix.add(10, [], 8)
+    matrix.add(11, [2], 8)
+    assert matrix.n_leagues(8) == 2
+    assert matrix.get_series('waivers', league_size=8).tolist() == [0.0, 0.5]
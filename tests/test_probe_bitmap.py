@@ -0,0 +1,111 @@
+"""
+ProbeBitmap state packing, persistence and eligible id draws, checked against a dict of states
+"""
+import random
+
+import pytest
+
+from utils.probe_bitmap import ERROR, HIT, MISS, UNPROBED, ProbeBitmap
+
+
+@pytest.fixture
+def file_name(tmp_path) -> str:
+    return str(tmp_path / 'league_probes.bin')
+
+
+def random_states(rng: random.Random, n: int):
+    return {league_id: rng.choice((UNPROBED, HIT, MISS, ERROR)) for league_id in range(n)}
+
+
+def test_states_are_packed_independently(file_name):
+    rng = random.Random(0)
+    states = random_states(rng, 203)
+    bitmap = ProbeBitmap(file_name)
+    for league_id in rng.sample(list(states), len(states)):
+        bitmap.mark(league_id, states[league_id])
+    # Overwriting an id leaves its neighbours in the same byte alone
+    for league_id in range(0, 203, 7):
+        bitmap.mark(league_id, MISS)
+        states[league_id] = MISS
+
+    assert [bitmap.state(league_id) for league_id in states] == list(states.values())
+    assert bitmap.state(10_000) == UNPROBED
+
+
+def test_counts(file_name):
+    bitmap = ProbeBitmap(file_name)
+    bitmap.mark_many([1, 2, 3], HIT)
+    bitmap.mark(5, MISS)
+    bitmap.mark(6, ERROR)
+    counts = bitmap.counts(end=20)
+    assert counts == {'unprobed': 15, 'hit': 3, 'miss': 1, 'error': 1}
+
+
+def test_save_and_load(file_name):
+    rng = random.Random(1)
+    states = random_states(rng, 1000)
+    bitmap = ProbeBitmap(file_name)
+    for league_id, state in states.items():
+        bitmap.mark(league_id, state)
+    bitmap.save()
+
+    loaded = ProbeBitmap(file_name)
+    assert [loaded.state(league_id) for league_id in states] == list(states.values())
+
+
+@pytest.mark.parametrize('start,end,step', [(0, 300, 1), (3, 250, 1), (1, 400, 1), (2, 300, 3)])
+def test_iter_eligible_skips_probed_ids(file_name, start, end, step):
+    rng = random.Random(2)
+    states = random_states(rng, 200)
+    bitmap = ProbeBitmap(file_name)
+    for league_id, state in states.items():
+        bitmap.mark(league_id, state)
+
+    expected = [league_id for league_id in range(start, end, step)
+                if states.get(league_id, UNPROBED) in (UNPROBED, ERROR)]
+    assert list(bitmap.iter_eligible(start, end, step)) == expected
+
+
+def test_sample_eligible_draws_only_eligible_ids(file_name):
+    rng = random.Random(3)
+    states = random_states(rng, 500)
+    bitmap = ProbeBitmap(file_name)
+    for league_id, state in states.items():
+        bitmap.mark(league_id, state)
+    eligible = {league_id for league_id, state in states.items() if state in (UNPROBED, ERROR)}
+
+    sample = bitmap.sample_eligible(50, 0, 500)
+    assert len(sample) == len(set(sample)) == 50
+    assert set(sample) <= eligible
+
+    # Asking for more than remain returns every eligible id not yet drawn
+    rest = bitmap.sample_eligible(len(eligible), 0, 500)
+    assert set(rest) == eligible - set(sample)
+
+
+def test_drawn_ids_are_not_drawn_again_until_marked_or_released(file_name):
+    bitmap = ProbeBitmap(file_name)
+    first = bitmap.sample_eligible(10, 0, 20)
+    second = list(bitmap.iter_eligible(0, 20))
+    assert sorted(first + second) == list(range(20))
+    assert bitmap.in_flight == 20
+    assert bitmap.sample_eligible(5, 0, 20) == []
+
+    # An errored probe is eligible again, an unprobed id once released
+    bitmap.mark(first[0], ERROR)
+    bitmap.release(second[:2])
+    assert sorted(bitmap.sample_eligible(5, 0, 20)) == sorted([first[0]] + second[:2])
+
+
+def test_merge_keeps_hits(file_name, tmp_path):
+    bitmap = ProbeBitmap(file_name)
+    bitmap.mark(2, HIT)
+    shard = ProbeBitmap(str(tmp_path / 'shard.bin'))
+    shard.mark_many([0, 2, 4], ERROR)
+    shard.mark(6, MISS)
+    # Shard ids are every second id from 0
+    shard.mark(1, HIT)
+
+    bitmap.merge(shard, 0, 2)
+    assert [bitmap.state(league_id) for league_id in range(7)] == [
+        ERROR, UNPROBED, HIT, UNPROBED, ERROR, UNPROBED, MISS]
@@ -0,0 +1,46 @@
+"""
+AdaptiveRateLimiter backing off once per cool-down window however many concurrent requests are
+throttled
+"""
+import pytest
+
+from scrape_league import rate_limiter
+from scrape_league.rate_limiter import AdaptiveRateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_concurrent_throttles_decrease_once(clock):
+    limiter = AdaptiveRateLimiter(rate=40.0, cooldown=1.0)
+    for _ in range(10):
+        limiter.on_throttle()
+    assert limiter.rate == 20.0
+
+    clock[0] += 1.0
+    limiter.on_throttle()
+    limiter.on_throttle()
+    assert limiter.rate == 10.0
+
+
+def test_retry_after_extends_cooldown(clock):
+    limiter = AdaptiveRateLimiter(rate=40.0, cooldown=1.0)
+    limiter.on_throttle(retry_after=5.0)
+    clock[0] += 2.0
+    limiter.on_throttle(retry_after=5.0)
+    assert limiter.rate == 20.0
+
+    clock[0] += 3.0
+    limiter.on_throttle()
+    assert limiter.rate == 10.0
+
+
+def test_rate_stays_above_floor(clock):
+    limiter = AdaptiveRateLimiter(rate=4.0, min_rate=1.0, cooldown=0.0)
+    for _ in range(5):
+        limiter.on_throttle()
+    assert limiter.rate == 1.0
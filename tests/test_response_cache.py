@@ -0,0 +1,164 @@
+"""
+ResponseCache ttl lookup, conditional revalidation and LRU eviction, on a temporary SQLite file
+with requests.get replaced by a stub
+"""
+from typing import Dict, List, Optional
+
+import pytest
+
+from scrape_league import response_cache
+from scrape_league.response_cache import FOREVER, ResponseCache, cached_get
+
+BASE = 'https://draft.premierleague.com/api'
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1_000_000.0
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, content: bytes = b'',
+                 headers: Optional[Dict[str, str]] = None) -> None:
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+
+class FakeServer:
+    """Stands in for requests.get, answering conditional requests with 304 if the validators
+    match
+    """
+    def __init__(self, body: bytes, etag: str, last_modified: str) -> None:
+        self.body = body
+        self.etag = etag
+        self.last_modified = last_modified
+        self.requests: List[Dict[str, str]] = []
+
+    def get(self, url: str, headers: Optional[Dict[str, str]] = None) -> FakeResponse:
+        headers = headers or {}
+        self.requests.append(headers)
+        if (headers.get('If-None-Match') == self.etag
+                and headers.get('If-Modified-Since') == self.last_modified):
+            return FakeResponse(304)
+        return FakeResponse(200, self.body,
+                            {'ETag': self.etag, 'Last-Modified': self.last_modified})
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(response_cache.time, 'time', clock.time)
+    return clock
+
+
+@pytest.fixture
+def cache(tmp_path) -> ResponseCache:
+    cache = ResponseCache(str(tmp_path / 'http_cache'))
+    yield cache
+    cache.close()
+
+
+@pytest.mark.parametrize('path,ttl', [
+    ('/bootstrap-static', 6 * 60 * 60),
+    ('/draft/123/choices', 24 * 60 * 60),
+    ('/league/123/details', 60 * 60),
+    ('/league/123/element-status', 15 * 60),
+    ('/draft/league/123/transactions', 60 * 60),
+    ('/entry/45/event/7', 60 * 60),
+    ('/entry/45/public', 60 * 60),
+])
+def test_ttl_for_default_patterns(cache, path, ttl):
+    assert cache.ttl_for(BASE + path) == ttl
+
+
+def test_ttl_for_first_match_wins(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'http_cache'), default_ttl=5,
+                          ttls=[(r'/details$', 10), (r'/league/\d+/', 20)])
+    assert cache.ttl_for(BASE + '/league/1/details') == 10
+    assert cache.ttl_for(BASE + '/league/1/element-status') == 20
+    assert cache.ttl_for(BASE + '/game') == 5
+
+
+def test_get_respects_ttl(cache, clock):
+    url = BASE + '/league/1/details'
+    cache.store(url, b'body', {})
+    assert cache.get(url) == b'body'
+
+    clock.now += 60 * 60 + 1
+    assert cache.get(url) is None
+    assert cache.get(url, ttl=FOREVER) == b'body'
+    assert cache.stats['hits'] == 2
+    assert cache.stats['misses'] == 1
+
+
+def test_stale_response_is_revalidated(cache, clock, monkeypatch):
+    url = BASE + '/league/1/details'
+    server = FakeServer(b'{"league": 1}', '"v1"', 'Sat, 01 Aug 2026 10:00:00 GMT')
+    monkeypatch.setattr(response_cache.requests, 'get', server.get)
+
+    assert cached_get(url, cache) == server.body
+    assert server.requests == [{}]
+
+    # Fresh, so served without a request
+    assert cached_get(url, cache) == server.body
+    assert len(server.requests) == 1
+
+    # Stale, so sent with the stored validators and answered with 304
+    clock.now += 60 * 60 + 1
+    assert cached_get(url, cache) == server.body
+    assert server.requests[-1] == {'If-None-Match': '"v1"',
+                                   'If-Modified-Since': 'Sat, 01 Aug 2026 10:00:00 GMT'}
+    assert cache.stats['revalidations'] == 1
+
+    # The 304 made the response fresh again
+    assert cached_get(url, cache) == server.body
+    assert len(server.requests) == 2
+
+
+def test_changed_response_replaces_cached_body(cache, clock, monkeypatch):
+    url = BASE + '/league/1/details'
+    server = FakeServer(b'old', '"v1"', 'Sat, 01 Aug 2026 10:00:00 GMT')
+    monkeypatch.setattr(response_cache.requests, 'get', server.get)
+    cached_get(url, cache)
+
+    server.body, server.etag = b'new', '"v2"'
+    clock.now += 60 * 60 + 1
+    assert cached_get(url, cache) == b'new'
+    assert cache.validators(url)['If-None-Match'] == '"v2"'
+    assert cache.stats['revalidations'] == 0
+
+
+def test_evicts_least_recently_used(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / 'http_cache'), max_bytes=100)
+    urls = [BASE + f'/league/{i}/details' for i in range(3)]
+    cache.store(urls[0], b'a' * 40, {})
+    clock.now += 1
+    cache.store(urls[1], b'b' * 40, {})
+    clock.now += 1
+    # Reading the oldest response makes the second the least recently used
+    assert cache.get(urls[0]) is not None
+    clock.now += 1
+    cache.store(urls[2], b'c' * 40, {})
+
+    assert cache.get(urls[1]) is None
+    assert cache.get(urls[0]) == b'a' * 40
+    assert cache.get(urls[2]) == b'c' * 40
+    assert cache.stats['evictions'] == 1
+    assert cache.stats['bytes'] == 80
+    cache.close()
+
+
+def test_total_bytes_survive_reopening(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'http_cache'))
+    cache.store(BASE + '/game', b'x' * 10, {})
+    cache.store(BASE + '/game', b'x' * 25, {})
+    cache.close()
+
+    reopened = ResponseCache(str(tmp_path / 'http_cache'))
+    assert reopened.get(BASE + '/game', ttl=FOREVER) == b'x' * 25
+    assert reopened.stats['bytes'] == 25
+    reopened.close()
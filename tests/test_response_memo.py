@@ -0,0 +1,128 @@
+"""
+ResponseMemo single-flight coalescing, the shared url rule and LRU eviction
+"""
+import asyncio
+
+from scrape_league.response_memo import ResponseMemo
+
+URL = 'https://draft.premierleague.com/api/bootstrap-static'
+
+
+class CountingFetch:
+    """A fetch that waits until released, counting the requests sent"""
+    def __init__(self, body: bytes = b'body', status: int = 200) -> None:
+        self.body = body
+        self.status = status
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        return self.status, self.body
+
+
+def test_concurrent_requests_are_coalesced():
+    async def run():
+        memo = ResponseMemo()
+        fetch = CountingFetch()
+        tasks = [asyncio.create_task(memo.coalesce(URL, fetch)) for _ in range(5)]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return memo, fetch, await asyncio.gather(*tasks)
+
+    memo, fetch, results = asyncio.run(run())
+    assert fetch.calls == 1
+    assert results == [(200, b'body')] * 5
+    assert memo.stats['misses'] == 1
+    assert memo.stats['coalesced'] == 4
+
+
+def test_failed_request_is_shared_with_waiters_but_not_kept():
+    async def run():
+        memo = ResponseMemo()
+        memo.share([URL])
+        fetch = CountingFetch(body=None, status=500)
+        tasks = [asyncio.create_task(memo.coalesce(URL, fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return memo, fetch, await asyncio.gather(*tasks)
+
+    memo, fetch, results = asyncio.run(run())
+    assert fetch.calls == 1
+    assert results == [(500, None)] * 3
+    assert memo.get(URL) is None
+
+
+def test_cancelled_request_is_sent_again_by_a_waiter():
+    async def run():
+        memo = ResponseMemo()
+        fetch = CountingFetch()
+        first = asyncio.create_task(memo.coalesce(URL, fetch))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(memo.coalesce(URL, fetch))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        fetch.release.set()
+        return fetch, await second
+
+    fetch, result = asyncio.run(run())
+    assert fetch.calls == 2
+    assert result == (200, b'body')
+
+
+def test_only_shared_bodies_are_kept():
+    shared = URL
+    unshared = 'https://draft.premierleague.com/api/draft/1/choices'
+
+    async def run():
+        memo = ResponseMemo()
+        memo.share([shared])
+        fetch = CountingFetch()
+        fetch.release.set()
+        for _ in range(2):
+            await memo.coalesce(shared, fetch)
+            await memo.coalesce(unshared, fetch)
+        return memo, fetch
+
+    memo, fetch = asyncio.run(run())
+    # The shared url is fetched once, the other every time it is requested
+    assert fetch.calls == 3
+    assert memo.get(shared) == b'body'
+    assert memo.get(unshared) is None
+    assert memo.stats['bytes'] == len(b'body')
+
+
+def test_put_ignores_unshared_url():
+    memo = ResponseMemo()
+    memo.put(URL, b'body')
+    assert memo.get(URL) is None
+    memo.share([URL])
+    memo.put(URL, b'body')
+    assert memo.get(URL) == b'body'
+
+
+def test_evicts_least_recently_used():
+    urls = [f'{URL}?{i}' for i in range(3)]
+    memo = ResponseMemo(max_bytes=100)
+    memo.share(urls)
+    memo.put(urls[0], b'a' * 40)
+    memo.put(urls[1], b'b' * 40)
+    # Reading the oldest body makes the second the least recently used
+    assert memo.get(urls[0]) is not None
+    memo.put(urls[2], b'c' * 40)
+
+    assert memo.get(urls[1]) is None
+    assert memo.get(urls[0]) == b'a' * 40
+    assert memo.get(urls[2]) == b'c' * 40
+    assert memo.stats['evictions'] == 1
+    assert memo.stats['bytes'] == 80
+
+
+def test_body_larger_than_memo_is_not_kept():
+    memo = ResponseMemo(max_bytes=10)
+    memo.share([URL])
+    memo.put(URL, b'x' * 11)
+    assert memo.get(URL) is None
+    assert memo.stats['bytes'] == 0
@@ -0,0 +1,149 @@
+"""
+Main script for incremental transaction ingestion
+
+Stores each league's waivers and free agent moves in the database keyed by transaction id, with
+a per-league high-water mark. A run only inserts transactions above a league's mark and only
+recomputes the waiver aggregates of gameweeks those transactions fall in, so a weekly run does
+work in proportion to the week's transactions rather than the whole season's.
+"""
+import asyncio
+from functools import partial
+from typing import List, Optional, Set, Tuple
+
+import pandas as pd
+
+from app import manage_database, metrics, response_cache
+from database.async_writer import AsyncBatchWriter
+from database.query_stats import QueryStats
+from database.update_database import ManageDatabase
+from scrape_league.draft_session import DraftSession
+from scrape_league.response_cache import ResponseCache
+from scrape_league.schemas import Transaction
+from scrape_league.scrape_league_transfers import SingleGWTransfers
+from utils.columnar_output import write_output
+from utils.metrics import Metrics, reporting
+
+
+class TransactionIngest:
+    def __init__(self, mange_database: ManageDatabase, league_table: str = 'league',
+                 table_name: str = 'transactions',
+                 aggregate_table: str = 'player_aggregates', max_concurrency: int = 50,
+                 cache: Optional[ResponseCache] = None,
+                 metrics: Optional[Metrics] = None) -> None:
+        """Init method
+
+        Args:
+            mange_database (ManageDatabase): Database holding the leagues and transactions
+            league_table (str, optional): League table to walk. Defaults to 'league'.
+            table_name (str, optional): Transactions table, also the prefix of its marks and
+                marks table. Defaults to 'transactions'.
+            aggregate_table (str, optional): Materialized aggregates the waivers are written
+                to. Defaults to 'player_aggregates'.
+            max_concurrency (int, optional): Leagues fetched at once. Defaults to 50.
+            cache (ResponseCache, optional): Response cache for the transactions requests.
+                Defaults to None.
+            metrics (Metrics, optional): Request and write metrics, reported periodically
+                while ingesting. Defaults to None.
+        """
+        self._manage_database = mange_database
+        self._league_table = league_table
+        self._table_name = table_name
+        self._aggregate_table = aggregate_table
+        self._metrics = metrics
+        self._get_session = partial(DraftSession, max_concurrency, cache=cache, metrics=metrics)
+        # Gameweeks with a transaction inserted this run, whose aggregates are stale
+        self._affected_gameweeks: Set[int] = set()
+        self._transactions_added = 0
+        self._failed_ids: List = []
+
+    def db_setup(self) -> None:
+        self._manage_database.create_transactions_tables(self._table_name)
+        self._manage_database.create_aggregate_tables(self._aggregate_table)
+
+    async def update(self) -> None:
+        """Ingests every league's new transactions, then refreshes the affected aggregates"""
+        marks = self._manage_database.select_transaction_marks(self._table_name)
+        league_ids = self._manage_database.iter_league_ids(self._league_table)
+        async with reporting(self._metrics), \
+                self._get_session() as session, \
+                AsyncBatchWriter(self._write_batch, metrics=self._metrics,
+                                 name=self._table_name) as writer:
+            async for league_id, transactions in SingleGWTransfers.iter_new_transactions(
+                    league_ids, marks, session):
+                if transactions is None:
+                    self._failed_ids.append(league_id)
+                    continue
+                if transactions:
+                    await writer.put((league_id, transactions))
+                    self._transactions_added += len(transactions)
+                    self._affected_gameweeks.update(event.event for event in transactions)
+
+        self._manage_database.update_waiver_aggregates(
+            self._table_name, self._league_table, sorted(self._affected_gameweeks),
+            self._aggregate_table
+            )
+
+    def _write_batch(self, batch: List[Tuple[int, List[Transaction]]]) -> None:
+        rows = [
+            (event.id, league_id, event.entry, event.event, event.kind, event.result,
+             event.element_in, event.element_out)
+            for league_id, transactions in batch for event in transactions
+            ]
+        marks = [
+            (league_id, max(event.id for event in transactions))
+            for league_id, transactions in batch
+            ]
+        self._manage_database.update_transactions(self._table_name, rows, marks)
+
+    def get_waivers_df(self, gameweek: int, league_size: Optional[int] = None) -> pd.DataFrame:
+        """Waivers in/out percentages for gameweek from the stored aggregates, as a share of
+        the leagues with an accepted waiver that gameweek
+        """
+        query_stats = QueryStats(self._manage_database.db_name, self._aggregate_table)
+        try:
+            waivers_in, waivers_out = (
+                pd.DataFrame(query_stats.get_top_players(stat, gameweek, league_size, None),
+                             columns=['id', stat])
+                for stat in ('waivers_in', 'waivers_out')
+                )
+            waivers_df = pd.merge(waivers_in, waivers_out, on='id', how='outer').fillna(0)
+        finally:
+            query_stats.close()
+        player_df = pd.DataFrame(
+            self._manage_database.select_player_details('players', waivers_df['id'].tolist()),
+            columns=['id', 'Name', 'Club']
+            )
+        return pd.merge(waivers_df, player_df, on='id')
+
+    @property
+    def affected_gameweeks(self) -> List[int]:
+        return sorted(self._affected_gameweeks)
+
+    @property
+    def transactions_added(self) -> int:
+        return self._transactions_added
+
+    @property
+    def failed_ids(self) -> List:
+        return self._failed_ids
+
+
+def main() -> None:
+    ingest = TransactionIngest(manage_database, cache=response_cache, metrics=metrics)
+    ingest.db_setup()
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(ingest.update())
+    print(f'{ingest.transactions_added} new transactions in gameweeks '
+          f'{ingest.affected_gameweeks}, {len(ingest.failed_ids)} leagues failed')
+
+    for gameweek in ingest.affected_gameweeks:
+        # Across every league size, so partitioned by gameweek only
+        write_output(
+            ingest.get_waivers_df(gameweek).sort_values('waivers_in', ascending=False),
+            'waivers', f'waivers_GW{gameweek}.csv', ('gameweek',), gameweek=gameweek
+            )
+    if metrics is not None:
+        print(f'Metrics written to {metrics.dump()}')
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+ColumnarOutput class. Appends the ownership, waiver, xPts and ADP outputs to Parquet datasets
+partitioned by gameweek and/or league size, so later analyses read only the columns and
+partitions they need instead of re-parsing whole CSVs.
+
+Layout: {root}/{name}/gameweek={gw}/league_size={size}/{run}-{i}.parquet. Every write adds new
+files and never rewrites old ones. Rows carry the run that wrote them, and read keeps only the
+latest run of each partition unless asked for all of them.
+
+pyarrow is needed to write and read the datasets. Without it write_output falls back to the
+CSV each main wrote before.
+"""
+import os
+import time
+from typing import List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+OUTPUT_DIR = 'database/outputs'
+
+# Written as a column of every row, microseconds since the epoch
+RUN_COLUMN = 'run'
+
+
+def columnar_available() -> bool:
+    return pa is not None
+
+
+class ColumnarOutput:
+    def __init__(self, root: str = OUTPUT_DIR) -> None:
+        """Init method
+
+        Args:
+            root (str, optional): Directory holding a dataset per output. Defaults to
+                OUTPUT_DIR.
+        """
+        if pa is None:
+            raise ImportError("pyarrow is required for columnar output")
+        self._root = root
+
+    def path(self, name: str) -> str:
+        return os.path.join(self._root, name)
+
+    def append(self, name: str, df: pd.DataFrame, partition_cols: Sequence[str] = (),
+               **values: int) -> int:
+        """Appends df to dataset name as a new run, partitioned by partition_cols. values
+        become columns of every row, e.g. gameweek=38 for a frame without a gameweek column.
+
+        Returns:
+            int: The run written
+        """
+        run = time.time_ns() // 1000
+        df = df.assign(**values, **{RUN_COLUMN: run})
+        table = pa.Table.from_pandas(df, schema=_schema(df), preserve_index=False)
+        pq.write_to_dataset(
+            table, self.path(name), partition_cols=list(partition_cols),
+            basename_template=f'{run}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore'
+            )
+        return run
+
+    def read(self, name: str, columns: Optional[List[str]] = None, latest: bool = True,
+             **partitions: int) -> pd.DataFrame:
+        """Reads columns (every column if not given) of dataset name, only from the
+        partitions matching partitions, e.g. gameweek=38. With latest, only rows of the most
+        recent run of each partition are kept.
+        """
+        dataset = ds.dataset(self.path(name), format='parquet', partitioning='hive')
+        expression = None
+        for column, value in partitions.items():
+            condition = ds.field(column) == value
+            expression = condition if expression is None else expression & condition
+        partition_cols = [
+            field.name for field in dataset.partitioning.schema
+            ] if dataset.partitioning is not None else []
+        read_columns = None
+        if columns is not None:
+            read_columns = list(dict.fromkeys(
+                [*columns, *(partition_cols + [RUN_COLUMN] if latest else [])]
+                ))
+        df = dataset.to_table(columns=read_columns, filter=expression).to_pandas()
+        if latest and len(df):
+            if partition_cols:
+                newest = df.groupby(partition_cols, observed=True)[RUN_COLUMN].transform('max')
+            else:
+                newest = df[RUN_COLUMN].max()
+            df = df[df[RUN_COLUMN] == newest].reset_index(drop=True)
+        if columns is not None:
+            df = df[columns]
+        return df
+
+    def runs(self, name: str) -> List[int]:
+        """Runs written to dataset name, oldest first"""
+        if not os.path.isdir(self.path(name)):
+            return []
+        dataset = ds.dataset(self.path(name), format='parquet', partitioning='hive')
+        return sorted(set(dataset.to_table(columns=[RUN_COLUMN])[RUN_COLUMN].to_pylist()))
+
+
+def _schema(df: pd.DataFrame) -> 'pa.Schema':
+    """Compact column types: 32 bit ints and floats, dictionary encoded strings. Fixed by kind
+    rather than by the values, so every run of a dataset has the same schema.
+    """
+    fields = []
+    for column, dtype in df.dtypes.items():
+        if column == RUN_COLUMN:
+            arrow_type = pa.int64()
+        elif pd.api.types.is_bool_dtype(dtype):
+            arrow_type = pa.bool_()
+        elif pd.api.types.is_integer_dtype(dtype):
+            arrow_type = pa.int32()
+        elif pd.api.types.is_float_dtype(dtype):
+            arrow_type = pa.float32()
+        else:
+            arrow_type = pa.dictionary(pa.int32(), pa.string())
+        fields.append(pa.field(str(column), arrow_type))
+    return pa.schema(fields)
+
+
+def write_output(df: pd.DataFrame, name: str, csv_path: str,
+                 partition_cols: Sequence[str] = (), root: str = OUTPUT_DIR,
+                 **values: int) -> str:
+    """Appends df to the columnar dataset name, or without pyarrow writes csv_path. Returns
+    the path written.
+    """
+    if not columnar_available():
+        df.to_csv(csv_path, index=False, encoding='utf-8-sig')
+        return csv_path
+    output = ColumnarOutput(root)
+    output.append(name, df, partition_cols, **values)
+    return output.path(name)
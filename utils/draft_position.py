@@ -0,0 +1,102 @@
+"""
+DraftPositionHistogram class. Exact counts of each (player, overall pick) by league size. Picks are
+small bounded integers, so the counts are an exact, mergeable sketch of each player's draft
+position: ADP, variance and percentiles all come from them, and memory is fixed by the number of
+players and picks rather than the number of drafts.
+"""
+from typing import Dict, Iterable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class DraftPositionHistogram:
+    def __init__(self, max_player_id: int = 1024, max_pick: int = 256) -> None:
+        """Init method
+
+        Args:
+            max_player_id (int, optional): Player ids allocated up front, grown when exceeded.
+                Defaults to 1024.
+            max_pick (int, optional): Picks allocated up front, grown when exceeded. Defaults
+                to 256.
+        """
+        self._shape = (max_player_id, max_pick)
+        # League size to (player id x pick - 1) counts
+        self._counts: Dict[int, np.ndarray] = {}
+        self._leagues: Dict[int, int] = {}
+
+    def _get_counts(self, league_size: int, player_id: int, pick: int) -> np.ndarray:
+        counts = self._counts.get(league_size)
+        if counts is None:
+            counts = self._counts[league_size] = np.zeros(self._shape, dtype=np.int64)
+        if player_id >= counts.shape[0] or pick > counts.shape[1]:
+            grown = np.zeros((max(counts.shape[0], 2 * player_id),
+                              max(counts.shape[1], 2 * pick)), dtype=np.int64)
+            grown[:counts.shape[0], :counts.shape[1]] = counts
+            counts = self._counts[league_size] = grown
+        return counts
+
+    def add_league(self, league_size: int, picks: Dict[int, int]) -> None:
+        """Adds one league's {player_id: overall pick} draft"""
+        self._leagues[league_size] = self._leagues.get(league_size, 0) + 1
+        for player_id, pick in picks.items():
+            self._get_counts(league_size, player_id, pick)[player_id, pick - 1] += 1
+
+    def add_counts(self, league_size: int, player_id: int, pick: int, count: int) -> None:
+        self._get_counts(league_size, player_id, pick)[player_id, pick - 1] += count
+
+    def add_leagues(self, league_size: int, n_leagues: int) -> None:
+        self._leagues[league_size] = self._leagues.get(league_size, 0) + n_leagues
+
+    def merge(self, other: 'DraftPositionHistogram') -> None:
+        for league_size, n_leagues in other._leagues.items():
+            self.add_leagues(league_size, n_leagues)
+        for league_size, other_counts in other._counts.items():
+            rows, cols = other_counts.shape
+            counts = self._get_counts(league_size, rows - 1, cols)
+            counts[:rows, :cols] += other_counts
+
+    def iter_counts(self) -> Iterator[Tuple[int, int, int, int]]:
+        """Non-zero (league_size, player_id, pick, count) cells"""
+        for league_size, counts in self._counts.items():
+            for player_id, pick_idx in zip(*np.nonzero(counts)):
+                yield (league_size, int(player_id), int(pick_idx) + 1,
+                       int(counts[player_id, pick_idx]))
+
+    def get_adp_df(self, percentiles: Iterable[float] = (10, 50, 90)) -> pd.DataFrame:
+        """One row per (league size, drafted player) with the share of drafts the player was
+        picked in, mean and standard deviation of the pick, and pick percentiles
+        """
+        percentiles = list(percentiles)
+        frames = []
+        for league_size in sorted(self._counts):
+            counts = self._counts[league_size]
+            drafted = counts.sum(axis=1)
+            player_ids = np.nonzero(drafted)[0]
+            counts, drafted = counts[player_ids], drafted[player_ids]
+
+            picks = np.arange(1, counts.shape[1] + 1, dtype=np.float64)
+            mean = counts @ picks / drafted
+            variance = (counts @ picks ** 2 - drafted * mean ** 2) / np.maximum(drafted - 1, 1)
+            cumulative = counts.cumsum(axis=1)
+            frame = pd.DataFrame({
+                'league_size': league_size,
+                'id': player_ids,
+                'drafts': drafted,
+                'drafted_pct': drafted / self._leagues.get(league_size, 0),
+                'adp': mean,
+                'std': np.where(drafted > 1, np.sqrt(np.maximum(variance, 0)), np.nan),
+                'min_pick': (counts > 0).argmax(axis=1) + 1,
+                'max_pick': counts.shape[1] - (counts[:, ::-1] > 0).argmax(axis=1),
+                })
+            for q in percentiles:
+                # Smallest pick with at least q% of the player's drafts at or before it
+                frame[f'p{q:g}'] = (cumulative >= q / 100 * drafted[:, None]).argmax(axis=1) + 1
+            frames.append(frame)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).sort_values(['league_size', 'adp'])
+
+    @property
+    def leagues(self) -> Dict[int, int]:
+        return self._leagues
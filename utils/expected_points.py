@@ -0,0 +1,54 @@
+"""
+Vectorised expected points (xPts) for h2h leagues. A team's xPts for a gameweek is the points it
+would average playing every other team that week: 3 for each team it outscored, 1 for each it
+tied with. ScrapeSingleLeague._get_expected_points is the scalar reference implementation.
+"""
+from typing import Optional
+
+import numpy as np
+
+
+def expected_points_matrix(scores: np.ndarray, present: Optional[np.ndarray] = None
+                           ) -> np.ndarray:
+    """Returns each team's xPts for each gameweek
+
+    Args:
+        scores (np.ndarray): (teams x gameweeks) gameweek scores
+        present (np.ndarray, optional): (teams x gameweeks) mask of the teams with a finished
+            match in each gameweek. A team is only ranked against the others present, and has
+            0 xPts in a gameweek it is missing from. Defaults to None, every team present.
+
+    Returns:
+        np.ndarray: (teams x gameweeks) float array of xPts
+    """
+    scores = np.asarray(scores)
+    n_teams, n_gameweeks = scores.shape
+    if present is None:
+        present = np.ones(scores.shape, dtype=bool)
+    present = np.asarray(present, dtype=bool)
+    if n_teams < 2 or n_gameweeks == 0 or not present.any():
+        return np.zeros(scores.shape)
+
+    # Shift every gameweek's scores into its own disjoint band so one sort and one pair of
+    # searchsorted calls rank all gameweeks at once. Missing cells take the lowest key of their
+    # band, so they are only ever counted as scoring less than a present team.
+    shifted = np.where(present, scores - scores[present].min() + 1, 0)
+    band = shifted.max() + 1
+    keys = (shifted + np.arange(n_gameweeks) * band).ravel()
+    sorted_keys = np.sort(keys)
+    column_start = np.tile(np.arange(n_gameweeks) * n_teams, n_teams)
+
+    lower = np.searchsorted(sorted_keys, keys, side='left') - column_start
+    upper = np.searchsorted(sorted_keys, keys, side='right') - column_start
+    lower = lower.reshape(n_teams, n_gameweeks) - (~present).sum(axis=0)
+    upper = upper.reshape(n_teams, n_gameweeks) - (~present).sum(axis=0)
+    # lower teams scored less; upper - lower scored the same, including the team itself
+    opponents = present.sum(axis=0) - 1
+    xpts = (3 * lower + (upper - lower - 1)) / np.maximum(opponents, 1)
+    return np.where(present & (opponents > 0), xpts, 0.0)
+
+
+def season_expected_points(scores: np.ndarray, present: Optional[np.ndarray] = None
+                           ) -> np.ndarray:
+    """Returns each team's xPts summed over every gameweek in scores"""
+    return expected_points_matrix(scores, present).sum(axis=1)
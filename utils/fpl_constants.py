@@ -1,3 +1,8 @@
+import os
+
+# Base url of the draft API. Set FPL_DRAFT_API_URL to point the scrapers at a local stand-in
+DRAFT_API_URL = os.environ.get('FPL_DRAFT_API_URL', 'https://draft.premierleague.com/api')
+
 # Teams in league & head to head results & fixtures
 LEAGUE_DETAILS = 'https://draft.premierleague.com/api/league/38838/details'
 # League trade status & who owns which player at current time
@@ -8,5 +13,7 @@ LEAGUE_TRANSACTIONS = 'https://draft.premierleague.com/api/draft/league/38838/tr
 LEAGUE_DRAFT_CHOICE = 'https://draft.premierleague.com/api/draft/1/choices'
 # Team per gameweek given a Team ID
 TEAM_OWNERSHIP_PER_GW = 'https://draft.premierleague.com/api/entry/38838/event/16'
-# TODO: Do this dynamically with decent accuracy
-TOTAL_LEAGUES = 252657
\ No newline at end of file
+# Rounds of a draft, one pick per team each, filling a squad
+DRAFT_ROUNDS = 15
+# Fallback highest league id. ScrapeLeagueID.find_upper_bound detects the live value
+TOTAL_LEAGUES = 252657
@@ -0,0 +1,250 @@
+"""
+Metrics class. In-process counters, gauges and latency histograms for the crawls: requests by
+endpoint and status, request latency, requests in flight, retries, bytes received, parse time
+and database write time. Reported as a periodic progress line and dumped as Prometheus text or
+JSON at the end of a run.
+
+Instrumented classes take an optional Metrics and skip all bookkeeping when it is None, so a
+run without metrics pays one attribute check per event.
+"""
+import asyncio
+import bisect
+import json
+import os
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from typing import AsyncContextManager, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Upper bounds in seconds, wide enough for a request waiting out a 429
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_ID_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+def endpoint_of(url: str) -> str:
+    """Path of url with ids replaced, e.g. /api/league/{id}/details"""
+    path = url.split('://', 1)[-1]
+    path = path[path.find('/'):] if '/' in path else '/'
+    return _ID_SEGMENT.sub('/{id}', path.split('?', 1)[0])
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, n_buckets: int) -> None:
+        # One count per bucket plus the overflow bucket
+        self.counts = [0] * (n_buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+
+
+class Metrics:
+    def __init__(self, dump_path: Optional[str] = None, report_interval: float = 10.0,
+                 buckets: Tuple[float, ...] = BUCKETS) -> None:
+        """Init method
+
+        Args:
+            dump_path (str, optional): File dump writes to, JSON if it ends in .json and
+                Prometheus text otherwise. Defaults to None.
+            report_interval (float, optional): Seconds between progress lines while
+                reporting. Defaults to 10.0.
+            buckets (Tuple[float, ...], optional): Histogram bucket upper bounds in seconds.
+                Defaults to BUCKETS.
+        """
+        self._dump_path = dump_path
+        self._report_interval = report_interval
+        self._buckets = buckets
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        # Updates come from writer threads as well as the event loop
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_report: Tuple[float, float] = (self._started, 0.0)
+
+    @classmethod
+    def from_env(cls) -> Optional['Metrics']:
+        """Metrics dumped to $FPL_METRICS, reporting every $FPL_METRICS_INTERVAL seconds, or
+        None if FPL_METRICS is not set
+        """
+        dump_path = os.environ.get('FPL_METRICS')
+        if not dump_path:
+            return None
+        return cls(dump_path, float(os.environ.get('FPL_METRICS_INTERVAL', 10.0)))
+
+    def inc(self, name: str, labels: Labels = (), value: float = 1.0) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def add_gauge(self, name: str, delta: float, labels: Labels = ()) -> None:
+        key = (name, labels)
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + delta
+
+    def observe(self, name: str, value: float, labels: Labels = ()) -> None:
+        key = (name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(len(self._buckets))
+            histogram.counts[bisect.bisect_left(self._buckets, value)] += 1
+            histogram.sum += value
+            histogram.count += 1
+
+    @contextmanager
+    def timer(self, name: str, labels: Labels = ()) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def total(self, name: str) -> float:
+        """Counter or gauge summed over its labels"""
+        with self._lock:
+            return sum(value for (key, _), value in
+                       (*self._counters.items(), *self._gauges.items()) if key == name)
+
+    def by_label(self, name: str, label: str) -> Dict[str, float]:
+        """Counter summed by the value of one of its labels"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for (key, labels), value in self._counters.items():
+                if key == name:
+                    label_value = dict(labels).get(label, '')
+                    totals[label_value] = totals.get(label_value, 0.0) + value
+        return totals
+
+    def quantile(self, name: str, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q quantile of a histogram over all its
+        labels, or None if nothing was observed
+        """
+        with self._lock:
+            merged = [0] * (len(self._buckets) + 1)
+            for (key, _), histogram in self._histograms.items():
+                if key == name:
+                    merged = [a + b for a, b in zip(merged, histogram.counts)]
+        count = sum(merged)
+        if count == 0:
+            return None
+        cumulative = 0
+        for idx, bucket_count in enumerate(merged):
+            cumulative += bucket_count
+            if cumulative >= q * count:
+                return self._buckets[idx] if idx < len(self._buckets) else float('inf')
+        return float('inf')
+
+    def seconds(self, name: str) -> float:
+        """Total seconds observed by a histogram over all its labels"""
+        with self._lock:
+            return sum(histogram.sum for (key, _), histogram in self._histograms.items()
+                       if key == name)
+
+    def progress_line(self) -> str:
+        now = time.monotonic()
+        requests = self.total('fpl_requests_total')
+        last_time, last_requests = self._last_report
+        self._last_report = (now, requests)
+        rate = (requests - last_requests) / max(now - last_time, 1e-9)
+        statuses = ', '.join(f'{status}: {n:.0f}' for status, n in
+                             sorted(self.by_label('fpl_requests_total', 'status').items()))
+        p95 = self.quantile('fpl_request_seconds', 0.95)
+        return (
+            f"[{now - self._started:.0f}s] {requests:.0f} requests ({statuses}) {rate:.1f}/s, "
+            f"in flight {self.total('fpl_requests_in_flight'):.0f}, "
+            f"p95 {'-' if p95 is None else f'{p95}s'}, "
+            f"{self.total('fpl_retries_total'):.0f} retries, "
+            f"{self.total('fpl_cache_hits_total'):.0f} cache hits, "
+            f"{self.total('fpl_memo_hits_total'):.0f} memo hits, "
+            f"{self.total('fpl_response_bytes_total') / 1e6:.1f} MB, "
+            f"parse {self.seconds('fpl_parse_seconds'):.1f}s, "
+            f"flush {self.seconds('fpl_writer_flush_seconds'):.1f}s "
+            f"({self.total('fpl_writer_rows_total'):.0f} rows), "
+            f"db {self.seconds('fpl_db_write_seconds'):.1f}s"
+            )
+
+    @asynccontextmanager
+    async def reporting(self) -> AsyncIterator[None]:
+        """Prints a progress line every report_interval seconds while the block runs, and a
+        final one when it ends
+        """
+        async def report() -> None:
+            while True:
+                await asyncio.sleep(self._report_interval)
+                print(self.progress_line())
+
+        task = asyncio.ensure_future(report())
+        try:
+            yield
+        finally:
+            task.cancel()
+            print(self.progress_line())
+
+    def to_prometheus(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            for kind, series in (('counter', self._counters), ('gauge', self._gauges)):
+                for name in sorted({name for name, _ in series}):
+                    lines.append(f'# TYPE {name} {kind}')
+                    lines += [f'{name}{_format_labels(labels)} {value:g}'
+                              for (key, labels), value in sorted(series.items()) if key == name]
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f'# TYPE {name} histogram')
+                for (key, labels), histogram in sorted(self._histograms.items(),
+                                                       key=lambda item: item[0]):
+                    if key != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip((*self._buckets, '+Inf'), histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket'
+                                     f'{_format_labels((*labels, ("le", str(bound))))} '
+                                     f'{cumulative}')
+                    lines.append(f'{name}_sum{_format_labels(labels)} {histogram.sum:g}')
+                    lines.append(f'{name}_count{_format_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self._counters.items())],
+                'gauges': [{'name': name, 'labels': dict(labels), 'value': value}
+                           for (name, labels), value in sorted(self._gauges.items())],
+                'histograms': [
+                    {'name': name, 'labels': dict(labels), 'buckets': list(self._buckets),
+                     'counts': histogram.counts, 'sum': histogram.sum, 'count': histogram.count}
+                    for (name, labels), histogram in sorted(self._histograms.items(),
+                                                           key=lambda item: item[0])
+                    ],
+                }
+
+    def dump(self, path: Optional[str] = None) -> Optional[str]:
+        """Writes every metric to path, or the dump_path given at init. Returns the path
+        written, None if there is none.
+        """
+        path = path or self._dump_path
+        if path is None:
+            return None
+        with open(path, 'w') as f:
+            if path.endswith('.json'):
+                json.dump(self.to_dict(), f, indent=2)
+            else:
+                f.write(self.to_prometheus())
+        return path
+
+
+def reporting(metrics: Optional[Metrics]) -> AsyncContextManager:
+    """metrics.reporting(), or a no-op without metrics"""
+    return nullcontext() if metrics is None else metrics.reporting()
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in labels) + '}'
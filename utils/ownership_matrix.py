@@ -0,0 +1,205 @@
+"""
+OwnershipMatrix class. (leagues x players) tallies indexed by compact league and player indices,
+replacing {player_id: [league_id, ...]} dicts for ownership and waiver tallies.
+
+Ownership flags are kept as np.packbits rows, one bit per player. Waiver counts, a handful of
+non-zero cells per league, are kept sparse as (row, column) pairs, one pair per count.
+"""
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Packed rows unpacked at once when summing over leagues
+UNPACK_ROWS = 4096
+
+
+class OwnershipMatrix:
+    def __init__(self, player_ids: Iterable[int], sparse: bool = False,
+                 initial_leagues: int = 1024) -> None:
+        """Init method
+
+        Args:
+            player_ids (Iterable[int]): Every player id that can be recorded
+            sparse (bool, optional): Keep counts as (row, column) pairs, for mostly empty
+                tallies such as waivers. Otherwise each cell is a flag, one bit per player, and
+                recording a (league, player) cell again leaves it at 1. Defaults to False.
+            initial_leagues (int, optional): Packed rows allocated up front, doubled when
+                full. Defaults to 1024.
+        """
+        self._player_ids = np.fromiter(player_ids, dtype=np.int64)
+        self._player_index: Dict[int, int] = {
+            int(player_id): idx for idx, player_id in enumerate(self._player_ids)
+            }
+        self._league_ids: List[int] = []
+        self._league_sizes: List[int] = []
+        self._league_index: Dict[int, int] = {}
+        self._sparse = sparse
+        if sparse:
+            self._rows = array('i')
+            self._columns = array('i')
+        else:
+            self._bits = np.zeros((initial_leagues, (len(self._player_ids) + 7) // 8),
+                                  dtype=np.uint8)
+
+    def add_league(self, league_id: int, league_size: Optional[int] = None) -> int:
+        """Registers a league, returning its row. A registered league with no players still
+        counts towards the leagues of its size.
+        """
+        row = self._league_index.get(league_id)
+        if row is None:
+            row = len(self._league_ids)
+            if not self._sparse and row == len(self._bits):
+                grown = np.zeros((2 * len(self._bits), self._bits.shape[1]), dtype=np.uint8)
+                grown[:row] = self._bits
+                self._bits = grown
+            self._league_index[league_id] = row
+            self._league_ids.append(league_id)
+            self._league_sizes.append(-1 if league_size is None else league_size)
+        return row
+
+    def add(self, league_id: int, player_ids: Iterable[int],
+            league_size: Optional[int] = None) -> None:
+        """Adds one to each (league, player) cell. Raises KeyError for an unknown player."""
+        row = self.add_league(league_id, league_size)
+        for player_id in player_ids:
+            idx = self._player_index[player_id]
+            if self._sparse:
+                self._rows.append(row)
+                self._columns.append(idx)
+            else:
+                # np.packbits order, the first player in the high bit
+                self._bits[row, idx >> 3] |= 0x80 >> (idx & 7)
+
+    def league_mask(self, league_size: Optional[int] = None) -> np.ndarray:
+        sizes = np.asarray(self._league_sizes, dtype=np.int64)
+        if league_size is None:
+            return np.ones(len(sizes), dtype=bool)
+        return sizes == league_size
+
+    def _cells(self, league_size: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(row, column) pairs of a sparse matrix, optionally only leagues of one size"""
+        rows = np.frombuffer(self._rows, dtype=np.int32)
+        columns = np.frombuffer(self._columns, dtype=np.int32)
+        if league_size is not None:
+            keep = self.league_mask(league_size)[rows]
+            rows, columns = rows[keep], columns[keep]
+        return rows, columns
+
+    def counts(self, league_size: Optional[int] = None) -> np.ndarray:
+        """Per player sum over leagues, optionally only leagues of one size"""
+        n_players = len(self._player_ids)
+        if self._sparse:
+            _, columns = self._cells(league_size)
+            return np.bincount(columns, minlength=n_players).astype(np.int64)
+
+        mask = self.league_mask(league_size)
+        totals = np.zeros(n_players, dtype=np.int64)
+        for start in range(0, len(mask), UNPACK_ROWS):
+            stop = min(start + UNPACK_ROWS, len(mask))
+            bits = self._bits[start:stop][mask[start:stop]]
+            totals += np.unpackbits(bits, axis=1, count=n_players).sum(axis=0, dtype=np.int64)
+        return totals
+
+    def n_leagues(self, league_size: Optional[int] = None) -> int:
+        return int(self.league_mask(league_size).sum())
+
+    def get_series(self, name: str, denominator: Optional[float] = None,
+                   league_size: Optional[int] = None) -> pd.Series:
+        """Per player counts divided by denominator (the number of registered leagues of the
+        size if not given), indexed by player id
+        """
+        if denominator is None:
+            denominator = self.n_leagues(league_size)
+        series = pd.Series(self.counts(league_size) / denominator, index=self._player_ids)
+        series.name = name
+        return series
+
+    def iter_aggregates(self) -> Iterator[Tuple[int, int, int]]:
+        """Non-zero (league size, player id, count) totals, a league of unknown size under -1"""
+        for league_size in np.unique(self.league_sizes):
+            counts = self.counts(int(league_size))
+            for idx in np.nonzero(counts)[0]:
+                yield int(league_size), int(self._player_ids[idx]), int(counts[idx])
+
+    def league_counts(self) -> Dict[int, int]:
+        """{league size: registered leagues}"""
+        sizes, counts = np.unique(self.league_sizes, return_counts=True)
+        return {int(size): int(count) for size, count in zip(sizes, counts)}
+
+    def player_columns(self, player_ids: Iterable[int]) -> np.ndarray:
+        """Column of each of player_ids. Raises KeyError for an unknown player."""
+        return np.fromiter((self._player_index[player_id] for player_id in player_ids),
+                           dtype=np.int64)
+
+    def column(self, player_id: int) -> np.ndarray:
+        """Per league cell of player_id, in league registration order"""
+        idx = self._player_index[player_id]
+        n_leagues = len(self._league_ids)
+        if self._sparse:
+            rows, columns = self._cells()
+            return np.bincount(rows[columns == idx], minlength=n_leagues)
+        return (self._bits[:n_leagues, idx >> 3] >> (7 - (idx & 7))) & 1
+
+    def co_ownership(self, player_a: int, player_b: int,
+                     league_size: Optional[int] = None) -> float:
+        """Fraction of leagues in which both players are recorded"""
+        both = (self.column(player_a) > 0) & (self.column(player_b) > 0)
+        if league_size is not None:
+            both = both[self.league_mask(league_size)]
+        if len(both) == 0:
+            return float('nan')
+        return float(both.mean())
+
+    def co_ownership_matrix(self, player_ids: List[int],
+                            league_size: Optional[int] = None) -> pd.DataFrame:
+        """Pairwise co-ownership fractions for player_ids"""
+        owned = np.column_stack(
+            [self.column(player_id) > 0 for player_id in player_ids]
+            ).astype(np.float64)
+        if league_size is not None:
+            owned = owned[self.league_mask(league_size)]
+        both = owned.T @ owned / max(len(owned), 1)
+        return pd.DataFrame(both, index=player_ids, columns=player_ids)
+
+    def to_dict(self) -> Dict[int, List[int]]:
+        """{player_id: [league_id, ...]}, with a league repeated once per count"""
+        league_ids = np.asarray(self._league_ids, dtype=np.int64)
+        return {
+            int(player_id): np.repeat(league_ids, self.column(int(player_id))).tolist()
+            for player_id in self._player_ids
+            }
+
+    def packed_rows(self) -> np.ndarray:
+        """(leagues x players) flags of the non-zero cells packed as by np.packbits(axis=1)"""
+        if not self._sparse:
+            return self._bits[:len(self._league_ids)]
+        return np.packbits(self.matrix > 0, axis=1)
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Dense (leagues x players) cells, built on every access"""
+        n_leagues, n_players = len(self._league_ids), len(self._player_ids)
+        if not self._sparse:
+            return np.unpackbits(self._bits[:n_leagues], axis=1, count=n_players)
+        matrix = np.zeros((n_leagues, n_players), dtype=np.int64)
+        rows, columns = self._cells()
+        np.add.at(matrix, (rows, columns), 1)
+        return matrix
+
+    @property
+    def sparse(self) -> bool:
+        return self._sparse
+
+    @property
+    def player_ids(self) -> np.ndarray:
+        return self._player_ids
+
+    @property
+    def league_ids(self) -> np.ndarray:
+        return np.asarray(self._league_ids, dtype=np.int64)
+
+    @property
+    def league_sizes(self) -> np.ndarray:
+        return np.asarray(self._league_sizes, dtype=np.int64)
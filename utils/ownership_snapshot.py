@@ -0,0 +1,146 @@
+"""
+Per-gameweek ownership snapshot archive. Each crawl's (leagues x players) ownership is saved as
+bit-packed .npy files that are memory-mapped on load, so later jobs can query or diff any
+gameweek without re-crawling or reading the whole file.
+
+Layout: {root}/gw{NN}/owners.npy (leagues x ceil(players / 8) packed bits, rows sorted by league
+id), league_ids.npy, league_sizes.npy and player_ids.npy.
+"""
+import os
+import re
+import shutil
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.ownership_matrix import OwnershipMatrix
+
+
+class OwnershipSnapshot:
+    def __init__(self, path: str) -> None:
+        """Memory-maps a saved snapshot. Nothing is read until it is queried."""
+        self._owners = np.load(os.path.join(path, 'owners.npy'), mmap_mode='r')
+        self._league_ids = np.load(os.path.join(path, 'league_ids.npy'), mmap_mode='r')
+        self._league_sizes = np.load(os.path.join(path, 'league_sizes.npy'), mmap_mode='r')
+        self._player_ids = np.load(os.path.join(path, 'player_ids.npy'))
+        self._player_index = {
+            int(player_id): idx for idx, player_id in enumerate(self._player_ids)
+            }
+
+    def _league_rows(self, league_size: Optional[int] = None) -> np.ndarray:
+        if league_size is None:
+            return self._owners
+        return self._owners[np.asarray(self._league_sizes) == league_size]
+
+    def owned_column(self, player_id: int) -> np.ndarray:
+        """Boolean per league, reading one byte column of the packed matrix"""
+        idx = self._player_index[player_id]
+        return ((self._owners[:, idx >> 3] >> (7 - (idx & 7))) & 1).astype(bool)
+
+    def owners_of(self, player_id: int) -> np.ndarray:
+        """League ids in which player_id is owned"""
+        return np.asarray(self._league_ids)[self.owned_column(player_id)]
+
+    def league_players(self, league_id: int) -> np.ndarray:
+        """Player ids owned in league_id"""
+        row = int(np.searchsorted(self._league_ids, league_id))
+        if row == len(self._league_ids) or self._league_ids[row] != league_id:
+            raise KeyError(league_id)
+        owned = np.unpackbits(self._owners[row], count=len(self._player_ids)).astype(bool)
+        return self._player_ids[owned]
+
+    def counts(self, league_size: Optional[int] = None, chunk_size: int = 65536) -> np.ndarray:
+        """Leagues owning each player, unpacked a chunk of leagues at a time"""
+        rows = self._league_rows(league_size)
+        totals = np.zeros(len(self._player_ids), dtype=np.int64)
+        for start in range(0, len(rows), chunk_size):
+            totals += np.unpackbits(
+                rows[start:start + chunk_size], axis=1, count=len(self._player_ids)
+                ).sum(axis=0, dtype=np.int64)
+        return totals
+
+    def get_ownership(self, league_size: Optional[int] = None) -> pd.Series:
+        n_leagues = len(self._league_rows(league_size))
+        series = pd.Series(self.counts(league_size) / max(n_leagues, 1), index=self._player_ids)
+        series.name = 'ownership'
+        return series
+
+    @property
+    def league_ids(self) -> np.ndarray:
+        return self._league_ids
+
+    @property
+    def league_sizes(self) -> np.ndarray:
+        return self._league_sizes
+
+    @property
+    def player_ids(self) -> np.ndarray:
+        return self._player_ids
+
+
+class OwnershipSnapshotArchive:
+    def __init__(self, root: str = 'database/ownership_snapshots') -> None:
+        self._root = root
+
+    def _path(self, gameweek: int) -> str:
+        return os.path.join(self._root, f'gw{gameweek:02d}')
+
+    def save(self, gameweek: int, matrix: OwnershipMatrix) -> str:
+        """Writes matrix as the snapshot for gameweek, replacing any existing one"""
+        order = np.argsort(matrix.league_ids, kind='stable')
+        owners = matrix.packed_rows()[order]
+
+        path = self._path(gameweek)
+        tmp_path = f'{path}.tmp'
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.save(os.path.join(tmp_path, 'owners.npy'), owners)
+        np.save(os.path.join(tmp_path, 'league_ids.npy'), matrix.league_ids[order])
+        np.save(os.path.join(tmp_path, 'league_sizes.npy'), matrix.league_sizes[order])
+        np.save(os.path.join(tmp_path, 'player_ids.npy'), matrix.player_ids)
+        # Swap the finished directory in so readers never see a partial snapshot
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        return path
+
+    def load(self, gameweek: int) -> OwnershipSnapshot:
+        return OwnershipSnapshot(self._path(gameweek))
+
+    def gameweeks(self) -> List[int]:
+        if not os.path.isdir(self._root):
+            return []
+        return sorted(
+            int(match.group(1)) for match in
+            (re.fullmatch(r'gw(\d+)', name) for name in os.listdir(self._root)) if match
+            )
+
+    def diff(self, gameweek_a: int, gameweek_b: int,
+             league_size: Optional[int] = None) -> pd.DataFrame:
+        """Per player ownership change from gameweek_a to gameweek_b over the leagues (and
+        players) present in both snapshots, with the number of leagues that picked the player
+        up or dropped them
+        """
+        snapshot_a, snapshot_b = self.load(gameweek_a), self.load(gameweek_b)
+        _, rows_a, rows_b = np.intersect1d(
+            snapshot_a.league_ids, snapshot_b.league_ids, assume_unique=True,
+            return_indices=True
+            )
+        if league_size is not None:
+            keep = np.asarray(snapshot_a.league_sizes)[rows_a] == league_size
+            rows_a, rows_b = rows_a[keep], rows_b[keep]
+        player_ids = np.intersect1d(snapshot_a.player_ids, snapshot_b.player_ids)
+
+        rows = []
+        for player_id in player_ids:
+            owned_a = snapshot_a.owned_column(player_id)[rows_a]
+            owned_b = snapshot_b.owned_column(player_id)[rows_b]
+            rows.append((player_id, owned_a.mean() if len(owned_a) else np.nan,
+                         owned_b.mean() if len(owned_b) else np.nan,
+                         int((~owned_a & owned_b).sum()), int((owned_a & ~owned_b).sum())))
+        out = pd.DataFrame(
+            rows, columns=['id', f'ownership_gw{gameweek_a}', f'ownership_gw{gameweek_b}',
+                           'leagues_gained', 'leagues_dropped']
+            )
+        out['change'] = out[f'ownership_gw{gameweek_b}'] - out[f'ownership_gw{gameweek_a}']
+        return out
@@ -0,0 +1,147 @@
+"""
+ProbeBitmap class. Compact persisted record of every league id probed by the league id scraper,
+two bits per id, so sampling only spends requests on ids that can still yield new information.
+Ids handed out for probing are held in flight until marked, so concurrent workers drawing from
+the same bitmap never probe an id twice.
+"""
+import os
+import random
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+
+UNPROBED = 0
+HIT = 1
+MISS = 2
+ERROR = 3
+
+# Ids in these states are worth (re)requesting
+_ELIGIBLE = (UNPROBED, ERROR)
+# For every byte value, the offsets (0-3) of the ids it holds that are eligible
+_ELIGIBLE_OFFSETS = [
+    tuple(offset for offset in range(4) if (value >> (offset * 2)) & 3 in _ELIGIBLE)
+    for value in range(256)
+    ]
+
+
+class ProbeBitmap:
+    def __init__(self, file_name: str = 'database/league_probes.bin') -> None:
+        """Init method. Loads the bitmap from file_name if it exists.
+
+        Args:
+            file_name (str, optional): File the bitmap is persisted to.
+                Defaults to 'database/league_probes.bin'.
+        """
+        self._file_name = file_name
+        self._bits = bytearray()
+        # Ids drawn for probing and not yet marked. Not persisted: an id drawn by a run that
+        # stopped before probing it is still unprobed on disk.
+        self._in_flight: Set[int] = set()
+        if os.path.exists(file_name):
+            with open(file_name, 'rb') as f:
+                self._bits = bytearray(f.read())
+
+    def save(self) -> None:
+        # Write then rename so a crash mid-save never leaves a truncated bitmap
+        tmp_name = f'{self._file_name}.tmp'
+        with open(tmp_name, 'wb') as f:
+            f.write(self._bits)
+        os.replace(tmp_name, self._file_name)
+
+    def state(self, league_id: int) -> int:
+        byte_idx = league_id >> 2
+        if byte_idx >= len(self._bits):
+            return UNPROBED
+        return (self._bits[byte_idx] >> ((league_id & 3) * 2)) & 3
+
+    def mark(self, league_id: int, state: int) -> None:
+        self._in_flight.discard(league_id)
+        byte_idx = league_id >> 2
+        if byte_idx >= len(self._bits):
+            # Grow geometrically so a sweep does not reallocate on every new byte
+            self._bits.extend(bytes(max(byte_idx + 1 - len(self._bits), len(self._bits))))
+        shift = (league_id & 3) * 2
+        self._bits[byte_idx] = (self._bits[byte_idx] & ~(3 << shift)) | (state << shift)
+
+    def mark_many(self, league_ids: Iterable[int], state: int) -> None:
+        for league_id in league_ids:
+            self.mark(league_id, state)
+
+    def release(self, league_ids: Iterable[int]) -> None:
+        """Returns ids drawn but never probed, so they can be drawn again"""
+        self._in_flight.difference_update(league_ids)
+
+    def _claim(self, league_id: int) -> bool:
+        """Takes league_id for probing, returning False if it is already in flight"""
+        if league_id in self._in_flight:
+            return False
+        self._in_flight.add(league_id)
+        return True
+
+    def iter_eligible(self, start: int, end: int, step: int = 1) -> Iterator[int]:
+        """Yields, in order, the ids in range(start, end, step) that are unprobed or errored and
+        not in flight, taking each for probing as it is yielded
+        """
+        for league_id in self._iter_eligible(start, end, step):
+            if self._claim(league_id):
+                yield league_id
+
+    def _iter_eligible(self, start: int, end: int, step: int) -> Iterator[int]:
+        if step != 1:
+            yield from (league_id for league_id in range(start, end, step)
+                        if self.state(league_id) in _ELIGIBLE)
+            return
+        bitmap_end = min(end, len(self._bits) * 4)
+        league_id = start
+        # Single ids up to a byte boundary, then whole bytes through the lookup table
+        while league_id < bitmap_end and league_id & 3:
+            if self.state(league_id) in _ELIGIBLE:
+                yield league_id
+            league_id += 1
+        for byte_idx in range(league_id >> 2, (bitmap_end + 3) >> 2):
+            base = byte_idx << 2
+            for offset in _ELIGIBLE_OFFSETS[self._bits[byte_idx]]:
+                if base + offset >= bitmap_end:
+                    break
+                if base + offset >= league_id:
+                    yield base + offset
+        # Ids past the end of the bitmap have never been probed
+        yield from range(max(start, bitmap_end), end)
+
+    def sample_eligible(self, n: int, start: int, end: int, step: int = 1) -> List[int]:
+        """Random sample of up to n distinct unprobed or errored ids in range(start, end, step)
+        not in flight, all taken for probing
+        """
+        sample = set()
+        # Rejection sampling is cheap while most of the range is still eligible
+        for _ in range(n * 20):
+            if len(sample) == n:
+                break
+            league_id = random.randrange(start, end, step)
+            if league_id not in self._in_flight and self.state(league_id) in _ELIGIBLE:
+                sample.add(league_id)
+        else:
+            eligible = [league_id for league_id in self._iter_eligible(start, end, step)
+                        if league_id not in self._in_flight and league_id not in sample]
+            sample.update(random.sample(eligible, min(n - len(sample), len(eligible))))
+        self._in_flight.update(sample)
+        return list(sample)
+
+    def merge(self, other: 'ProbeBitmap', start: int = 0, step: int = 1) -> None:
+        """Takes the state other records for each id in range(start, ..., step) it has probed,
+        e.g. from a shard of the crawl that owned those ids. A hit is never overwritten.
+        """
+        for league_id in range(start, len(other._bits) * 4, step):
+            state = other.state(league_id)
+            if state != UNPROBED and self.state(league_id) != HIT:
+                self.mark(league_id, state)
+
+    def counts(self, end: Optional[int] = None) -> Dict[str, int]:
+        end = len(self._bits) * 4 if end is None else end
+        totals = [0, 0, 0, 0]
+        for league_id in range(min(end, len(self._bits) * 4)):
+            totals[self.state(league_id)] += 1
+        totals[UNPROBED] += max(0, end - len(self._bits) * 4)
+        return dict(zip(('unprobed', 'hit', 'miss', 'error'), totals))
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._in_flight)
@@ -0,0 +1,191 @@
+"""
+Mergeable streaming aggregates. Each class holds a fixed amount of state however many values
+it sees, and two instances built on different data can be merged into one. mean_intervals gives
+confidence intervals for means estimated from a sample.
+"""
+import math
+from statistics import NormalDist
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class RunningStats:
+    def __init__(self) -> None:
+        """Count, mean, variance, min and max via Welford's algorithm"""
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = math.inf
+        self._max = -math.inf
+
+    def add(self, value: float) -> None:
+        self._count += 1
+        delta = value - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (value - self._mean)
+        self._min = min(self._min, value)
+        self._max = max(self._max, value)
+
+    def add_many(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        if len(values) == 0:
+            return
+        other = RunningStats()
+        other._count = len(values)
+        other._mean = float(values.mean())
+        other._m2 = float(((values - other._mean) ** 2).sum())
+        other._min = float(values.min())
+        other._max = float(values.max())
+        self.merge(other)
+
+    def merge(self, other: 'RunningStats') -> None:
+        """Folds other into self (Chan et al. parallel update)"""
+        if other._count == 0:
+            return
+        count = self._count + other._count
+        delta = other._mean - self._mean
+        self._mean += delta * other._count / count
+        self._m2 += other._m2 + delta ** 2 * self._count * other._count / count
+        self._count = count
+        self._min = min(self._min, other._min)
+        self._max = max(self._max, other._max)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    @property
+    def mean(self) -> float:
+        return self._mean if self._count else math.nan
+
+    @property
+    def variance(self) -> float:
+        return self._m2 / (self._count - 1) if self._count > 1 else math.nan
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self) -> float:
+        return self._min if self._count else math.nan
+
+    @property
+    def max(self) -> float:
+        return self._max if self._count else math.nan
+
+
+class FixedHistogram:
+    def __init__(self, low: float, high: float, bins: int) -> None:
+        """Counts of values in equal width bins over [low, high). Values outside the range are
+        clamped into the end bins, so percentiles are exact to within one bin width for data
+        inside the range. Merging two histograms is adding their counts.
+
+        Args:
+            low (float): Lower edge of the first bin
+            high (float): Upper edge of the last bin
+            bins (int): Number of bins
+        """
+        self._low = low
+        self._high = high
+        self._counts = np.zeros(bins, dtype=np.int64)
+        self._width = (high - low) / bins
+
+    def add_many(self, values: Iterable[float]) -> None:
+        values = np.asarray(values, dtype=float).ravel()
+        idx = np.clip(((values - self._low) / self._width).astype(np.int64),
+                      0, len(self._counts) - 1)
+        np.add.at(self._counts, idx, 1)
+
+    def add(self, value: float) -> None:
+        self.add_many([value])
+
+    def merge(self, other: 'FixedHistogram') -> None:
+        if (other._low, other._high, len(other._counts)) != \
+                (self._low, self._high, len(self._counts)):
+            raise ValueError("Cannot merge histograms with different bins")
+        self._counts += other._counts
+
+    def percentiles(self, qs: Iterable[float]) -> List[Optional[float]]:
+        """Values at each percentile in qs (0-100), interpolated within the bin"""
+        total = self._counts.sum()
+        if total == 0:
+            return [None for _ in qs]
+        cumulative = np.cumsum(self._counts)
+        out = []
+        for q in qs:
+            rank = q / 100 * total
+            idx = min(int(np.searchsorted(cumulative, rank, side='left')), len(self._counts) - 1)
+            below = cumulative[idx] - self._counts[idx]
+            fraction = (rank - below) / self._counts[idx] if self._counts[idx] else 0.0
+            out.append(float(self._low + (idx + fraction) * self._width))
+        return out
+
+    @property
+    def counts(self) -> np.ndarray:
+        return self._counts
+
+    @property
+    def count(self) -> int:
+        return int(self._counts.sum())
+
+
+class ColumnSums:
+    def __init__(self, n_columns: int) -> None:
+        """Per column sums and sums of squares of sparse integer rows, e.g. a league's player
+        counts, for the confidence intervals of the column means
+
+        Args:
+            n_columns (int): Number of columns
+        """
+        self._count = 0
+        self._sums = np.zeros(n_columns, dtype=np.int64)
+        self._squares = np.zeros(n_columns, dtype=np.int64)
+
+    def add(self, columns: Iterable[int]) -> None:
+        """Adds a row given by the column of each unit in it, a column repeated once per unit.
+        An empty row still counts towards the rows.
+        """
+        columns, counts = np.unique(np.asarray(columns, dtype=np.int64), return_counts=True)
+        self._count += 1
+        self._sums[columns] += counts
+        self._squares[columns] += counts ** 2
+
+    def merge(self, other: 'ColumnSums') -> None:
+        self._count += other._count
+        self._sums += other._sums
+        self._squares += other._squares
+
+    def intervals(self, confidence: float = 0.95, sampled_fraction: float = 0.0
+                  ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Per column (mean, low, high), as from mean_intervals"""
+        return mean_intervals(self._sums, self._squares, self._count, confidence,
+                              sampled_fraction)
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+
+def mean_intervals(sums: np.ndarray, squares: np.ndarray, n: int, confidence: float = 0.95,
+                   sampled_fraction: float = 0.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per column (mean, low, high) of n sampled values given their sums and sums of squares.
+    The bounds are the Wilson score interval with the sample variance in place of p(1 - p), so
+    it covers counts as well as 0/1 flags, and unlike the normal interval it does not collapse
+    to zero width for a mean of 0 in a small sample. sampled_fraction is the share of the
+    population sampled without replacement, narrowing the interval to nothing as it nears 1.
+    """
+    sums = np.asarray(sums, dtype=float)
+    if n == 0:
+        return np.full(sums.shape, np.nan), np.zeros(sums.shape), np.full(sums.shape, np.inf)
+    mean = sums / n
+    variance = np.maximum(np.asarray(squares, dtype=float) / n - mean ** 2, 0.0)
+    # Finite population correction
+    z = NormalDist().inv_cdf((1 + confidence) / 2) * math.sqrt(max(1 - sampled_fraction, 0.0))
+    z2n = z ** 2 / n
+    centre = (mean + z2n / 2) / (1 + z2n)
+    half = z / (1 + z2n) * np.sqrt(variance / n + z2n / (4 * n))
+    low = np.maximum(np.minimum(centre - half, mean), 0.0)
+    high = np.maximum(centre + half, mean)
+    return mean, low, high
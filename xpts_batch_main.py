@@ -0,0 +1,138 @@
+"""
+Main script for the batch xPts luck report
+
+Fetches the details of every stored league concurrently and aggregates each h2h manager's luck,
+league points minus xPts, by league size and by gameweek. Only running aggregates are kept, so
+memory stays flat however many leagues are processed.
+"""
+import asyncio
+from functools import partial
+from typing import Dict, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from app import manage_database, metrics, response_cache
+from scrape_league.draft_session import DraftSession
+from scrape_league.response_cache import ResponseCache
+from scrape_league.scrape_league_players import ScrapeSingleLeague
+from utils.columnar_output import write_output
+from utils.expected_points import expected_points_matrix
+from utils.metrics import Metrics, reporting
+from utils.streaming_stats import FixedHistogram, RunningStats
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class LeagueLuckReport:
+    def __init__(self, max_concurrency: int = 50, cache: Optional[ResponseCache] = None,
+                 parse_workers: int = 0, metrics: Optional[Metrics] = None) -> None:
+        """Init method
+
+        Args:
+            max_concurrency (int, optional): Leagues fetched at once. Defaults to 50.
+            cache (ResponseCache, optional): Response cache for the details requests.
+                Defaults to None.
+            parse_workers (int, optional): Processes the details responses are decoded on,
+                0 for the event loop. Defaults to 0.
+            metrics (Metrics, optional): Request metrics, reported periodically while
+                fetching. Defaults to None.
+        """
+        self._metrics = metrics
+        self._get_session = partial(DraftSession, max_concurrency, cache=cache,
+                                    parse_workers=parse_workers, metrics=metrics)
+        # Season luck per manager, keyed by league size
+        self._season_stats: Dict[int, RunningStats] = {}
+        self._season_hist: Dict[int, FixedHistogram] = {}
+        # Single gameweek luck per manager, keyed by gameweek. A week's luck is in [-3, 3].
+        self._gw_stats: Dict[int, RunningStats] = {}
+        self._gw_hist: Dict[int, FixedHistogram] = {}
+        self._leagues_processed = 0
+        self._leagues_skipped = 0
+
+    async def populate(self, league_ids: Iterable[int]) -> None:
+        async with reporting(self._metrics), self._get_session() as session:
+            async for _, results in ScrapeSingleLeague.iter_league_results(league_ids, session):
+                if not results or not results[1]:
+                    # Failed request or not a h2h league
+                    self._leagues_skipped += 1
+                    continue
+                self.add_league(*results)
+                self._leagues_processed += 1
+                if self._leagues_processed % 1000 == 0:
+                    print(f'Processed {self._leagues_processed} leagues')
+
+    def add_league(self, team_info: Dict, league_results: Dict) -> None:
+        team_ids = list(team_info.keys())
+        scores, outcomes = ScrapeSingleLeague.get_score_matrix(team_ids, league_results)
+        # Teams without a finished match in a gameweek have no luck there, rather than a
+        # loss against a score of 0
+        present = outcomes != ''
+        gw_points = 3 * (outcomes == 'W') + (outcomes == 'D')
+        gw_luck = np.where(present, gw_points - expected_points_matrix(scores, present), 0.0)
+
+        league_size = len(team_ids)
+        if league_size not in self._season_stats:
+            self._season_stats[league_size] = RunningStats()
+            self._season_hist[league_size] = FixedHistogram(-60, 60, 480)
+        season_luck = gw_luck.sum(axis=1)
+        self._season_stats[league_size].add_many(season_luck)
+        self._season_hist[league_size].add_many(season_luck)
+
+        for gw_idx, gw in enumerate(league_results.keys()):
+            gw = int(gw)
+            if gw not in self._gw_stats:
+                self._gw_stats[gw] = RunningStats()
+                self._gw_hist[gw] = FixedHistogram(-3, 3, 600)
+            gw_present = present[:, gw_idx]
+            self._gw_stats[gw].add_many(gw_luck[gw_present, gw_idx])
+            self._gw_hist[gw].add_many(gw_luck[gw_present, gw_idx])
+
+    def get_league_size_df(self) -> pd.DataFrame:
+        return self._summary_df(self._season_stats, self._season_hist, 'league_size')
+
+    def get_gameweek_df(self) -> pd.DataFrame:
+        return self._summary_df(self._gw_stats, self._gw_hist, 'gameweek')
+
+    @staticmethod
+    def _summary_df(stats: Dict[int, RunningStats], hists: Dict[int, FixedHistogram],
+                    key_name: str) -> pd.DataFrame:
+        rows = []
+        for key in sorted(stats):
+            row = {
+                key_name: key,
+                'managers': stats[key].count,
+                'mean_luck': stats[key].mean,
+                'std_luck': stats[key].std,
+                'min_luck': stats[key].min,
+                'max_luck': stats[key].max,
+                }
+            for q, value in zip(PERCENTILES, hists[key].percentiles(PERCENTILES)):
+                row[f'p{q}'] = value
+            rows.append(row)
+        return pd.DataFrame(rows)
+
+    @property
+    def leagues_processed(self) -> int:
+        return self._leagues_processed
+
+    @property
+    def leagues_skipped(self) -> int:
+        return self._leagues_skipped
+
+
+def main() -> None:
+    report = LeagueLuckReport(cache=response_cache, metrics=metrics)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(report.populate(manage_database.iter_league_ids('league')))
+    print(f'{report.leagues_processed} h2h leagues, {report.leagues_skipped} skipped')
+
+    write_output(report.get_league_size_df(), 'xpts_luck_by_league_size',
+                 'xpts_luck_by_league_size.csv', ('league_size',))
+    write_output(report.get_gameweek_df(), 'xpts_luck_by_gameweek',
+                 'xpts_luck_by_gameweek.csv', ('gameweek',))
+    if metrics is not None:
+        print(f'Metrics written to {metrics.dump()}')
+
+if __name__ == "__main__":
+    main()
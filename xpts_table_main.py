@@ -1,6 +1,7 @@
 import pandas as pd
 import plotly.graph_objects as go
 
+from app import response_cache
 from scrape_league_players import ScrapeSingleLeague
 
 
@@ -19,7 +20,7 @@ def plot_table(league_table: pd.DataFrame, gw: int) -> None:
     fig.show()
 
 def main() -> None:
-    team, team_results = ScrapeSingleLeague.get_league_results(38838)
+    team, team_results = ScrapeSingleLeague.get_league_results(38838, cache=response_cache)
     league_table = ScrapeSingleLeague.get_league_table(team, team_results)
     plot_table(league_table, 38)
 